@@ -1,9 +1,25 @@
+import io
 import os
 import sys
+import json
+import time
+import secrets
+import zipfile
+import threading
 import urllib.request
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from concurrent.futures import wait, FIRST_COMPLETED
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, stream_with_context
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
-from utils.image_processor import ImageProcessor
+from utils.storage import UploadStore
+from utils.thumbnails import THUMBNAIL_FORMATS, make_thumbnail, snap_width
+from utils.scheduler import Scheduler, Lane, QueueFullError
+from utils.admission import AdmissionController, AdmissionRejected, DurationEstimator
+from utils.traffic import TrafficRecorder
+from utils.remote import WorkerPool, WorkerUnavailable
+from utils.model_registry import ModelRegistry, ModelManager, SwapInProgress
+from utils.tracing import Trace, TraceBuffer, ProfilerCapture, activate, new_trace_id, record_span, span
+from PIL import Image
 import logging
 
 # Configure logging
@@ -20,19 +36,240 @@ MODEL_DIR = 'models'
 CHECKPOINT_PATH = os.path.join(MODEL_DIR, "sam_vit_h_4b8939.pth")
 CONTROLNET_PATH = os.path.join(MODEL_DIR, "control_v11p_sd15_inpaint.pth")
 
+# SAM model: a single variant ("vit_h", "vit_l", "vit_b") or "cascade" (vit_b -> vit_l -> vit_h)
+SAM_MODEL_TYPE = os.environ.get('SAM_MODEL_TYPE', 'vit_h')
+CASCADE_CHECKPOINTS = {
+    'vit_b': os.path.join(MODEL_DIR, "sam_vit_b_01ec64.pth"),
+    'vit_l': os.path.join(MODEL_DIR, "sam_vit_l_0b3195.pth"),
+    'vit_h': CHECKPOINT_PATH
+}
+CASCADE_THRESHOLDS = {
+    'min_score': float(os.environ.get('CASCADE_MIN_SCORE', 0.88)),
+    'min_coverage': float(os.environ.get('CASCADE_MIN_COVERAGE', 0.02)),
+    'max_coverage': float(os.environ.get('CASCADE_MAX_COVERAGE', 0.95))
+}
+
+# Number of concurrent SAM predictor contexts sharing one set of weights
+SAM_POOL_SIZE = int(os.environ.get('SAM_POOL_SIZE', 2))
+
+# Memory budget for resident models in GB (0 = keep SAM and diffusion loaded), and
+# attention slicing / VAE tiling: "auto" enables them when a budget is set. The budget is
+# per model version: during a hot-swap both versions are resident, up to twice this
+MEMORY_BUDGET_GB = float(os.environ.get('MEMORY_BUDGET_GB', 0))
+MEMORY_SAVING = os.environ.get('MEMORY_SAVING', 'auto')
+
+# Compile SAM's image encoder, UNet and ControlNet with torch.compile (CPU inductor);
+# kernels are cached on disk so restarts skip recompilation
+TORCH_COMPILE = os.environ.get('TORCH_COMPILE', '0') == '1'
+TORCH_COMPILE_CACHE = os.environ.get('TORCH_COMPILE_CACHE', os.path.join('models', 'torch_compile_cache'))
+
+# Opt-in DeepCache-style acceleration: run the deep UNet and ControlNet blocks in full every
+# FEATURE_REUSE_INTERVAL denoising steps and reuse their outputs in between (0 or 1 disables);
+# FEATURE_REUSE_DEPTH is the number of shallow resolution levels always recomputed.
+# See benchmarks/bench_feature_reuse.py for the quality/speed trade-off
+FEATURE_REUSE_INTERVAL = int(os.environ.get('FEATURE_REUSE_INTERVAL', 0))
+FEATURE_REUSE_DEPTH = int(os.environ.get('FEATURE_REUSE_DEPTH', 1))
+
+# Token merging: share (0-0.75) of the 64x64-level tokens merged into similar ones before
+# self-attention in the UNet and ControlNet, 0 disables; /generate requests may override it
+# with 'token_merging'. See benchmarks/bench_token_merging.py
+TOKEN_MERGING_RATIO = float(os.environ.get('TOKEN_MERGING_RATIO', 0))
+
+# Few-step fast path for /generate requests with "fast": true: the LCM scheduler with a local
+# LCM-LoRA adapter for SD 1.5 (pytorch_lora_weights.safetensors from
+# latent-consistency/lcm-lora-sdv1-5). Without the adapter fast requests use the standard path
+LCM_LORA_PATH = os.environ.get('LCM_LORA_PATH', os.path.join(MODEL_DIR, 'lcm-lora-sdv1-5'))
+FAST_STEPS = int(os.environ.get('FAST_STEPS', 6))
+FAST_GUIDANCE = float(os.environ.get('FAST_GUIDANCE', 1.0))
+
+# Guidance schedule: classifier-free guidance (two UNet + ControlNet evaluations per image per
+# step) only for the first CFG_STOP fraction of the steps, or until the conditional and
+# unconditional predictions differ by less than CFG_CONVERGE_THRESHOLD (relative; 0 disables).
+# Later steps evaluate the conditional batch alone; /stats/generation reports the savings
+CFG_STOP = float(os.environ.get('CFG_STOP', 1.0))
+CFG_CONVERGE_THRESHOLD = float(os.environ.get('CFG_CONVERGE_THRESHOLD', 0))
+
+# Inference worker nodes (comma-separated base URLs, see inference_worker.py). When set, this
+# process is a front end: segmentation and generation default to the "remote" backends, which
+# route jobs to healthy workers by load and retry failed ones on another worker
+INFERENCE_WORKERS = [url.strip() for url in os.environ.get('INFERENCE_WORKERS', '').split(',') if url.strip()]
+WORKER_TIMEOUT = float(os.environ.get('WORKER_TIMEOUT', 900))
+WORKER_HEALTH_INTERVAL = float(os.environ.get('WORKER_HEALTH_INTERVAL', 5))
+WORKER_RETRIES = int(os.environ.get('WORKER_RETRIES', 2))
+
+# Scheduler lanes: workers and per-client fair queuing. Front ends default to one lane worker
+# per slot on the inference workers
+SEGMENTATION_WORKERS = int(os.environ.get('SEGMENTATION_WORKERS', SAM_POOL_SIZE * max(len(INFERENCE_WORKERS), 1)))
+GENERATION_WORKERS = int(os.environ.get('GENERATION_WORKERS', max(len(INFERENCE_WORKERS), 1)))
+# Torch intra-op threads for this process (0 = torch's default), set once before the models
+# load; the thread pool is process-wide and shared by both lanes
+TORCH_THREADS = int(os.environ.get('TORCH_THREADS', 0))
+FAIR_QUEUING = os.environ.get('FAIR_QUEUING', '1') == '1'
+MAX_QUEUE = int(os.environ.get('MAX_QUEUE', 0))
+
+# Latency SLOs in seconds (queue wait + run time); 0 disables admission control for a lane
+SEGMENTATION_SLO = float(os.environ.get('SEGMENTATION_SLO', 15))
+GENERATION_SLO = float(os.environ.get('GENERATION_SLO', 600))
+
+# Initial duration estimates before any jobs are measured: seconds per megapixel
+# for segmentation, seconds per 512x512 denoising step for generation
+DURATION_PRIORS = {'segmentation': 5.0, 'generation': 2.0}
+
+# Batch uploads: request size limit, image count limit, in-flight segmentation jobs per
+# batch (images stored and queued ahead of the workers) and queue priority (higher = later)
+BATCH_MAX_BYTES = int(os.environ.get('BATCH_MAX_MB', 256)) * 1024 * 1024
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 100))
+BATCH_WINDOW = int(os.environ.get('BATCH_WINDOW', 2 * SEGMENTATION_WORKERS))
+BATCH_PRIORITY = 1
+
+# Most variants (prompts x seeds) one /generate request may batch into a pipeline call
+MAX_VARIANTS = int(os.environ.get('MAX_VARIANTS', 4))
+
+# Crop generation to the mask's bounding box and paste back at full resolution
+CROP_TO_MASK = os.environ.get('CROP_TO_MASK', '0') == '1'
+CROP_SIZE = int(os.environ.get('CROP_SIZE', 512))
+CROP_MARGIN = float(os.environ.get('CROP_MARGIN', 0.15))
+
+# Segmenter backend: "torch" (eager SAM), "onnx" (ONNX Runtime, see export_onnx.py), or for
+# tests and load tests without checkpoints "stub" (no model) or "tiny" (random-weight SAM);
+# "remote" forwards to INFERENCE_WORKERS
+SEGMENTER_BACKEND = os.environ.get('SEGMENTER_BACKEND', 'remote' if INFERENCE_WORKERS else 'torch')
+# Generator backend: "controlnet" (SD 1.5 + ControlNet inpaint), "stub", "tiny" or "remote"
+GENERATOR_BACKEND = os.environ.get('GENERATOR_BACKEND', 'remote' if INFERENCE_WORKERS else 'controlnet')
+ONNX_DIR = os.environ.get('ONNX_DIR', os.path.join(MODEL_DIR, 'onnx'))
+ONNX_THREADS = int(os.environ['ONNX_THREADS']) if os.environ.get('ONNX_THREADS') else None
+ONNX_OPTIMIZATION = os.environ.get('ONNX_OPTIMIZATION', 'all')
+
+# Versioned model registry (JSON) and the version loaded at startup; other versions are
+# registered and switched to at runtime through /admin/models
+MODEL_REGISTRY = os.environ.get('MODEL_REGISTRY', os.path.join(MODEL_DIR, 'registry.json'))
+MODEL_VERSION = os.environ.get('MODEL_VERSION', 'default')
+# ImageProcessor settings a model version may override
+MODEL_SETTINGS = ('checkpoint_path', 'model_type', 'segmenter_backend', 'onnx_dir', 'onnx_threads',
+                  'onnx_optimization', 'predictor_pool_size', 'memory_budget', 'memory_saving',
+                  'compile_models', 'generator_backend', 'generator_options')
+# Generator options a model version may set through /admin/models
+GENERATOR_OPTIONS = ('scheduler', 'dtype', 'num_inference_steps', 'feature_reuse_interval', 'feature_reuse_depth',
+                     'token_merging_ratio', 'fast_steps', 'fast_guidance', 'cfg_stop', 'cfg_converge_threshold',
+                     'lcm_lora', 'controlnet_model', 'base_model')
+# Settings naming model files: set through the API they must resolve inside MODEL_DIR, since
+# loading a checkpoint can unpickle it
+MODEL_PATH_SETTINGS = ('checkpoint_path', 'onnx_dir')
+GENERATOR_PATH_OPTIONS = ('lcm_lora', 'controlnet_model', 'base_model')
+MODEL_DTYPES = ('float16', 'bfloat16', 'float32')
+
+# Recent request traces kept for /traces (0 disables tracing); admin endpoints require
+# this token in the X-Admin-Token header and are refused while it is unset
+TRACE_BUFFER = int(os.environ.get('TRACE_BUFFER', 200))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Endpoints that get a trace: the ones doing model work
+TRACED_ENDPOINTS = {'upload_file', 'upload_batch', 'generate_tryon'}
+
+# Append each /upload and /generate request to this JSONL log for replay with loadgen.py (unset = off)
+TRAFFIC_LOG = os.environ.get('TRAFFIC_LOG')
+RECORDED_ENDPOINTS = {'upload_file', 'generate_tryon'}
+# /generate body fields kept in the log
+RECORDED_GENERATE_FIELDS = ('clothing_type', 'clothing_types', 'prompt', 'prompts', 'seeds',
+                            'num_images_per_prompt', 'crop_to_mask', 'token_merging',
+                            'fast')
+
+# Upload storage: content-addressed, hash-sharded, garbage collected by quota and TTL
+UPLOAD_QUOTA_BYTES = int(float(os.environ.get('UPLOAD_QUOTA_GB', 10)) * 1024 ** 3)
+UPLOAD_TTL_SECONDS = int(float(os.environ.get('UPLOAD_TTL_HOURS', 168)) * 3600)
+UPLOAD_GC_INTERVAL = int(os.environ.get('UPLOAD_GC_INTERVAL', 300))
+# Uploads used within this many seconds are kept under quota pressure: a job (bounded by the
+# gunicorn request timeout) may still be reading them
+UPLOAD_GC_MIN_AGE = int(os.environ.get('UPLOAD_GC_MIN_AGE', os.environ.get('GUNICORN_TIMEOUT', 900)))
+
 # Ensure required directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-# Initialize image processor
-image_processor = None
+upload_store = UploadStore(
+    app.config['UPLOAD_FOLDER'],
+    quota_bytes=UPLOAD_QUOTA_BYTES,
+    ttl_seconds=UPLOAD_TTL_SECONDS,
+    gc_interval=UPLOAD_GC_INTERVAL,
+    min_age_seconds=UPLOAD_GC_MIN_AGE
+)
+
+scheduler = Scheduler([
+    Lane('segmentation', workers=SEGMENTATION_WORKERS, fair=FAIR_QUEUING, max_queue=MAX_QUEUE),
+    Lane('generation', workers=GENERATION_WORKERS, fair=FAIR_QUEUING, max_queue=MAX_QUEUE)
+])
+
+admission = AdmissionController(
+    scheduler,
+    DurationEstimator(DURATION_PRIORS),
+    {'segmentation': SEGMENTATION_SLO, 'generation': GENERATION_SLO}
+)
+
+traces = TraceBuffer(TRACE_BUFFER)
+profiler = ProfilerCapture()
+traffic_recorder = TrafficRecorder(TRAFFIC_LOG) if TRAFFIC_LOG else None
+
+# Model versions; jobs lease the active version's image processor from the manager
+model_registry = ModelRegistry(MODEL_REGISTRY)
+models = ModelManager()
+image_processor_lock = threading.Lock()
+worker_pool = None
+# Registry's active version this process last switched to (or tried to); see follow_active_version
+followed_version = None
 
-# Store processed images for the session
-processed_images = {}
+def processor_settings(version=None):
+    """ImageProcessor settings of a registry entry: the server configuration overridden by its
+    settings and dtype (the server configuration alone without one)."""
+    settings = {
+        'checkpoint_path': CHECKPOINT_PATH,
+        'model_type': SAM_MODEL_TYPE,
+        'segmenter_backend': SEGMENTER_BACKEND,
+        'onnx_dir': ONNX_DIR,
+        'onnx_threads': ONNX_THREADS,
+        'onnx_optimization': ONNX_OPTIMIZATION,
+        'predictor_pool_size': SAM_POOL_SIZE,
+        'memory_budget': int(MEMORY_BUDGET_GB * 1024 ** 3),
+        'memory_saving': MEMORY_SAVING,
+        'compile_models': TORCH_COMPILE,
+        'generator_backend': GENERATOR_BACKEND,
+        'generator_options': {'feature_reuse_interval': FEATURE_REUSE_INTERVAL,
+                              'feature_reuse_depth': FEATURE_REUSE_DEPTH,
+                              'token_merging_ratio': TOKEN_MERGING_RATIO,
+                              'lcm_lora': LCM_LORA_PATH,
+                              'fast_steps': FAST_STEPS,
+                              'fast_guidance': FAST_GUIDANCE,
+                              'cfg_stop': CFG_STOP,
+                              'cfg_converge_threshold': CFG_CONVERGE_THRESHOLD,
+                              'warmup_sizes': sorted({512, CROP_SIZE})}
+    }
+    if version is not None:
+        settings.update(version['settings'])
+        if version.get('dtype'):
+            settings['generator_options'] = {**settings['generator_options'], 'dtype': version['dtype']}
+    settings['cascade_checkpoints'] = CASCADE_CHECKPOINTS if settings['model_type'] == 'cascade' else None
+    return settings
 
-def verify_models():
-    """Verify required model files exist."""
-    required_models = [CHECKPOINT_PATH, CONTROLNET_PATH]
+def model_files(settings):
+    """Local checkpoint files the segmenter of these settings loads."""
+    if settings['segmenter_backend'] == 'remote':
+        return []
+    if settings['model_type'] == 'cascade':
+        return list(settings['cascade_checkpoints'].values())
+    if settings['segmenter_backend'] == 'torch':
+        return [settings['checkpoint_path']]
+    if settings['segmenter_backend'] == 'onnx':
+        return [
+            os.path.join(settings['onnx_dir'], 'sam_image_encoder.onnx'),
+            os.path.join(settings['onnx_dir'], 'sam_mask_decoder.onnx')
+        ]
+    return []
+
+def verify_models(settings=None):
+    """Verify the model files of the configured backends exist."""
+    settings = settings or processor_settings()
+    required_models = model_files(settings)
+    if settings['generator_backend'] == 'controlnet':
+        required_models.append(CONTROLNET_PATH)
     missing_models = [model for model in required_models if not os.path.exists(model)]
     
     if missing_models:
@@ -40,29 +277,463 @@ def verify_models():
         return False
     return True
 
+def load_model_version(version_id):
+    """Build the image processor of a registered model version, checking its files' pinned hashes."""
+    version = model_registry.get(version_id)
+    if version is None:
+        raise ValueError(f"Unknown model version: {version_id}")
+    settings = processor_settings(version)
+    if not verify_models(settings):
+        raise Exception("Required models are missing. Please run setup.py first.")
+    model_registry.verify_files(version_id, model_files(settings))
+    
+    # Deferred so importing the app and health checks never load torch or cv2
+    from utils.image_processor import ImageProcessor
+    processor = ImageProcessor(
+        **settings,
+        cascade_thresholds=CASCADE_THRESHOLDS,
+        compile_cache_dir=TORCH_COMPILE_CACHE,
+        worker_pool=worker_pool
+    )
+    logger.info(f"Successfully initialized image processor for model version {version_id}")
+    return processor
+
 def init_image_processor():
-    """Initialize the image processor, verifying models first."""
-    global image_processor
+    """Load and activate the startup model version, verifying models first."""
+    global worker_pool, followed_version
     try:
-        if not verify_models():
-            raise Exception("Required models are missing. Please run setup.py first.")
-        
-        image_processor = ImageProcessor(CHECKPOINT_PATH)
-        logger.info("Successfully initialized image processor")
+        with image_processor_lock:
+            # Both lanes may race to initialize on their first job
+            if models.active is not None:
+                return
+            
+            if INFERENCE_WORKERS and worker_pool is None:
+                worker_pool = WorkerPool(
+                    INFERENCE_WORKERS,
+                    timeout=WORKER_TIMEOUT,
+                    health_interval=WORKER_HEALTH_INTERVAL,
+                    retries=WORKER_RETRIES
+                )
+                worker_pool.start()
+            
+            if TORCH_THREADS:
+                import torch
+                torch.set_num_threads(TORCH_THREADS)
+            
+            # A version hot-swapped in by any process outlives restarts and new worker processes
+            model_registry.register(MODEL_VERSION, exist_ok=True)
+            version_id = model_registry.active_version() or MODEL_VERSION
+            models.activate(version_id, load_model_version(version_id))
+            followed_version = version_id
     except Exception as e:
         logger.error(f"Failed to initialize image processor: {str(e)}")
         raise
 
+def activate_model_version(version_id, warmup=True):
+    """Hot-swap to a registered version in this process, recording it in the registry once active."""
+    return models.swap(version_id, lambda: load_model_version(version_id), warmup=warmup,
+                       on_active=model_registry.set_active)
+
+def follow_active_version():
+    """Swap to the version another worker process activated.
+
+    Each gunicorn worker has its own ModelManager and /admin/models/activate reaches only one
+    of them; the others pick the new version up from the registry on their next job.
+    """
+    global followed_version
+    if models.active is None:
+        return
+    version_id = model_registry.active_version()
+    if version_id is None or version_id == followed_version:
+        return
+    if version_id != models.version:
+        try:
+            activate_model_version(version_id)
+        except SwapInProgress:
+            return
+        logger.info(f"Following model version {version_id} activated by another process")
+    # A failed swap is not retried on every job; the version that was active keeps serving
+    followed_version = version_id
+
+def lease_model():
+    """Lease the active model version for one job, loading the startup version on first use."""
+    if models.active is None:
+        init_image_processor()
+    follow_active_version()
+    return models.lease()
+
+def segment_upload(filepath, mask_path, rle_path, masked_path, info_path):
+    """Segmentation job: generate and save the mask, its RLE, the masked preview and the model version."""
+    with lease_model() as deployment:
+        image_processor = deployment.processor
+        
+        # Generate mask; with remote backends the worker's version is recorded, not this server's
+        mask = image_processor.process_image(filepath)
+        model_version = image_processor.segmenter.served_version or deployment.version
+        with span('mask_io'):
+            image_processor.save_mask(mask, mask_path)
+            image_processor.save_mask_rle(mask, rle_path)
+        logger.info(f"Generated and saved mask: {mask_path}")
+        
+        # Apply mask to original image
+        with span('masked_preview'):
+            image_processor.apply_mask_to_image(filepath, mask_path, masked_path)
+        logger.info(f"Applied mask and saved result: {masked_path}")
+        
+        # Written last: marks the outputs as complete for this model version
+        temp_path = f"{info_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'model_version': model_version, 'segmented_at': time.time()}, f)
+        os.replace(temp_path, info_path)
+
+def generate_result(original_path, mask_path, prompts, seeds, crop_to_mask, extension, token_merging=None,
+                    fast=False):
+    """Generation job: run all variants in one pipeline call and store them.
+    
+    Returns their store names and the model version that generated them.
+    """
+    with lease_model() as deployment:
+        image_processor = deployment.processor
+        result_images = image_processor.generate_variants(
+            original_path,
+            mask_path,
+            prompts,
+            seeds=seeds,
+            crop_to_mask=crop_to_mask,
+            crop_margin=CROP_MARGIN,
+            crop_size=CROP_SIZE,
+            token_merging=token_merging,
+            fast=fast
+        )
+        model_version = image_processor.generator.served_version or deployment.version
+        tryon_filenames = []
+        for result_image in result_images:
+            tryon_path = upload_store.temp_path(extension)
+            try:
+                with span('save'):
+                    image_processor.postprocess_result(result_image, tryon_path,
+                                                       metadata={'model_version': model_version})
+                    tryon_filenames.append(upload_store.add_file(tryon_path, extension))
+            except Exception:
+                if os.path.exists(tryon_path):
+                    os.remove(tryon_path)
+                raise
+            logger.info(f"Generated and saved try-on image: {upload_store.path_for(tryon_filenames[-1])}")
+        return tryon_filenames, model_version
+
+def generation_variants(data):
+    """(prompt, seed) pairs requested by a /generate body.
+    
+    Prompts come from 'prompts', 'clothing_types', 'prompt' or 'clothing_type'. Each prompt
+    is generated once per seed in 'seeds', or 'num_images_per_prompt' times with random seeds.
+    """
+    if data.get('prompts'):
+        prompts = data['prompts']
+    elif data.get('clothing_types'):
+        clothing_types = data['clothing_types']
+        if not isinstance(clothing_types, list) or not all(isinstance(item, str) for item in clothing_types):
+            raise ValueError('clothing_types must be a list of strings')
+        prompts = [CLOTHING_PROMPTS.get(clothing_type, CLOTHING_PROMPTS['default'])
+                   for clothing_type in clothing_types]
+    else:
+        clothing_type = data.get('clothing_type', 'default')
+        if not isinstance(clothing_type, str):
+            raise ValueError('clothing_type must be a string')
+        prompts = [data.get('prompt') or CLOTHING_PROMPTS.get(clothing_type, CLOTHING_PROMPTS['default'])]
+    if not isinstance(prompts, list) or not all(isinstance(prompt, str) and prompt for prompt in prompts):
+        raise ValueError('prompts must be a list of non-empty strings')
+    
+    seeds = data.get('seeds')
+    num_images = data.get('num_images_per_prompt')
+    if seeds is not None:
+        if not isinstance(seeds, list) or not all(isinstance(seed, int) and not isinstance(seed, bool) and seed >= 0
+                                                    for seed in seeds):
+            raise ValueError('seeds must be a list of non-negative integers')
+        if num_images is not None and num_images != len(seeds):
+            raise ValueError('num_images_per_prompt must match the number of seeds')
+    else:
+        num_images = 1 if num_images is None else num_images
+        if not isinstance(num_images, int) or isinstance(num_images, bool) or num_images < 1:
+            raise ValueError('num_images_per_prompt must be a positive integer')
+        seeds = [secrets.randbelow(2 ** 32) for _ in range(num_images)]
+    
+    variants = [(prompt, seed) for prompt in prompts for seed in seeds]
+    if len(variants) > MAX_VARIANTS:
+        raise ValueError(f'At most {MAX_VARIANTS} variants per request, got {len(variants)}')
+    return variants
+
+def generation_token_merging(data):
+    """Token merging ratio requested by a /generate body, or None for the model's default."""
+    from utils.generators import check_token_merging
+    token_merging = data.get('token_merging')
+    if token_merging is None:
+        return None
+    if isinstance(token_merging, bool) or not isinstance(token_merging, (int, float)):
+        raise ValueError('token_merging must be a number')
+    return check_token_merging(token_merging)
+
+def traced_job(fn):
+    """Wrap a lane job to record its queue wait and profile it when a capture is armed."""
+    submitted_at = time.perf_counter()
+    
+    def job(*args, **kwargs):
+        record_span('queue_wait', submitted_at, time.perf_counter())
+        with profiler.capture(fn.__name__):
+            return fn(*args, **kwargs)
+    return job
+
+def admin_denied():
+    """403 response unless ADMIN_TOKEN is set and the request carries it, else None."""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled (ADMIN_TOKEN is not set)'}), 403
+    if not secrets.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Admin token required'}), 403
+    return None
+
+def inside_model_dir(path):
+    """Whether ``path`` resolves (following symlinks) to a location inside MODEL_DIR."""
+    if not isinstance(path, str) or not path:
+        return False
+    root = os.path.realpath(MODEL_DIR)
+    return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+def model_settings_error(settings, dtype=None):
+    """Why model version settings sent to /admin/models are refused, or None when they are acceptable."""
+    if not isinstance(settings, dict):
+        return 'settings must be an object'
+    unknown = set(settings) - set(MODEL_SETTINGS)
+    if unknown:
+        return f"Unknown settings: {', '.join(sorted(unknown))}"
+    options = settings.get('generator_options') or {}
+    if not isinstance(options, dict):
+        return 'generator_options must be an object'
+    unknown = set(options) - set(GENERATOR_OPTIONS)
+    if unknown:
+        return f"Unknown generator options: {', '.join(sorted(unknown))}"
+    paths = [(key, settings[key]) for key in MODEL_PATH_SETTINGS if key in settings]
+    paths += [(key, options[key]) for key in GENERATOR_PATH_OPTIONS if key in options]
+    for key, path in paths:
+        if not inside_model_dir(path):
+            return f"{key} must be a path inside {MODEL_DIR}/"
+    cfg_stop = options.get('cfg_stop')
+    if cfg_stop is not None and (not isinstance(cfg_stop, (int, float)) or isinstance(cfg_stop, bool)
+                                 or not 0 < cfg_stop <= 1):
+        return 'cfg_stop must be a fraction of the steps in (0, 1]'
+    if dtype is not None and dtype not in MODEL_DTYPES:
+        return f"dtype must be one of {', '.join(MODEL_DTYPES)}"
+    return None
+
+def note_traffic(**fields):
+    """Add fields to this request's traffic log entry (no-op when recording is off)."""
+    if traffic_recorder is not None:
+        g.setdefault('traffic', {}).update(fields)
+
+def note_input(filename):
+    """Record the stored image a request used: content name, size in bytes and dimensions."""
+    if traffic_recorder is None:
+        return
+    path = upload_store.path_for(filename)
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+    except Exception:
+        width = height = None
+    note_traffic(input={'filename': filename, 'bytes': os.path.getsize(path), 'width': width, 'height': height})
+
+def client_id():
+    """Key for fair queuing: an explicit X-Client-Id header, else the remote address."""
+    return request.headers.get('X-Client-Id') or request.remote_addr
+
+def overloaded(e):
+    """429 response telling the client when to retry."""
+    response = jsonify({
+        'error': str(e),
+        'predicted_wait': round(e.predicted_wait, 2),
+        'predicted_duration': round(e.predicted_duration, 2),
+        'retry_after': e.retry_after
+    })
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+def generation_units(crop_to_mask, fast=False):
+    """Work estimate for one generation: denoising steps scaled by output area."""
+    from utils.generators import NUM_INFERENCE_STEPS
+    size = CROP_SIZE if crop_to_mask else 512
+    image_processor = models.processor
+    steps = getattr(image_processor.generator, 'num_inference_steps', NUM_INFERENCE_STEPS) \
+        if image_processor is not None else NUM_INFERENCE_STEPS
+    if fast and image_processor is not None and image_processor.generator.fast_available:
+        steps = image_processor.generator.fast_steps
+    return steps * (size / 512) ** 2
+
+def generation_profile(crop_to_mask, token_merging, fast=False):
+    """Duration estimator profile: crop or full, the fast path and the requested token merging ratio."""
+    profile = 'crop' if crop_to_mask else 'full'
+    if fast:
+        profile += '/fast'
+    return f"{profile}/tome{token_merging:g}" if token_merging else profile
+
+def upload_paths(filename):
+    """Paths of an upload and its segmentation outputs: (image, mask, mask RLE, masked, info)."""
+    return (
+        upload_store.path_for(filename),
+        upload_store.path_for(upload_store.derived_name(filename, 'mask')),
+        upload_store.path_for(upload_store.derived_name(filename, 'mask', ext='json')),
+        upload_store.path_for(upload_store.derived_name(filename, 'masked')),
+        upload_store.path_for(upload_store.derived_name(filename, 'segmentation', ext='json'))
+    )
+
+def segmentation_version(filename):
+    """Model version that segmented an upload, or None."""
+    info_name = upload_store.derived_name(filename, 'segmentation', ext='json')
+    try:
+        with open(upload_store.path_for(info_name)) as f:
+            return json.load(f).get('model_version')
+    except (OSError, ValueError):
+        return None
+
+def current_segmentation_versions():
+    """Model versions whose segmentations are current: the active version's, or with a remote
+    segmenter the versions its healthy workers serve."""
+    follow_active_version()
+    processor = models.processor
+    if processor is not None and processor.segmenter.name == 'remote':
+        return processor.segmenter.worker_pool.versions('segment')
+    return {models.version or MODEL_VERSION}
+
+def is_segmented(filename):
+    """Whether the upload's segmentation outputs exist for a current model version."""
+    return (upload_store.exists(upload_store.derived_name(filename, 'mask')) and
+            upload_store.exists(upload_store.derived_name(filename, 'masked')) and
+            segmentation_version(filename) in current_segmentation_versions())
+
+def segmentation_result(filename):
+    """Response fields describing an upload's segmentation outputs."""
+    return {
+        'success': True,
+        'original_image': filename,
+        'mask_image': upload_store.derived_name(filename, 'mask'),
+        'masked_image': upload_store.derived_name(filename, 'masked'),
+        'mask_rle_url': f'/masks/{filename}',
+        'model_version': segmentation_version(filename)
+    }
+
+def image_megapixels(path):
+    """Image size from its header, used as the segmentation work estimate."""
+    with Image.open(path) as image:
+        return image.width * image.height / 1e6
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def file_extension(filename):
+    """Lower-case extension of an uploaded filename, taken as sent: secure_filename drops
+    non-ASCII names down to the extension ('фото.png' becomes 'png')."""
+    return filename.rsplit('.', 1)[1].lower()
+
+@app.before_request
+def start_trace():
+    if TRACE_BUFFER and request.endpoint in TRACED_ENDPOINTS:
+        g.trace = Trace(f"{request.method} {request.path}", new_trace_id(request.headers.get('X-Trace-Id')))
+        activate(g.trace)
+
+@app.after_request
+def tag_trace(response):
+    trace = g.get('trace')
+    if trace is not None:
+        trace.status = response.status_code
+        response.headers['X-Trace-Id'] = trace.trace_id
+    return response
+
+@app.before_request
+def note_arrival():
+    if traffic_recorder is not None and request.endpoint in RECORDED_ENDPOINTS:
+        g.arrived_at = (time.time(), time.perf_counter())
+
+@app.after_request
+def record_traffic(response):
+    arrived_at = g.get('arrived_at')
+    if arrived_at is not None:
+        trace = g.get('trace')
+        traffic_recorder.record({
+            'ts': arrived_at[0],
+            'endpoint': request.path,
+            'status': response.status_code,
+            'duration': time.perf_counter() - arrived_at[1],
+            'trace_id': trace.trace_id if trace is not None else None,
+            'client': client_id(),
+            **g.get('traffic', {})
+        })
+    return response
+
+@app.teardown_request
+def finish_trace(exc):
+    # Streamed responses tear down once the stream is closed, so batch traces cover it
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.finish(trace.status if exc is None else 500)
+        traces.add(trace)
+        activate(None)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Serve a stored file, or a cached thumbnail of it with ?w=<width>[&format=webp|jpeg]."""
+    if not upload_store.exists(filename):
+        return jsonify({'error': 'File not found'}), 404
+    upload_store.touch(filename)
+    path = os.path.abspath(upload_store.path_for(filename))
+    mimetype = None
+    
+    if 'w' in request.args:
+        width = request.args.get('w', type=int)
+        fmt = request.args.get('format', 'webp').lower()
+        if width is None or width <= 0 or fmt not in THUMBNAIL_FORMATS:
+            return jsonify({'error': 'Invalid thumbnail request'}), 400
+        
+        # Thumbnails are created once and kept next to the source in the store
+        thumb_ext = 'jpg' if fmt == 'jpeg' else fmt
+        thumb_name = upload_store.derived_name(filename, f'w{snap_width(width)}', ext=thumb_ext)
+        thumb_path = os.path.abspath(upload_store.path_for(thumb_name))
+        if not os.path.exists(thumb_path) or os.path.getmtime(thumb_path) < os.path.getmtime(path):
+            make_thumbnail(path, thumb_path, snap_width(width), fmt, temp_path=upload_store.temp_path(thumb_ext))
+        filename, path, mimetype = thumb_name, thumb_path, THUMBNAIL_FORMATS[fmt][1]
+    
+    if upload_store.is_immutable(filename):
+        # Name is the content hash (plus rendition and format for thumbnails): strong ETag, cache forever
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=filename)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # Masks can be regenerated under the same name: revalidate with an mtime/size ETag
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=True)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/masks/<filename>')
+def mask_rle(filename):
+    """Return the mask of an upload as COCO-style RLE JSON ({'size': [h, w], 'counts': str})."""
+    if not upload_store.exists(filename):
+        return jsonify({'error': 'File not found'}), 404
+    rle_filename = upload_store.derived_name(filename, 'mask', ext='json')
+    rle_path = os.path.abspath(upload_store.path_for(rle_filename))
+    
+    if not os.path.exists(rle_path):
+        # Masks segmented before RLE storage existed are converted once
+        mask_filename = upload_store.derived_name(filename, 'mask')
+        if not upload_store.exists(mask_filename):
+            return jsonify({'error': 'No mask found'}), 404
+        from utils.image_processor import ImageProcessor
+        from utils.mask_rle import save_rle
+        mask = ImageProcessor.load_mask(upload_store.path_for(mask_filename)) > 127
+        save_rle(mask, rle_path)
+    
+    upload_store.touch(filename)
+    response = send_file(rle_path, mimetype='application/json', conditional=True, etag=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -76,46 +747,50 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         try:
-            # Save original image
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            # Save original image under its content hash
+            extension = file_extension(file.filename)
+            with span('store'):
+                filename = upload_store.put_stream(file.stream, extension)
+            filepath = upload_store.path_for(filename)
             logger.info(f"Saved uploaded file: {filepath}")
+            note_input(filename)
+            
+            # Identical content was already segmented
+            if is_segmented(filename):
+                logger.info(f"Reusing segmentation for {filename}")
+                note_traffic(reused=True)
+                return jsonify({
+                    **segmentation_result(filename),
+                    'message': 'Segmentation complete. Ready for try-on generation.'
+                })
+            
+            # Process the image for segmentation in the segmentation lane
+            try:
+                job, predicted_wait, predicted_duration = admission.submit(
+                    'segmentation', traced_job(segment_upload),
+                    *upload_paths(filename),
+                    units=image_megapixels(filepath),
+                    client_id=client_id()
+                )
+            except AdmissionRejected as e:
+                return overloaded(e)
+            except QueueFullError as e:
+                return jsonify({'error': str(e)}), 503
             
-            # Initialize image processor if not already done
-            if image_processor is None:
-                init_image_processor()
+            note_traffic(predicted_wait=predicted_wait, predicted_duration=predicted_duration)
             
-            # Process the image for segmentation
             try:
-                # Generate mask
-                mask = image_processor.process_image(filepath)
-                mask_filename = f'mask_{filename}'
-                mask_path = os.path.join(app.config['UPLOAD_FOLDER'], mask_filename)
-                image_processor.save_mask(mask, mask_path)
-                logger.info(f"Generated and saved mask: {mask_path}")
-                
-                # Apply mask to original image
-                masked_filename = f'masked_{filename}'
-                masked_path = os.path.join(app.config['UPLOAD_FOLDER'], masked_filename)
-                image_processor.apply_mask_to_image(filepath, mask_path, masked_path)
-                logger.info(f"Applied mask and saved result: {masked_path}")
-                
-                # Store the processed image info for later use
-                processed_images[filename] = {
-                    'original': filepath,
-                    'mask': mask_path,
-                    'masked': masked_path
-                }
-                
+                job.result()
                 return jsonify({
-                    'success': True,
-                    'original_image': filename,
-                    'mask_image': mask_filename,
-                    'masked_image': masked_filename,
+                    **segmentation_result(filename),
+                    'predicted_wait': round(predicted_wait, 2),
+                    'predicted_duration': round(predicted_duration, 2),
                     'message': 'Segmentation complete. Ready for try-on generation.'
                 })
                 
+            except WorkerUnavailable as e:
+                logger.error(f"Error processing image: {str(e)}")
+                return jsonify({'error': str(e)}), 503
             except Exception as e:
                 logger.error(f"Error processing image: {str(e)}")
                 return jsonify({'error': f'Error processing image: {str(e)}'}), 500
@@ -126,6 +801,162 @@ def upload_file():
             
     return jsonify({'error': 'Invalid file type'}), 400
 
+def zip_images(archive):
+    """Yield (name, extension, stream) for each entry of a zip archive."""
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        name = os.path.basename(info.filename)
+        if not allowed_file(name):
+            yield name, None, 'Invalid file type'
+        elif info.file_size > app.config['MAX_CONTENT_LENGTH']:
+            yield name, None, 'File too large'
+        else:
+            with archive.open(info) as stream:
+                yield name, file_extension(name), stream
+
+def batch_sources():
+    """Open a batch request's inputs, in order, as (filename, stream, zip archive or None).
+    
+    Archives are opened here, before any response is sent, so an unreadable one raises
+    zipfile.BadZipFile or zipfile.LargeZipFile. The caller owns the streams and closes them.
+    """
+    if request.mimetype in ('application/zip', 'application/x-zip-compressed'):
+        stream = io.BytesIO(request.get_data())
+        return [('', stream, zipfile.ZipFile(stream))]
+    
+    sources = []
+    try:
+        for file in request.files.getlist('files') + request.files.getlist('file'):
+            filename = file.filename or ''
+            # Take the stream over: the request closes its files when the view returns,
+            # before the streamed response has read them
+            stream, file.stream = file.stream, io.BytesIO()
+            sources.append((filename, stream, None))
+            if filename.lower().endswith('.zip'):
+                sources[-1] = (filename, stream, zipfile.ZipFile(stream))
+    except Exception:
+        close_sources(sources)
+        raise
+    return sources
+
+def close_sources(sources):
+    for _, stream, _ in sources:
+        stream.close()
+
+def batch_images(sources):
+    """Yield (name, extension, stream or error) for each image of the batch's sources."""
+    for filename, stream, archive in sources:
+        name = secure_filename(filename)
+        if archive is not None:
+            yield from zip_images(archive)
+        elif allowed_file(filename):
+            yield name, file_extension(filename), stream
+        else:
+            yield name, None, 'Invalid file type'
+
+def batch_items(sources):
+    """Store each batch image. Yields final results, or pending jobs with their result."""
+    for index, (name, extension, stream) in enumerate(batch_images(sources)):
+        item = {'index': index, 'name': name}
+        if index >= BATCH_MAX_FILES:
+            yield {**item, 'error': f'Batch is limited to {BATCH_MAX_FILES} images'}
+            continue
+        if extension is None:
+            yield {**item, 'error': stream}
+            continue
+        try:
+            with span('store', file=name):
+                filename = upload_store.put_stream(stream, extension)
+            if is_segmented(filename):
+                yield {**item, **segmentation_result(filename)}
+                continue
+            paths = upload_paths(filename)
+            yield {
+                'job': paths,
+                'units': image_megapixels(paths[0]),
+                'result': {**item, **segmentation_result(filename)}
+            }
+        except Exception as e:
+            logger.error(f"Error storing batch image {name}: {str(e)}")
+            yield {**item, 'error': f'Error handling upload: {str(e)}'}
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """Segment a multipart list or zip archive of images, streaming NDJSON results.
+    
+    Up to BATCH_WINDOW images are stored and queued ahead of the segmentation workers.
+    Results are written one JSON object per line, in completion order, each carrying the
+    image's position in the batch as 'index'.
+    """
+    request.max_content_length = BATCH_MAX_BYTES
+    batch_client = client_id()
+    try:
+        sources = batch_sources()
+    except (zipfile.BadZipFile, zipfile.LargeZipFile) as e:
+        return jsonify({'error': f'Invalid zip archive: {str(e)}'}), 400
+    
+    def results():
+        try:
+            yield from stream_results()
+        finally:
+            close_sources(sources)
+    
+    def stream_results():
+        items = batch_items(sources)
+        pending = {}
+        deferred = None
+        exhausted = False
+        while True:
+            # Keep the window full
+            while len(pending) < BATCH_WINDOW and not exhausted:
+                if deferred is None:
+                    deferred = next(items, None)
+                    if deferred is None:
+                        exhausted = True
+                        break
+                    if 'job' not in deferred:
+                        yield json.dumps(deferred) + '\n'
+                        deferred = None
+                        continue
+                try:
+                    job, _, _ = admission.submit(
+                        'segmentation', traced_job(segment_upload),
+                        *deferred['job'],
+                        units=deferred['units'],
+                        client_id=batch_client,
+                        priority=BATCH_PRIORITY
+                    )
+                except (AdmissionRejected, QueueFullError) as e:
+                    # Over the SLO: wait for this batch's own jobs, else back off and retry
+                    if pending:
+                        break
+                    time.sleep(min(getattr(e, 'retry_after', 1), 5))
+                    continue
+                pending[job] = deferred['result']
+                deferred = None
+            
+            if not pending:
+                if exhausted:
+                    break
+                continue
+            
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for job in done:
+                result = pending.pop(job)
+                try:
+                    job.result()
+                except Exception as e:
+                    logger.error(f"Error processing batch image {result['name']}: {str(e)}")
+                    result = {
+                        'index': result['index'],
+                        'name': result['name'],
+                        'error': f'Error processing image: {str(e)}'
+                    }
+                yield json.dumps(result) + '\n'
+    
+    return Response(stream_with_context(results()), mimetype='application/x-ndjson')
+
 @app.route('/generate', methods=['POST'])
 def generate_tryon():
     """Generate try-on image using processed mask and custom prompt."""
@@ -135,35 +966,77 @@ def generate_tryon():
             return jsonify({'error': 'No data provided'}), 400
             
         filename = data.get('filename')
-        clothing_type = data.get('clothing_type', 'default')
-        custom_prompt = data.get('prompt', '')
+        crop_to_mask = data.get('crop_to_mask', CROP_TO_MASK)
+        fast = data.get('fast', False)
+        for field, value in (('crop_to_mask', crop_to_mask), ('fast', fast)):
+            if not isinstance(value, bool):
+                return jsonify({'error': f'{field} must be true or false'}), 400
+        note_traffic(request={field: data[field] for field in RECORDED_GENERATE_FIELDS if field in data})
         
-        if not filename or filename not in processed_images:
+        if not upload_store.exists(filename):
+            return jsonify({'error': 'No processed image found'}), 400
+        mask_filename = upload_store.derived_name(filename, 'mask')
+        if not upload_store.exists(mask_filename):
             return jsonify({'error': 'No processed image found'}), 400
             
-        # Get stored image paths
-        image_info = processed_images[filename]
+        # Get stored image paths, preferring the compact RLE mask
+        upload_store.touch(filename)
+        note_input(filename)
+        original_path = upload_store.path_for(filename)
+        rle_filename = upload_store.derived_name(filename, 'mask', ext='json')
+        if upload_store.exists(rle_filename):
+            mask_path = upload_store.path_for(rle_filename)
+        else:
+            mask_path = upload_store.path_for(mask_filename)
         
-        # Generate try-on image
-        prompt = custom_prompt if custom_prompt else CLOTHING_PROMPTS.get(clothing_type, CLOTHING_PROMPTS['default'])
-        tryon_filename = f'tryon_{filename}'
-        tryon_path = os.path.join(app.config['UPLOAD_FOLDER'], tryon_filename)
+        try:
+            variants = generation_variants(data)
+            token_merging = generation_token_merging(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        prompts = [prompt for prompt, _ in variants]
+        seeds = [seed for _, seed in variants]
         
+        # Generate all variants in one pipeline call in the generation lane
+        extension = filename.rsplit('.', 1)[1]
         try:
-            result_image = image_processor.generate_try_on(
-                image_info['original'],
-                image_info['mask'],
-                prompt
+            job, predicted_wait, predicted_duration = admission.submit(
+                'generation', traced_job(generate_result),
+                original_path, mask_path, prompts, seeds, crop_to_mask, extension, token_merging, fast,
+                units=generation_units(crop_to_mask, fast) * len(variants),
+                profile=generation_profile(crop_to_mask, token_merging, fast),
+                client_id=client_id()
             )
-            image_processor.postprocess_result(result_image, tryon_path)
-            logger.info(f"Generated and saved try-on image: {tryon_path}")
+        except AdmissionRejected as e:
+            return overloaded(e)
+        except QueueFullError as e:
+            return jsonify({'error': str(e)}), 503
+        
+        note_traffic(variants=len(variants), predicted_wait=predicted_wait, predicted_duration=predicted_duration)
+        
+        try:
+            tryon_filenames, model_version = job.result()
             
             return jsonify({
                 'success': True,
-                'tryon_image': tryon_filename,
-                'prompt_used': prompt
+                'tryon_image': tryon_filenames[0],
+                'prompt_used': prompts[0],
+                'seed': seeds[0],
+                'variants': [
+                    {'tryon_image': tryon_filename, 'prompt': prompt, 'seed': seed}
+                    for tryon_filename, prompt, seed in zip(tryon_filenames, prompts, seeds)
+                ],
+                'crop_to_mask': crop_to_mask,
+                'token_merging': token_merging,
+                'fast': fast,
+                'model_version': model_version,
+                'predicted_wait': round(predicted_wait, 2),
+                'predicted_duration': round(predicted_duration, 2)
             })
             
+        except WorkerUnavailable as e:
+            logger.error(f"Error generating try-on image: {str(e)}")
+            return jsonify({'error': str(e)}), 503
         except Exception as e:
             logger.error(f"Error generating try-on image: {str(e)}")
             return jsonify({'error': f'Error generating try-on image: {str(e)}'}), 500
@@ -172,6 +1045,153 @@ def generate_tryon():
         logger.error(f"Error in generate_tryon: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/healthz')
+def healthz():
+    """Liveness check that never imports or touches the models."""
+    return jsonify({
+        'status': 'ok',
+        'models_loaded': models.active is not None,
+        'model_version': models.version
+    })
+
+@app.route('/stats/segmentation')
+def segmentation_stats():
+    """Report SAM cascade per-tier hit rates for threshold tuning."""
+    image_processor = models.processor
+    if image_processor is None:
+        return jsonify({'error': 'Image processor not initialized'}), 503
+    
+    stats = image_processor.segmentation_stats()
+    backend = image_processor.segmenter.name
+    if stats is None:
+        return jsonify({'mode': SAM_MODEL_TYPE, 'backend': backend, 'cascade': False})
+    return jsonify({'mode': 'cascade', 'backend': backend, 'cascade': True, 'stats': stats})
+
+@app.route('/stats/generation')
+def generation_stats():
+    """Report UNet evaluations run and saved by guidance truncation, and feature reuse steps."""
+    image_processor = models.processor
+    if image_processor is None:
+        return jsonify({'error': 'Image processor not initialized'}), 503
+    return jsonify({'backend': image_processor.generator.name, 'stats': image_processor.generation_stats()})
+
+@app.route('/stats/memory')
+def memory_stats():
+    """Report resident models, evictions and peak RSS per stage."""
+    image_processor = models.processor
+    if image_processor is None:
+        return jsonify({'error': 'Image processor not initialized'}), 503
+    return jsonify(image_processor.memory_stats())
+
+@app.route('/stats/scheduler')
+def scheduler_stats():
+    """Report per-lane queue depth and wait/run times."""
+    return jsonify(scheduler.stats())
+
+@app.route('/stats/admission')
+def admission_stats():
+    """Report SLOs, admitted/rejected counts and the fitted duration model."""
+    return jsonify(admission.stats())
+
+@app.route('/stats/workers')
+def worker_stats():
+    """Report inference worker health, load and failures as seen by this front end."""
+    if worker_pool is None:
+        return jsonify({'error': 'No inference workers configured'}), 404
+    return jsonify(worker_pool.stats())
+
+@app.route('/traces')
+def recent_traces():
+    """Summaries of recent request traces, newest first."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify([trace.summary() for trace in traces.recent(limit)])
+
+@app.route('/traces/export')
+def export_traces():
+    """Recent traces (or those named by trace_id) as Chrome/Perfetto trace JSON."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    trace_ids = set(request.args.getlist('trace_id'))
+    response = jsonify(traces.chrome_trace(trace_ids))
+    response.headers['Content-Disposition'] = 'attachment; filename=traces.json'
+    return response
+
+@app.route('/traces/<trace_id>')
+def trace_detail(trace_id):
+    """Every span of one trace."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    trace = traces.get(trace_id)
+    if trace is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    return jsonify(trace.to_dict())
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """Arm torch.profiler for the next N segmentation/generation jobs, or read the captured profiles."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        count = data.get('requests', 1)
+        if not isinstance(count, int) or isinstance(count, bool) or not 0 <= count <= 100:
+            return jsonify({'error': 'requests must be an integer from 0 to 100'}), 400
+        profiler.arm(count, record_shapes=bool(data.get('record_shapes', False)))
+        logger.info(f"Profiling the next {count} job(s)")
+        return jsonify(profiler.stats()), 202
+    return jsonify(profiler.stats())
+
+@app.route('/admin/models', methods=['GET', 'POST'])
+def admin_models():
+    """List registered model versions and deployments, or register a new version."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        settings = data.get('settings') or {}
+        error = model_settings_error(settings, data.get('dtype'))
+        if error:
+            return jsonify({'error': error, 'allowed': list(MODEL_SETTINGS)}), 400
+        try:
+            version = model_registry.register(data.get('version'), settings, dtype=data.get('dtype'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(version), 201
+    return jsonify({
+        'active_version': models.version,
+        'versions': model_registry.versions(),
+        'deployments': models.stats()
+    })
+
+@app.route('/admin/models/activate', methods=['POST'])
+def admin_activate_model():
+    """Load a registered model version in the background and switch traffic to it once warm."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    
+    data = request.get_json(silent=True) or {}
+    version_id = data.get('version')
+    if model_registry.get(version_id) is None:
+        return jsonify({'error': f'Unknown model version: {version_id}'}), 404
+    if version_id == models.version:
+        return jsonify({'error': f'Model version {version_id} is already active'}), 409
+    try:
+        deployment = activate_model_version(version_id, warmup=bool(data.get('warmup', True)))
+    except SwapInProgress as e:
+        return jsonify({'error': str(e)}), 409
+    logger.info(f"Loading model version {version_id}")
+    return jsonify(deployment.to_dict()), 202
+
 @app.errorhandler(413)
 def too_large(e):
     return jsonify({'error': 'File is too large (max 16MB)'}), 413
@@ -182,6 +1202,9 @@ def server_error(e):
 
 @app.errorhandler(Exception)
 def handle_exception(e):
+    # Let HTTP errors (404, 416 for bad ranges, ...) through with their own status
+    if isinstance(e, HTTPException):
+        return e
     logger.error(f"Unhandled exception: {str(e)}")
     return jsonify({'error': 'An unexpected error occurred'}), 500
 
@@ -201,6 +1224,7 @@ if __name__ == '__main__':
             sys.exit(1)
             
         init_image_processor()
+        upload_store.start_gc()
         
         # Get port from environment variable or default to 5000
         port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,107 @@
+"""Benchmark: eager vs. torch.compile (CPU inductor) for the SAM image encoder, UNet and ControlNet.
+
+Models are built with random weights at their serving shapes (SAM at 1024x1024, UNet and
+ControlNet at 512x512 with classifier-free guidance batch 2); latency does not depend on
+the weights. ``--size full`` uses the real SAM ViT-B / SD 1.5 architectures, ``--size tiny``
+small ones for a quick check. Run twice to see the persistent cache cut the first-call time.
+
+Usage: python benchmarks/bench_compile.py [--size full --components sam,unet,controlnet --iterations 5]
+"""
+import os
+import sys
+import time
+import argparse
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.torch_compile import configure_compile_cache, compile_module, DEFAULT_CACHE_DIR
+
+
+def build_sam_encoder(size):
+    from segment_anything.modeling import ImageEncoderViT
+    if size == 'full':
+        from segment_anything import sam_model_registry
+        return sam_model_registry['vit_b'](checkpoint=None).image_encoder
+    return ImageEncoderViT(img_size=1024, patch_size=16, embed_dim=64, depth=2, num_heads=2,
+                           out_chans=32, window_size=14, global_attn_indexes=(1,))
+
+
+def unet_config(size):
+    if size == 'full':
+        # SD 1.5
+        return dict(sample_size=64, cross_attention_dim=768)
+    return dict(block_out_channels=(32, 64), layers_per_block=1, sample_size=64, cross_attention_dim=32,
+                down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+                up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"), norm_num_groups=8)
+
+
+def build_unet(size):
+    from diffusers import UNet2DConditionModel
+    return UNet2DConditionModel(**unet_config(size))
+
+
+def build_controlnet(size):
+    from diffusers import ControlNetModel
+    config = unet_config(size)
+    config.pop('up_block_types', None)
+    config.pop('sample_size')
+    if size != 'full':
+        config['conditioning_embedding_out_channels'] = (8, 16, 16, 32)  # 8x down to the latent
+    return ControlNetModel(**config)
+
+
+def component_inputs(name, model):
+    """Serving-shape inputs: SAM at 1024x1024, diffusion at 512x512 with CFG batch 2."""
+    if name == 'sam':
+        return (torch.randn(1, 3, 1024, 1024),), {}
+    context = torch.randn(2, 77, model.config.cross_attention_dim)
+    kwargs = {'encoder_hidden_states': context, 'return_dict': False}
+    if name == 'controlnet':
+        kwargs['controlnet_cond'] = torch.randn(2, 3, 512, 512)
+    return (torch.randn(2, 4, 64, 64), torch.tensor(500)), kwargs
+
+
+BUILDERS = {'sam': build_sam_encoder, 'unet': build_unet, 'controlnet': build_controlnet}
+
+
+def time_calls(model, args, kwargs, iterations):
+    """Mean seconds per call."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        model(*args, **kwargs)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="torch.compile CPU benchmark")
+    parser.add_argument('--size', choices=['tiny', 'full'], default='tiny')
+    parser.add_argument('--components', default='sam,unet,controlnet')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    configure_compile_cache(args.cache_dir)
+    torch.manual_seed(0)
+    print(f"Models: {args.size}, {args.iterations} iterations, {torch.get_num_threads()} threads\n")
+    print(f"{'component':<12} {'eager ms':>10} {'compiled ms':>12} {'speedup':>8} {'first call s':>13}")
+
+    with torch.no_grad():
+        for name in args.components.split(','):
+            model = BUILDERS[name](args.size).eval()
+            call_args, call_kwargs = component_inputs(name, model)
+
+            model(*call_args, **call_kwargs)  # Warm-up
+            eager = time_calls(model, call_args, call_kwargs, args.iterations)
+
+            compiled = compile_module(model)
+            start = time.perf_counter()
+            compiled(*call_args, **call_kwargs)  # Compiles, or loads from the cache
+            first_call = time.perf_counter() - start
+            fast = time_calls(compiled, call_args, call_kwargs, args.iterations)
+
+            print(f"{name:<12} {eager * 1000:10.1f} {fast * 1000:12.1f} {eager / fast:7.2f}x {first_call:13.1f}")
+
+
+if __name__ == '__main__':
+    main()
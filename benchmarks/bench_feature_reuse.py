@@ -0,0 +1,145 @@
+"""Benchmark: quality vs. speed of deep feature reuse (FEATURE_REUSE_INTERVAL) against full steps.
+
+Each configuration generates the same evaluation set (garment images with masks, one
+prompt and seed each) through ImageProcessor.generate_variants. Time is the mean seconds
+per generation after a warm-up run; quality compares every image with the baseline's
+image for the same garment, prompt and seed (PSNR, mean absolute error, SSIM), so it
+measures drift from the full computation rather than absolute quality.
+
+The default evaluation set is eight synthetic garments; ``--images`` takes garment photos
+whose masks sit next to them as <name>_mask.png. ``--generator tiny`` (random weights)
+only shows the speed-up; use ``--generator controlnet`` for meaningful quality numbers.
+
+Usage: python benchmarks/bench_feature_reuse.py [--generator controlnet --intervals 2,3,4 --steps 30 --json out.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.image_processor import ImageProcessor
+
+PROMPTS = [
+    "a red cotton t-shirt",
+    "a navy denim jacket",
+    "a white linen shirt",
+    "a black leather jacket",
+    "a green wool sweater",
+    "a yellow silk blouse",
+    "a grey hoodie",
+    "a striped polo shirt",
+]
+
+
+def synthetic_garments(directory, count):
+    """Deterministic garment-like shapes on a light background, with their masks."""
+    rng = np.random.RandomState(0)
+    paths = []
+    for index in range(count):
+        image = np.full((640, 512, 3), 235, dtype=np.uint8)
+        mask = np.zeros((640, 512), dtype=np.uint8)
+        top, bottom = rng.randint(80, 160), rng.randint(480, 580)
+        left, right = rng.randint(90, 170), rng.randint(340, 420)
+        # Torso and sleeves
+        cv2.rectangle(mask, (left, top), (right, bottom), 255, -1)
+        cv2.fillPoly(mask, [np.array([[left, top], [left - 70, top + 150], [left - 20, top + 180], [left, top + 90]])], 255)
+        cv2.fillPoly(mask, [np.array([[right, top], [right + 70, top + 150], [right + 20, top + 180], [right, top + 90]])], 255)
+        color = rng.randint(20, 220, 3)
+        image[mask > 0] = color
+        # Texture so the generator has detail to preserve
+        noise = rng.randint(-25, 25, image.shape)
+        image = np.where(mask[..., None] > 0, np.clip(image + noise, 0, 255), image).astype(np.uint8)
+        image_path = os.path.join(directory, f'garment_{index}.png')
+        cv2.imwrite(image_path, image)
+        cv2.imwrite(os.path.join(directory, f'garment_{index}_mask.png'), mask)
+        paths.append(image_path)
+    return paths
+
+
+def mask_path_for(image_path):
+    return os.path.splitext(image_path)[0] + '_mask.png'
+
+
+def ssim(a, b):
+    """Mean SSIM over 7x7 windows on grayscale images."""
+    a = cv2.cvtColor(a, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    b = cv2.cvtColor(b, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mean_a, mean_b = cv2.blur(a, (7, 7)), cv2.blur(b, (7, 7))
+    var_a = cv2.blur(a * a, (7, 7)) - mean_a ** 2
+    var_b = cv2.blur(b * b, (7, 7)) - mean_b ** 2
+    covariance = cv2.blur(a * b, (7, 7)) - mean_a * mean_b
+    ssim_map = ((2 * mean_a * mean_b + c1) * (2 * covariance + c2)) / \
+               ((mean_a ** 2 + mean_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+
+def compare(image, reference):
+    image = np.asarray(image.convert('RGB'))
+    reference = np.asarray(reference.convert('RGB'))
+    error = image.astype(np.float64) - reference.astype(np.float64)
+    mse = float(np.mean(error ** 2))
+    psnr = float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+    return {'psnr': psnr, 'mae': float(np.mean(np.abs(error))), 'ssim': ssim(image, reference)}
+
+
+def run(generator, interval, depth, steps, evaluation_set):
+    """Generate the evaluation set with one configuration. Returns (seconds per image, images)."""
+    processor = ImageProcessor(segmenter_backend='stub', generator_backend=generator, generator_options={
+        'num_inference_steps': steps, 'feature_reuse_interval': interval, 'feature_reuse_depth': depth
+    })
+    image_path, prompt, seed = evaluation_set[0]
+    processor.generate_variants(image_path, mask_path_for(image_path), [prompt], seeds=[seed])  # Warm-up
+    images, elapsed = [], 0.0
+    for image_path, prompt, seed in evaluation_set:
+        start = time.perf_counter()
+        images.extend(processor.generate_variants(image_path, mask_path_for(image_path), [prompt], seeds=[seed]))
+        elapsed += time.perf_counter() - start
+    processor.release()
+    return elapsed / len(evaluation_set), images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deep feature reuse quality/speed benchmark")
+    parser.add_argument('--generator', choices=['tiny', 'controlnet'], default='tiny')
+    parser.add_argument('--intervals', default='2,3,4', help="Reuse intervals to compare with full steps")
+    parser.add_argument('--depth', type=int, default=1, help="Shallow levels always recomputed")
+    parser.add_argument('--steps', type=int, default=30)
+    parser.add_argument('--images', nargs='*', help="Garment images with <name>_mask.png masks")
+    parser.add_argument('--count', type=int, default=len(PROMPTS), help="Synthetic garments when --images is not given")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        image_paths = args.images or synthetic_garments(directory, args.count)
+        image_paths = [path for path in image_paths if not path.endswith('_mask.png')]
+        evaluation_set = [(path, PROMPTS[index % len(PROMPTS)], 1000 + index) for index, path in enumerate(image_paths)]
+        print(f"Generator: {args.generator}, {args.steps} steps, {len(evaluation_set)} images, depth {args.depth}\n")
+        print(f"{'interval':<10} {'s/image':>9} {'speedup':>8} {'PSNR dB':>8} {'MAE':>7} {'SSIM':>7}")
+
+        baseline_time, baseline_images = run(args.generator, 0, args.depth, args.steps, evaluation_set)
+        print(f"{'off':<10} {baseline_time:9.2f} {1:7.2f}x {'-':>8} {'-':>7} {'-':>7}")
+        results = [{'interval': 0, 'seconds_per_image': baseline_time}]
+        for interval in [int(value) for value in args.intervals.split(',')]:
+            seconds, images = run(args.generator, interval, args.depth, args.steps, evaluation_set)
+            scores = [compare(image, reference) for image, reference in zip(images, baseline_images)]
+            quality = {key: float(np.mean([score[key] for score in scores])) for key in ('psnr', 'mae', 'ssim')}
+            print(f"{interval:<10} {seconds:9.2f} {baseline_time / seconds:7.2f}x "
+                  f"{quality['psnr']:8.2f} {quality['mae']:7.2f} {quality['ssim']:7.3f}")
+            results.append({'interval': interval, 'seconds_per_image': seconds,
+                            'speedup': baseline_time / seconds, **quality})
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'generator': args.generator, 'steps': args.steps, 'depth': args.depth,
+                       'images': len(evaluation_set), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
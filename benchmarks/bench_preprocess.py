@@ -0,0 +1,104 @@
+"""Micro-benchmark: legacy PIL/NumPy preprocessing vs. utils.preprocess on large inputs.
+
+Usage: python benchmarks/bench_preprocess.py [--width 3840 --height 2160 --iterations 20]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.preprocess import Preprocessor, whiten_background
+
+
+def legacy_resize_and_pad(image, target_size):
+    """The original ImageProcessor._resize_and_pad."""
+    target_width, target_height = target_size
+    width, height = image.size
+    aspect_ratio = width / height
+    if aspect_ratio > 1:
+        new_width = target_width
+        new_height = int(target_width / aspect_ratio)
+        pad_top = (target_height - new_height) // 2
+        pad_left = 0
+    else:
+        new_height = target_height
+        new_width = int(target_height * aspect_ratio)
+        pad_left = (target_width - new_width) // 2
+        pad_top = 0
+    image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    padded_image = Image.new(image.mode, target_size, (255, 255, 255))
+    padded_image.paste(image, (pad_left, pad_top))
+    return padded_image
+
+
+def legacy_prepare(image_bgr, mask_raw):
+    """The original generate_try_on preprocessing, starting from decoded arrays."""
+    init_image = Image.fromarray(cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB))
+    init_image = legacy_resize_and_pad(init_image, (512, 512))
+    _, mask_binary = cv2.threshold(mask_raw, 127, 255, cv2.THRESH_BINARY)
+    mask_binary = cv2.resize(mask_binary, (512, 512), interpolation=cv2.INTER_NEAREST)
+    mask_invert = cv2.bitwise_not(mask_binary)
+    mask_image = Image.fromarray(mask_invert)
+    init_array = np.array(init_image)
+    mask_array = np.array(mask_image)
+    control_array = init_array.copy()
+    control_array[mask_array == 0] = 255
+    return init_image, mask_image, Image.fromarray(control_array)
+
+
+def legacy_apply_mask(image, mask):
+    """The original apply_mask_to_image composition."""
+    _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
+    masked_image = cv2.bitwise_and(image, image, mask=mask)
+    masked_image[mask == 0] = 255
+    return masked_image
+
+
+def measure(label, func, iterations):
+    """Report mean latency and peak traced allocation of func."""
+    func()  # Warm-up, also fills reusable buffers
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = (time.perf_counter() - start) / iterations
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<32} {elapsed * 1000:8.2f} ms/iter   peak alloc {peak / 1024 / 1024:8.2f} MB")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocessing micro-benchmark")
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=(args.height, args.width, 3), dtype=np.uint8)
+    mask = np.zeros((args.height, args.width), dtype=np.uint8)
+    mask[args.height // 4:3 * args.height // 4, args.width // 3:2 * args.width // 3] = 255
+    preprocessor = Preprocessor()
+    scratch = image.copy()
+
+    print(f"Input: {args.width}x{args.height}, {args.iterations} iterations\n")
+    legacy = measure("legacy generate_try_on prep", lambda: legacy_prepare(image, mask), args.iterations)
+    new = measure("Preprocessor.prepare", lambda: preprocessor.prepare(image, mask, bgr=True), args.iterations)
+    print(f"{'speedup':<32} {legacy / new:8.2f}x\n")
+
+    legacy = measure("legacy apply_mask_to_image", lambda: legacy_apply_mask(image, mask), args.iterations)
+    new = measure("whiten_background (in place)", lambda: whiten_background(scratch, mask), args.iterations)
+    print(f"{'speedup':<32} {legacy / new:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
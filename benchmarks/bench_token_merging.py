@@ -0,0 +1,65 @@
+"""Benchmark: token merging ratios for one denoising step (ControlNet + UNet) on CPU.
+
+Models are built with random weights as in bench_compile.py (``--size full`` is SD 1.5 at
+512x512 with classifier-free guidance batch 2, where self-attention at the 64x64 latent
+level dominates). For each ratio it reports the mean step time and the relative error of
+the UNet output against the unmerged step. With random weights the error only bounds the
+drift; compare images with TOKEN_MERGING_RATIO on the real models for quality.
+
+Usage: python benchmarks/bench_token_merging.py [--size full --ratios 0.3,0.5,0.75 --iterations 5]
+"""
+import os
+import sys
+import time
+import argparse
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_compile import build_unet, build_controlnet, component_inputs
+from utils.token_merging import TokenMerging
+
+
+def step(unet, controlnet, unet_inputs, controlnet_inputs):
+    down, mid = controlnet(*controlnet_inputs[0], **controlnet_inputs[1])
+    args, kwargs = unet_inputs
+    return unet(*args, **kwargs, down_block_additional_residuals=down, mid_block_additional_residual=mid)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token merging CPU benchmark")
+    parser.add_argument('--size', choices=['tiny', 'full'], default='tiny')
+    parser.add_argument('--ratios', default='0.3,0.5,0.75')
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    unet = build_unet(args.size).eval()
+    controlnet = build_controlnet(args.size).eval()
+    unet_inputs = component_inputs('unet', unet)
+    controlnet_inputs = component_inputs('controlnet', controlnet)
+    # The tiny models have no attention at full latent resolution
+    merging = TokenMerging(max_downsample=1 if args.size == 'full' else 2)
+    merging.attach(unet, controlnet)
+
+    print(f"Models: {args.size}, {args.iterations} iterations, {torch.get_num_threads()} threads\n")
+    print(f"{'ratio':<8} {'step ms':>10} {'speedup':>8} {'rel. error':>11}")
+    with torch.no_grad():
+        baseline_output, baseline_time = None, None
+        for ratio in [0.0] + [float(value) for value in args.ratios.split(',')]:
+            merging.ratio = ratio
+            merging.reset()
+            output = step(unet, controlnet, unet_inputs, controlnet_inputs)  # Warm-up
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                merging.reset()
+                step(unet, controlnet, unet_inputs, controlnet_inputs)
+            seconds = (time.perf_counter() - start) / args.iterations
+            if baseline_output is None:
+                baseline_output, baseline_time = output, seconds
+            error = ((output - baseline_output).norm() / baseline_output.norm()).item()
+            print(f"{ratio:<8g} {seconds * 1000:10.1f} {baseline_time / seconds:7.2f}x {error:11.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import subprocess
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+STAMP_PATH = os.environ.get('BOOT_STAMP', '.boot_stamp.json')
+REQUIREMENTS_PATH = 'requirements.txt'
+DIRECTORIES = ['uploads', 'models']
+
+def requirements_hash(path=REQUIREMENTS_PATH):
+    """SHA-256 of the requirements file."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def model_manifest(models):
+    """Current {path: [size, mtime]} for each model in the download manifest, None if missing."""
+    manifest = {}
+    for info in models.values():
+        try:
+            st = os.stat(info["path"])
+            manifest[info["path"]] = [st.st_size, int(st.st_mtime)]
+        except OSError:
+            manifest[info["path"]] = None
+    return manifest
+
+def models_complete(models, manifest):
+    """True when every model is present with its expected size."""
+    return all(
+        manifest[info["path"]] is not None and manifest[info["path"]][0] == info["size"]
+        for info in models.values()
+    )
+
+def load_stamp(path=STAMP_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_stamp(stamp, path=STAMP_PATH):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(stamp, f, indent=2)
+    os.replace(temp_path, path)
+
+def install_requirements():
+    """pip install the requirements file into the running interpreter."""
+    logger.info("Requirements changed, installing...")
+    result = subprocess.run([sys.executable, '-m', 'pip', 'install', '-r', REQUIREMENTS_PATH])
+    return result.returncode == 0
+
+def main(skip_install=False, force=False):
+    """Bring the environment up to date, skipping steps the stamp shows are already done."""
+    for directory in DIRECTORIES:
+        os.makedirs(directory, exist_ok=True)
+
+    stamp = {} if force else load_stamp()
+
+    # Dependencies: reinstall only when requirements.txt changed since the last good boot
+    current_requirements = requirements_hash()
+    if skip_install:
+        logger.info("Skipping dependency install")
+    elif stamp.get('requirements') == current_requirements:
+        logger.info("Requirements unchanged, skipping install")
+    else:
+        if not install_requirements():
+            logger.error("Failed to install requirements")
+            return False
+        stamp['requirements'] = current_requirements
+        save_stamp(stamp)
+
+    # Models: the stamp records size and mtime of each file, so an unchanged manifest
+    # skips both the download script and its disk-space check
+    from download_models import MODELS
+    manifest = model_manifest(MODELS)
+    if stamp.get('models') == manifest and models_complete(MODELS, manifest):
+        logger.info("Models unchanged, skipping download check")
+    else:
+        if not models_complete(MODELS, manifest):
+            import download_models
+            if not download_models.main():
+                logger.error("Failed to download required models")
+                return False
+            manifest = model_manifest(MODELS)
+        stamp['models'] = manifest
+        save_stamp(stamp)
+
+    logger.info("Boot checks complete")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fast startup checks for production boots")
+    parser.add_argument('--skip-install', action='store_true',
+                        help="Do not pip install even if requirements.txt changed")
+    parser.add_argument('--force', action='store_true', help="Ignore the stamp and re-run every step")
+    args = parser.parse_args()
+
+    success = main(skip_install=args.skip_install, force=args.force)
+    sys.exit(0 if success else 1)
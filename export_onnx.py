@@ -0,0 +1,45 @@
+import os
+import sys
+import argparse
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Export the SAM encoder and mask decoder to ONNX for the onnx segmenter backend."""
+    parser = argparse.ArgumentParser(description="Export SAM to ONNX")
+    parser.add_argument('--checkpoint', default=os.path.join('models', 'sam_vit_h_4b8939.pth'),
+                        help='Path to the SAM checkpoint')
+    parser.add_argument('--model-type', default='vit_h', choices=['vit_h', 'vit_l', 'vit_b'],
+                        help='SAM model variant matching the checkpoint')
+    parser.add_argument('--output-dir', default=os.path.join('models', 'onnx'),
+                        help='Directory to write the ONNX graphs to')
+    parser.add_argument('--opset', type=int, default=17, help='ONNX opset version')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.checkpoint):
+        logger.error(f"SAM checkpoint not found at: {args.checkpoint}")
+        logger.error("Please run get_models.py first to download required models.")
+        return False
+
+    try:
+        from segment_anything import sam_model_registry
+        from utils.onnx_sam import export_sam_onnx
+
+        logger.info(f"Loading SAM {args.model_type} from {args.checkpoint}...")
+        sam = sam_model_registry[args.model_type](checkpoint=args.checkpoint)
+        export_sam_onnx(sam, args.output_dir, opset=args.opset)
+        logger.info("\nExport complete! Start the application with SEGMENTER_BACKEND=onnx to use it.")
+        return True
+    except Exception as e:
+        logger.error(f"ONNX export failed: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
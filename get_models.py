@@ -31,6 +31,13 @@ def main():
         "control_v11p_sd15_inpaint.pth": "https://huggingface.co/lllyasviel/control_v11p_sd15_inpaint/resolve/main/diffusion_pytorch_model.bin"
     }
 
+    # Smaller SAM tiers used by SAM_MODEL_TYPE=cascade
+    if '--cascade' in sys.argv:
+        models.update({
+            "sam_vit_b_01ec64.pth": "https://dl.fbaipublicfiles.com/segment_anything/sam_vit_b_01ec64.pth",
+            "sam_vit_l_0b3195.pth": "https://dl.fbaipublicfiles.com/segment_anything/sam_vit_l_0b3195.pth"
+        })
+
     success = True
     for filename, url in models.items():
         filepath = os.path.join('models', filename)
@@ -0,0 +1,17 @@
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Each worker process has its own scheduler lanes; threads let requests wait on them
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Import wsgi.py (and load models) once in the master before forking workers
+preload_app = os.environ.get('PRELOAD_MODELS', '1') == '1'
+
+# Generation can take minutes on CPU
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 900))
+graceful_timeout = 60
+
+accesslog = '-'
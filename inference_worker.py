@@ -0,0 +1,276 @@
+"""Inference worker node: runs segmentation and generation jobs for front ends configured with INFERENCE_WORKERS.
+
+Backends and models are configured with the same environment variables as app.py
+(SEGMENTER_BACKEND, GENERATOR_BACKEND, SAM_MODEL_TYPE, SAM_POOL_SIZE, MEMORY_BUDGET_GB, ...).
+Models load in the background; /health reports "loading" until they are ready, then
+"ok" with the running, queued and maximum jobs per role, which front ends use to route
+to the least loaded worker.
+
+Usage: python inference_worker.py [--port 6001] [--host 0.0.0.0]
+       python inference_worker.py --processes 3 [--port 6001]   (local workers on ports 6001-6003)
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import subprocess
+import logging
+
+import numpy as np
+from flask import Flask, g, request, jsonify
+
+import app as frontend
+from utils.remote import encode_image, decode_image, encode_mask, ROLE_PATHS
+from utils.generators import check_token_merging
+from utils.tracing import Trace, TraceBuffer, activate, new_trace_id
+
+logger = logging.getLogger(__name__)
+
+# Concurrent jobs per role: SAM predictor contexts, and generation pipeline calls (one
+# pipeline is not safe to call concurrently)
+SEGMENT_SLOTS = int(os.environ.get('WORKER_SEGMENT_SLOTS', frontend.SAM_POOL_SIZE))
+GENERATE_SLOTS = int(os.environ.get('WORKER_GENERATE_SLOTS', 1))
+# Jobs allowed to queue per role before answering 503 so the front end retries elsewhere
+MAX_WAITING = int(os.environ.get('WORKER_MAX_WAITING', 16))
+
+
+class WorkerBusy(Exception):
+    """The worker cannot take the job now: models not ready or the role's queue is full."""
+
+
+class RoleSlots:
+    """Concurrency limit and load counters for one role."""
+
+    def __init__(self, capacity, max_waiting):
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self._semaphore = threading.BoundedSemaphore(capacity)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+
+    def run(self, fn, *args, **kwargs):
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                raise WorkerBusy(f"{self.waiting} jobs already queued")
+            self.waiting += 1
+        with self._semaphore:
+            with self._lock:
+                self.waiting -= 1
+                self.active += 1
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.active -= 1
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self.active,
+                'waiting': self.waiting,
+                'capacity': self.capacity,
+                'completed': self.completed,
+                'failed': self.failed,
+            }
+
+
+app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = 64 * 1024 * 1024
+
+slots = {'segment': RoleSlots(SEGMENT_SLOTS, MAX_WAITING), 'generate': RoleSlots(GENERATE_SLOTS, MAX_WAITING)}
+state = {'status': 'loading', 'error': None}
+traces = TraceBuffer(frontend.TRACE_BUFFER)
+
+def load_models():
+    """Initialize the image processor with the configured local backends."""
+    try:
+        if frontend.SEGMENTER_BACKEND == 'remote' or frontend.GENERATOR_BACKEND == 'remote':
+            raise ValueError("Inference workers need local backends; unset INFERENCE_WORKERS for worker processes")
+        frontend.init_image_processor()
+        state['status'] = 'ok'
+        logger.info("Inference worker ready")
+    except Exception as e:
+        logger.error(f"Inference worker failed to load models: {str(e)}")
+        state['status'] = 'error'
+        state['error'] = str(e)
+
+def start_loading():
+    thread = threading.Thread(target=load_models, name="load-models", daemon=True)
+    thread.start()
+    return thread
+
+def segment(image, point_coords, point_labels):
+    with frontend.models.lease() as deployment:
+        processor = deployment.processor
+        with processor.memory.use('sam', stage='segmentation'):
+            return processor.segmenter.segment(image, point_coords, point_labels), deployment.version
+
+def generate(prompts, init_image, control_image, mask_image, size, seeds, token_merging, fast):
+    with frontend.models.lease() as deployment:
+        processor = deployment.processor
+        with processor.memory.use('diffusion', stage='generation'):
+            images = processor.generator.generate(prompts, init_image, control_image, mask_image,
+                                                  size=size, seeds=seeds, token_merging=token_merging,
+                                                  fast=fast)
+        return images, deployment.version
+
+# Model versions are registered and hot-swapped on each worker as on a single-process server
+app.add_url_rule('/admin/models', view_func=frontend.admin_models, methods=['GET', 'POST'])
+app.add_url_rule('/admin/models/activate', view_func=frontend.admin_activate_model, methods=['POST'])
+
+@app.before_request
+def start_trace():
+    if request.path in ROLE_PATHS.values() and frontend.TRACE_BUFFER:
+        # Keep the front end's trace ID so both sides of a job can be matched up
+        g.trace = Trace(f"{request.method} {request.path}", new_trace_id(request.headers.get('X-Trace-Id')))
+        activate(g.trace)
+
+@app.teardown_request
+def finish_trace(exc):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        trace.finish(500 if exc is not None else trace.status)
+        traces.add(trace)
+        activate(None)
+
+@app.after_request
+def tag_trace(response):
+    trace = g.get('trace')
+    if trace is not None:
+        trace.status = response.status_code
+    return response
+
+def run_job(role, fn, *args, **kwargs):
+    """Run a job in its role's slots once the models are ready."""
+    if state['status'] != 'ok':
+        raise WorkerBusy(f"models not ready ({state['error'] or state['status']})")
+    return slots[role].run(fn, *args, **kwargs)
+
+@app.route('/health')
+def health():
+    """Readiness, backends and per-role load."""
+    processor = frontend.models.processor
+    body = {
+        'status': state['status'],
+        'error': state['error'],
+        'model_version': frontend.models.version,
+        'backends': {
+            'segmenter': processor.segmenter.name if processor else None,
+            'generator': processor.generator.name if processor else None,
+        },
+        'roles': {role: role_slots.stats() for role, role_slots in slots.items()},
+    }
+    return jsonify(body), 200 if state['status'] == 'ok' else 503
+
+@app.route(ROLE_PATHS['segment'], methods=['POST'])
+def infer_segment():
+    data = request.get_json(silent=True) or {}
+    try:
+        image = np.asarray(decode_image(data['image']).convert('RGB'))
+        point_coords = np.asarray(data['point_coords'])
+        point_labels = np.asarray(data['point_labels'])
+    except Exception as e:
+        return jsonify({'error': f'Invalid segmentation job: {str(e)}'}), 400
+
+    try:
+        (mask, score, label), model_version = run_job('segment', segment, image, point_coords, point_labels)
+        return jsonify({'mask': encode_mask(mask), 'score': float(score), 'label': label,
+                        'model_version': model_version})
+    except WorkerBusy as e:
+        return jsonify({'error': f'Worker busy: {str(e)}', 'busy': True}), 503
+    except Exception as e:
+        logger.error(f"Error in segmentation job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route(ROLE_PATHS['generate'], methods=['POST'])
+def infer_generate():
+    data = request.get_json(silent=True) or {}
+    try:
+        prompts = [str(prompt) for prompt in data['prompts']]
+        init_image = decode_image(data['init_image']).convert('RGB')
+        control_image = decode_image(data['control_image']).convert('RGB')
+        mask_image = decode_image(data['mask_image'])
+        size = int(data.get('size', 512))
+        seeds = data.get('seeds')
+        if seeds is not None:
+            seeds = [int(seed) for seed in seeds]
+            if len(seeds) != len(prompts):
+                raise ValueError("seeds and prompts differ in length")
+        token_merging = data.get('token_merging')
+        if token_merging is not None:
+            token_merging = check_token_merging(token_merging)
+        fast = bool(data.get('fast', False))
+    except Exception as e:
+        return jsonify({'error': f'Invalid generation job: {str(e)}'}), 400
+
+    try:
+        images, model_version = run_job('generate', generate, prompts, init_image, control_image, mask_image,
+                                        size, seeds, token_merging, fast)
+        return jsonify({'images': [encode_image(image) for image in images], 'model_version': model_version})
+    except WorkerBusy as e:
+        return jsonify({'error': f'Worker busy: {str(e)}', 'busy': True}), 503
+    except Exception as e:
+        logger.error(f"Error in generation job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/traces/<trace_id>')
+def trace_detail(trace_id):
+    """Worker-side spans of a job, by the front end's trace ID."""
+    denied = frontend.admin_denied()
+    if denied:
+        return denied
+    trace = traces.get(trace_id)
+    if trace is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    return jsonify(trace.to_dict())
+
+def spawn_local(count, host, port):
+    """Start ``count`` worker processes on consecutive ports and wait for them."""
+    env = {key: value for key, value in os.environ.items() if key != 'INFERENCE_WORKERS'}
+    processes = []
+    for index in range(count):
+        command = [sys.executable, os.path.abspath(__file__), '--host', host, '--port', str(port + index)]
+        processes.append(subprocess.Popen(command, env=env))
+    urls = ','.join(f"http://{'127.0.0.1' if host == '0.0.0.0' else host}:{port + index}" for index in range(count))
+    logger.info(f"Started {count} inference workers; run front ends with INFERENCE_WORKERS={urls}")
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+        logger.error("An inference worker exited, stopping the others")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+    return all(process.returncode in (0, -15) for process in processes)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve segmentation and generation jobs for remote front ends")
+    parser.add_argument('--host', default='0.0.0.0', help="Interface to listen on")
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 6001)), help="Port (first port with --processes)")
+    parser.add_argument('--processes', type=int, default=0, help="Start this many local workers on consecutive ports")
+    args = parser.parse_args(argv)
+
+    if args.processes:
+        return spawn_local(args.processes, args.host, args.port)
+
+    start_loading()
+    app.run(host=args.host, port=args.port, threaded=True)
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
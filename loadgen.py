@@ -0,0 +1,355 @@
+"""Replay a traffic log recorded with TRAFFIC_LOG against a running server or the in-process app.
+
+Uploads are replayed with the recorded image when it can be found (by content hash) in
+--images directories, otherwise with a synthetic image of the recorded dimensions. A
+/generate entry is sent for the replayed upload of the same image; images generated from
+but not uploaded in the log are uploaded first, outside the measurements.
+
+Usage: python loadgen.py traffic.jsonl [--url http://localhost:5000 | --in-process]
+                         [--concurrency 4] [--rate 2 | --speed 1] [--images uploads] [--output report.json]
+"""
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from utils.storage import NAME_PATTERN
+from utils.traffic import load_log
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+REPLAYED_ENDPOINTS = ('/upload', '/generate')
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+MIMETYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg'}
+
+class HttpClient:
+    """Send requests to a running server."""
+
+    def __init__(self, base_url, timeout=900):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def upload(self, name, data):
+        ext = name.rsplit('.', 1)[1]
+        response = self.session.post(f"{self.base_url}/upload", files={'file': (name, data, MIMETYPES[ext])},
+                                     timeout=self.timeout)
+        return response.status_code, self._json(response)
+
+    def generate(self, body):
+        response = self.session.post(f"{self.base_url}/generate", json=body, timeout=self.timeout)
+        return response.status_code, self._json(response)
+
+    @staticmethod
+    def _json(response):
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+class AppClient:
+    """Send requests to the Flask app in this process through per-thread test clients."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def upload(self, name, data):
+        response = self._client().post('/upload', data={'file': (io.BytesIO(data), name)},
+                                       content_type='multipart/form-data')
+        return response.status_code, response.get_json(silent=True) or {}
+
+    def generate(self, body):
+        response = self._client().post('/generate', json=body)
+        return response.status_code, response.get_json(silent=True) or {}
+
+class ImageSource:
+    """Bytes for a recorded upload: the original from disk when found, else a synthetic stand-in."""
+
+    def __init__(self, directories=()):
+        self.directories = list(directories)
+        self._index = None
+        self._lock = threading.Lock()
+        self.found = 0
+        self.synthesized = 0
+
+    def _build_index(self):
+        """Map content digests to paths; store names carry their digest, other files are hashed."""
+        index = {}
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    if name.rsplit('.', 1)[-1].lower() not in IMAGE_EXTENSIONS:
+                        continue
+                    path = os.path.join(root, name)
+                    match = NAME_PATTERN.match(name)
+                    if match:
+                        if match.group('kind') is None:
+                            index[match.group('digest')] = path
+                        continue
+                    with open(path, 'rb') as f:
+                        index[hashlib.sha256(f.read()).hexdigest()] = path
+        logger.info(f"Indexed {len(index)} source images")
+        return index
+
+    def get(self, recorded):
+        """(upload name, bytes) for an entry's recorded input."""
+        digest, ext = recorded['filename'].split('.', 1)
+        with self._lock:
+            if self._index is None:
+                self._index = self._build_index()
+            path = self._index.get(digest)
+            if path is not None:
+                self.found += 1
+            else:
+                self.synthesized += 1
+        if path is not None:
+            with open(path, 'rb') as f:
+                return recorded['filename'], f.read()
+        return f"synthetic-{digest[:12]}.{ext}", synthetic_image(digest, recorded.get('width'),
+                                                                 recorded.get('height'), ext)
+
+def synthetic_image(digest, width, height, ext):
+    """Deterministic noise image for a digest, so repeated uploads of one image still deduplicate."""
+    rng = np.random.default_rng(int(digest[:16], 16))
+    pixels = rng.integers(0, 256, (height or 512, width or 512, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG' if ext == 'png' else 'JPEG', quality=90)
+    return buffer.getvalue()
+
+def percentile(values, q):
+    """q-th percentile (0-100) with linear interpolation; None for no values."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+class Replayer:
+    """Replay log entries at a target schedule with at most ``concurrency`` requests in flight."""
+
+    def __init__(self, client, images, concurrency=4):
+        self.client = client
+        self.images = images
+        self.concurrency = concurrency
+        self._uploaded = {}
+        self._upload_locks = {}
+        self._pending_uploads = {}
+        self._lock = threading.Lock()
+
+    def _expect_upload(self, recorded):
+        """Note, in log order, that an upload of this input has been dispatched."""
+        with self._lock:
+            self._pending_uploads.setdefault(recorded['filename'], threading.Event())
+
+    def _upload(self, recorded):
+        """Upload a recorded input and map its recorded name to the name the server returned."""
+        try:
+            name, data = self.images.get(recorded)
+            status, body = self.client.upload(name, data)
+            if status == 200 and body.get('original_image'):
+                with self._lock:
+                    self._uploaded[recorded['filename']] = body['original_image']
+            return status, body
+        finally:
+            with self._lock:
+                pending = self._pending_uploads.get(recorded['filename'])
+            if pending is not None:
+                pending.set()
+
+    def _server_name(self, recorded):
+        """Server-side name of a recorded input, uploading it first (untimed) if needed."""
+        # A dispatched upload of the same image comes first, as it did when recorded
+        with self._lock:
+            pending = self._pending_uploads.get(recorded['filename'])
+        if pending is not None:
+            pending.wait()
+        with self._lock:
+            if recorded['filename'] in self._uploaded:
+                return self._uploaded[recorded['filename']]
+            lock = self._upload_locks.setdefault(recorded['filename'], threading.Lock())
+        with lock:
+            with self._lock:
+                if recorded['filename'] in self._uploaded:
+                    return self._uploaded[recorded['filename']]
+            status, body = self._upload(recorded)
+            if status != 200:
+                raise RuntimeError(f"Setup upload failed with status {status}: {body.get('error')}")
+            return body['original_image']
+
+    def run_entry(self, entry):
+        """Send one entry. Returns its endpoint, status, latency and error, if any."""
+        result = {'endpoint': entry['endpoint'], 'status': None, 'latency': None, 'error': None}
+        try:
+            if entry['endpoint'] == '/upload':
+                start = time.perf_counter()
+                status, body = self._upload(entry['input'])
+            else:
+                request = dict(entry.get('request', {}), filename=self._server_name(entry['input']))
+                start = time.perf_counter()
+                status, body = self.client.generate(request)
+            result['latency'] = time.perf_counter() - start
+            result['status'] = status
+            if status >= 400:
+                result['error'] = body.get('error') or f"HTTP {status}"
+        except Exception as e:
+            result['error'] = str(e)
+        return result
+
+    def replay(self, entries, rate=None, speed=1.0):
+        """Send entries on schedule: fixed ``rate`` per second, else recorded spacing divided by ``speed``
+        (0 = back to back). Returns the results and the wall time taken."""
+        slots = threading.Semaphore(self.concurrency)
+        results = []
+        first_ts = entries[0].get('ts', 0) if entries else 0
+
+        def send(entry, due):
+            try:
+                result = self.run_entry(entry)
+                result['lag'] = max(sent_at[id(entry)] - due, 0.0)
+                results.append(result)
+            finally:
+                slots.release()
+
+        sent_at = {}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for index, entry in enumerate(entries):
+                if rate:
+                    due = start + index / rate
+                elif speed:
+                    due = start + (entry.get('ts', first_ts) - first_ts) / speed
+                else:
+                    due = start
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                slots.acquire()
+                if entry['endpoint'] == '/upload':
+                    self._expect_upload(entry['input'])
+                sent_at[id(entry)] = time.perf_counter()
+                executor.submit(send, entry, due)
+        return results, time.perf_counter() - start
+
+def replayable(entries):
+    """Entries this tool can replay: /upload and /generate requests with a recorded input."""
+    return [
+        entry for entry in entries
+        if entry.get('endpoint') in REPLAYED_ENDPOINTS and (entry.get('input') or {}).get('filename')
+    ]
+
+def summarize(results, elapsed):
+    """Throughput, error rate and latency percentiles overall and per endpoint."""
+    def stats(group):
+        latencies = [r['latency'] for r in group if r['error'] is None]
+        statuses = {}
+        for r in group:
+            key = str(r['status']) if r['status'] is not None else 'exception'
+            statuses[key] = statuses.get(key, 0) + 1
+        errors = sum(1 for r in group if r['error'] is not None)
+        return {
+            'requests': len(group),
+            'errors': errors,
+            'error_rate': errors / len(group) if group else 0.0,
+            'throughput': (len(group) - errors) / elapsed if elapsed else 0.0,
+            'statuses': statuses,
+            'latency': {
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p99': percentile(latencies, 99),
+                'max': max(latencies) if latencies else None,
+            },
+            'max_lag': max((r['lag'] for r in group), default=0.0),
+        }
+
+    report = {'elapsed': elapsed, 'overall': stats(results), 'endpoints': {}}
+    for endpoint in REPLAYED_ENDPOINTS:
+        group = [r for r in results if r['endpoint'] == endpoint]
+        if group:
+            report['endpoints'][endpoint] = stats(group)
+    return report
+
+def print_report(report):
+    def seconds(value):
+        return '-' if value is None else f"{value:.2f}"
+
+    print(f"\nReplayed in {report['elapsed']:.1f}s\n")
+    print(f"{'endpoint':<12} {'requests':>8} {'errors':>7} {'rate':>6} {'ok/s':>7} "
+          f"{'p50 s':>7} {'p90 s':>7} {'p99 s':>7} {'max s':>7}")
+    rows = list(report['endpoints'].items()) + [('overall', report['overall'])]
+    for name, stats in rows:
+        latency = stats['latency']
+        print(f"{name:<12} {stats['requests']:8d} {stats['errors']:7d} {stats['error_rate']:6.1%} "
+              f"{stats['throughput']:7.2f} {seconds(latency['p50']):>7} {seconds(latency['p90']):>7} "
+              f"{seconds(latency['p99']):>7} {seconds(latency['max']):>7}")
+    print(f"\nStatus codes: {report['overall']['statuses']}")
+    if report['overall']['max_lag'] > 1:
+        print(f"Warning: requests were sent up to {report['overall']['max_lag']:.1f}s late; "
+              f"raise --concurrency to hold the target rate")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded traffic and report latency")
+    parser.add_argument('log', help="Traffic log written by the app with TRAFFIC_LOG set")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', default='http://localhost:5000', help="Server to replay against")
+    target.add_argument('--in-process', action='store_true', help="Replay against app.py's Flask test client")
+    parser.add_argument('--concurrency', type=int, default=4, help="Most requests in flight")
+    parser.add_argument('--rate', type=float, default=None, help="Requests per second, ignoring recorded timing")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Recorded timing speed-up factor (0 = send back to back)")
+    parser.add_argument('--images', action='append', default=[],
+                        help="Directory of source images, searched by content hash (repeatable)")
+    parser.add_argument('--limit', type=int, default=None, help="Replay only the first N entries")
+    parser.add_argument('--output', help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    entries = replayable(load_log(args.log))[:args.limit]
+    if not entries:
+        logger.error(f"No replayable /upload or /generate entries in {args.log}")
+        return False
+
+    if args.in_process:
+        from app import app
+        client = AppClient(app)
+    else:
+        client = HttpClient(args.url)
+
+    images = ImageSource(args.images)
+    logger.info(f"Replaying {len(entries)} requests with concurrency {args.concurrency}")
+    results, elapsed = Replayer(client, images, concurrency=args.concurrency).replay(
+        entries, rate=args.rate, speed=args.speed
+    )
+    report = summarize(results, elapsed)
+    report['images'] = {'found': images.found, 'synthesized': images.synthesized}
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {args.output}")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
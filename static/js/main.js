@@ -14,6 +14,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
     let currentFilename = null;
 
+    // Previews are served as cached WebP thumbnails instead of full-size originals
+    const PREVIEW_WIDTH = 512;
+    function previewUrl(filename) {
+        return `/uploads/${filename}?w=${PREVIEW_WIDTH}`;
+    }
+
     // File size validation (16MB)
     const MAX_FILE_SIZE = 16 * 1024 * 1024;
 
@@ -71,14 +77,14 @@ document.addEventListener('DOMContentLoaded', function() {
             updateProgress(70, 'Processing segmentation...');
 
             // Display results
-            originalImage.src = `/uploads/${data.original_image}`;
+            originalImage.src = previewUrl(data.original_image);
             originalImage.alt = 'Original clothing';
 
-            maskImage.src = `/uploads/${data.mask_image}`;
+            maskImage.src = previewUrl(data.mask_image);
             maskImage.alt = 'Segmented mask';
 
             if (data.masked_image) {
-                maskedImage.src = `/uploads/${data.masked_image}`;
+                maskedImage.src = previewUrl(data.masked_image);
                 maskedImage.alt = 'Masked result';
             }
 
@@ -138,7 +144,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
 
             // Display try-on result
-            tryonImage.src = `/uploads/${data.tryon_image}`;
+            tryonImage.src = previewUrl(data.tryon_image);
             tryonImage.alt = 'Try-on result';
 
             if (data.prompt_used) {
@@ -0,0 +1,68 @@
+import os
+import sys
+import threading
+import unittest
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.admission import AdmissionController, AdmissionRejected, DurationEstimator
+from utils.scheduler import Lane, Scheduler
+
+class TestDurationEstimator(unittest.TestCase):
+    def test_prior_before_samples(self):
+        """Test the prior rate is used until enough jobs are observed."""
+        estimator = DurationEstimator({'generation': 2.0})
+        estimator.observe('generation', 10, 100.0)
+        self.assertAlmostEqual(estimator.estimate('generation', 30), 60.0)
+
+    def test_linear_fit(self):
+        """Test base and rate are recovered from jobs of different sizes."""
+        estimator = DurationEstimator({'segmentation': 5.0})
+        for units in (1, 2, 4, 8):
+            estimator.observe('segmentation', units, 3.0 + 0.5 * units)
+        self.assertAlmostEqual(estimator.estimate('segmentation', 16), 11.0)
+
+    def test_constant_size_uses_rate(self):
+        """Test same-sized jobs fall back to mean seconds per unit."""
+        estimator = DurationEstimator({'generation': 2.0})
+        for _ in range(3):
+            estimator.observe('generation', 30, 45.0, profile='full')
+        self.assertAlmostEqual(estimator.estimate('generation', 30, profile='full'), 45.0)
+        self.assertAlmostEqual(estimator.estimate('generation', 30, profile='crop'), 60.0)
+
+class TestAdmissionController(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler([Lane('generation')])
+        self.controller = AdmissionController(
+            self.scheduler, DurationEstimator({'generation': 1.0}), {'generation': 10}
+        )
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def test_idle_lane_admits(self):
+        """Test a job is admitted on an idle lane even if it alone exceeds the SLO."""
+        future, wait, duration = self.controller.submit('generation', lambda: 'ok', units=20)
+        self.assertEqual(future.result(5), 'ok')
+        self.assertEqual(wait, 0.0)
+        self.assertEqual(duration, 20.0)
+
+    def test_rejects_over_slo(self):
+        """Test a job that would miss the SLO behind queued work is rejected with retry-after."""
+        release = threading.Event()
+        future, _, _ = self.controller.submit('generation', release.wait, 5, units=8)
+        try:
+            with self.assertRaises(AdmissionRejected) as context:
+                self.controller.submit('generation', lambda: None, units=4)
+            self.assertEqual(context.exception.predicted_wait, 8.0)
+            self.assertEqual(context.exception.retry_after, 2)
+            _, wait, _ = self.controller.submit('generation', lambda: None, units=1)
+            self.assertEqual(wait, 8.0)
+        finally:
+            release.set()
+            future.result(5)
+        self.assertEqual(self.controller.stats()['lanes']['generation']['rejected'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
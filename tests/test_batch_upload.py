@@ -0,0 +1,109 @@
+import io
+import os
+import sys
+import json
+import shutil
+import zipfile
+import tempfile
+import unittest
+from PIL import Image
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from utils.storage import UploadStore
+from utils.model_registry import ModelManager
+from utils.segmenters import Segmenter
+
+class FakeProcessor:
+    """Writes placeholder outputs instead of running SAM; fails on red images."""
+    segmenter = Segmenter()
+
+    def process_image(self, image_path):
+        if Image.open(image_path).getpixel((0, 0))[0] == 255:
+            raise ValueError("segmentation failed")
+        return image_path
+
+    def save_mask(self, mask, mask_path):
+        open(mask_path, 'wb').close()
+
+    def save_mask_rle(self, mask, rle_path):
+        open(rle_path, 'w').close()
+
+    def apply_mask_to_image(self, image_path, mask_path, masked_path):
+        open(masked_path, 'wb').close()
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+class TestBatchUpload(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original_store = app_module.upload_store
+        self.original_models = app_module.models
+        app_module.upload_store = UploadStore(self.temp_dir)
+        app_module.models = ModelManager()
+        app_module.models.activate(app_module.MODEL_VERSION, FakeProcessor())
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        app_module.upload_store = self.original_store
+        app_module.models = self.original_models
+        shutil.rmtree(self.temp_dir)
+
+    def post_lines(self, **kwargs):
+        response = self.client.post('/upload/batch', **kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        return {line['index']: line for line in map(json.loads, response.get_data(as_text=True).splitlines())}
+
+    def test_multipart_list(self):
+        """Test each file gets one result line, with per-image errors."""
+        files = [
+            (io.BytesIO(png_bytes('blue')), 'a.png'),
+            (io.BytesIO(png_bytes('green')), 'b.png'),
+            (io.BytesIO(b'GIF89a'), 'c.gif'),
+            (io.BytesIO(png_bytes('red')), 'd.png'),
+        ]
+        lines = self.post_lines(data={'files': files})
+        self.assertEqual(sorted(lines), [0, 1, 2, 3])
+        self.assertTrue(lines[0]['success'])
+        self.assertTrue(app_module.upload_store.exists(lines[1]['mask_image']))
+        self.assertEqual(lines[2]['error'], 'Invalid file type')
+        self.assertIn('segmentation failed', lines[3]['error'])
+
+    def test_zip_body(self):
+        """Test a zip request body is expanded, skipping directories."""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('garments/', '')
+            zf.writestr('garments/shirt.png', png_bytes('blue'))
+            zf.writestr('garments/dress.jpg', png_bytes('green'))
+        lines = self.post_lines(data=archive.getvalue(), content_type='application/zip')
+        self.assertEqual({line['name'] for line in lines.values()}, {'shirt.png', 'dress.jpg'})
+        self.assertTrue(all(line['success'] for line in lines.values()))
+
+    def test_non_ascii_filenames(self):
+        """Test the extension of a non-ASCII filename is kept by /upload and /upload/batch."""
+        response = self.client.post('/upload', data={'file': (io.BytesIO(png_bytes('blue')), 'фото.png')},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()['original_image'].endswith('.png'))
+        lines = self.post_lines(data={'files': [(io.BytesIO(png_bytes('green')), 'фото.png')]})
+        self.assertTrue(lines[0]['success'])
+
+    def test_bad_zip(self):
+        """Test an unreadable archive is rejected with 400 before any results stream."""
+        response = self.client.post('/upload/batch', data=b'not a zip', content_type='application/zip')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Invalid zip archive', response.get_json()['error'])
+        files = [(io.BytesIO(png_bytes('blue')), 'a.png'), (io.BytesIO(b'PK\x03\x04broken'), 'b.zip')]
+        response = self.client.post('/upload/batch', data={'files': files})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.mimetype, 'application/json')
+
+if __name__ == '__main__':
+    unittest.main()
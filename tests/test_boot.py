@@ -0,0 +1,57 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import boot
+import download_models
+
+class TestBoot(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+        with open('requirements.txt', 'w') as f:
+            f.write('flask\n')
+        os.makedirs('models')
+        with open('models/tiny.pth', 'wb') as f:
+            f.write(b'x' * 10)
+        self.models = {'Tiny': {'url': 'http://invalid', 'path': 'models/tiny.pth', 'size': 10}}
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir)
+
+    def run_boot(self):
+        with mock.patch.object(download_models, 'MODELS', self.models), \
+             mock.patch.object(download_models, 'main', return_value=True) as download, \
+             mock.patch.object(boot, 'install_requirements', return_value=True) as install:
+            self.assertTrue(boot.main())
+        return install.call_count, download.call_count
+
+    def test_second_boot_skips_work(self):
+        """Test an unchanged stamp skips both install and download."""
+        self.assertEqual(self.run_boot(), (1, 0))
+        self.assertEqual(self.run_boot(), (0, 0))
+
+    def test_changed_requirements_reinstall(self):
+        """Test editing requirements.txt triggers a reinstall."""
+        self.run_boot()
+        with open('requirements.txt', 'a') as f:
+            f.write('numpy\n')
+        self.assertEqual(self.run_boot(), (1, 0))
+
+    def test_missing_model_downloads(self):
+        """Test a missing or truncated model runs the download script."""
+        self.run_boot()
+        with open('models/tiny.pth', 'wb') as f:
+            f.write(b'x')
+        self.assertEqual(self.run_boot(), (0, 1))
+
+if __name__ == '__main__':
+    unittest.main()
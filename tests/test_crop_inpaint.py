@@ -0,0 +1,61 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.crop_inpaint import mask_bbox, feather_mask, paste_back
+
+class TestCropInpaint(unittest.TestCase):
+    def setUp(self):
+        self.mask = np.zeros((400, 600), dtype=bool)
+        self.mask[100:200, 250:300] = True
+
+    def test_mask_bbox_is_square_with_margin(self):
+        """Test the crop box covers the mask plus margin and is square."""
+        x0, y0, x1, y1 = mask_bbox(self.mask, margin=0.1)
+        self.assertEqual(x1 - x0, y1 - y0)
+        self.assertEqual(x1 - x0, 120)
+        self.assertLessEqual(x0, 250)
+        self.assertGreaterEqual(x1, 300)
+        self.assertLessEqual(y0, 100)
+        self.assertGreaterEqual(y1, 200)
+
+    def test_mask_bbox_clamped_to_image(self):
+        """Test boxes near the border stay inside the image."""
+        mask = np.zeros((400, 600), dtype=bool)
+        mask[0:390, 0:20] = True
+        x0, y0, x1, y1 = mask_bbox(mask, margin=0.5)
+        self.assertGreaterEqual(x0, 0)
+        self.assertGreaterEqual(y0, 0)
+        self.assertLessEqual(x1, 600)
+        self.assertLessEqual(y1, 400)
+
+    def test_mask_bbox_empty_mask(self):
+        """Test an empty mask cannot be cropped."""
+        with self.assertRaises(ValueError):
+            mask_bbox(np.zeros((10, 10), dtype=bool))
+
+    def test_feather_mask_range(self):
+        """Test feathered alpha stays in [0, 1] and softens edges."""
+        alpha = feather_mask(self.mask.astype(np.uint8) * 255, radius=4)
+        self.assertAlmostEqual(float(alpha.max()), 1.0, places=5)
+        self.assertGreaterEqual(float(alpha.min()), 0.0)
+        self.assertTrue(0.0 < alpha[150, 250] < 1.0)
+
+    def test_paste_back_keeps_outside_pixels(self):
+        """Test only the masked region changes at original resolution."""
+        original = np.full((400, 600, 3), 10, dtype=np.uint8)
+        bbox = mask_bbox(self.mask, margin=0.1)
+        generated = np.full((512, 512, 3), 200, dtype=np.uint8)
+
+        result = paste_back(original, generated, bbox, self.mask.astype(np.uint8) * 255, feather_radius=0)
+        self.assertEqual(result.shape, original.shape)
+        self.assertTrue((result[150, 275] == 200).all())
+        self.assertTrue((result[0, 0] == 10).all())
+        self.assertTrue((result[150, 245] == 10).all())
+
+if __name__ == '__main__':
+    unittest.main()
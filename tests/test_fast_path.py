@@ -0,0 +1,104 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import importlib.util
+import unittest
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from utils.storage import UploadStore
+from utils.model_registry import ModelManager
+from utils.image_processor import ImageProcessor
+from utils.generators import create_generator
+
+HAS_DIFFUSERS = importlib.util.find_spec('torch') and importlib.util.find_spec('diffusers')
+
+def save_tiny_lora(directory):
+    """A random LoRA adapter for the tiny generator's UNet, saved like LCM-LoRA."""
+    from peft import LoraConfig
+    from peft.utils import get_peft_model_state_dict
+    from diffusers import StableDiffusionControlNetInpaintPipeline
+    generator = create_generator('tiny')
+    generator.load()
+    unet = generator.pipe.unet
+    unet.add_adapter(LoraConfig(r=4, lora_alpha=4, init_lora_weights='gaussian',
+                                target_modules=['to_k', 'to_q', 'to_v', 'to_out.0']))
+    StableDiffusionControlNetInpaintPipeline.save_lora_weights(directory, unet_lora_layers=get_peft_model_state_dict(unet))
+    return os.path.join(directory, 'pytorch_lora_weights.safetensors')
+
+@unittest.skipUnless(HAS_DIFFUSERS, "torch and diffusers are not installed")
+class TestFastPath(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.image = Image.new('RGB', (128, 128), (200, 60, 60))
+        self.mask = Image.new('RGB', (128, 128), (255, 255, 255))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def generate(self, generator, fast=False):
+        image = generator.generate(['red shirt'], self.image, self.image, self.mask, size=128, seeds=[5], fast=fast)[0]
+        return np.asarray(image).astype(np.float64)
+
+    def test_falls_back_without_adapter(self):
+        """Test fast requests run the standard path when the adapter is missing."""
+        generator = create_generator('tiny', {'lcm_lora': os.path.join(self.temp_dir, 'missing')})
+        generator.load()
+        self.assertFalse(generator.fast_available)
+        np.testing.assert_array_equal(self.generate(generator, fast=True), self.generate(generator))
+
+    @unittest.skipUnless(importlib.util.find_spec('peft'), "peft is not installed")
+    def test_fast_path_with_adapter(self):
+        """Test the adapter only affects fast requests, which use the LCM scheduler and fewer steps."""
+        lora_path = save_tiny_lora(self.temp_dir)
+        standard = create_generator('tiny')
+        standard.load()
+        baseline = self.generate(standard)
+        generator = create_generator('tiny', {'lcm_lora': lora_path, 'fast_steps': 2})
+        generator.load()
+        self.assertTrue(generator.fast_available)
+        self.assertEqual(type(generator.fast_pipe.scheduler).__name__, 'LCMScheduler')
+
+        calls = []
+        hook = generator.pipe.unet.register_forward_pre_hook(lambda module, args: calls.append(1))
+        fast = self.generate(generator, fast=True)
+        self.assertEqual(len(calls), 2)
+        hook.remove()
+        self.assertFalse(np.array_equal(fast, baseline))
+        # The adapter is disabled again for standard requests
+        np.testing.assert_array_equal(self.generate(generator), baseline)
+
+class TestFastEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original = (app_module.upload_store, app_module.models)
+        app_module.upload_store = UploadStore(os.path.join(self.temp_dir, 'store'))
+        app_module.models = ModelManager()
+        app_module.models.activate(app_module.MODEL_VERSION,
+                                   ImageProcessor(segmenter_backend='stub', generator_backend='stub'))
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        app_module.upload_store, app_module.models = self.original
+        shutil.rmtree(self.temp_dir)
+
+    def test_fast_field(self):
+        """Test /generate accepts 'fast' and estimates fast requests separately."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (48, 32), 'blue').save(buffer, 'PNG')
+        response = self.client.post('/upload', data={'file': (io.BytesIO(buffer.getvalue()), 'shirt.png')},
+                                    content_type='multipart/form-data')
+        filename = response.get_json()['original_image']
+        response = self.client.post('/generate', json={'filename': filename, 'fast': True, 'seeds': [1]})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()['fast'])
+        self.assertIn('generation/full/fast', app_module.admission.estimator.stats())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import importlib.util
+import unittest
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.feature_cache import FeatureCache
+from utils.generators import create_generator
+
+@unittest.skipUnless(importlib.util.find_spec('torch') and importlib.util.find_spec('diffusers'),
+                     "torch and diffusers are not installed")
+class TestFeatureReuse(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.image = Image.new('RGB', (128, 128), (200, 60, 60))
+        cls.mask = Image.new('RGB', (128, 128), (255, 255, 255))
+
+    def generate(self, generator):
+        image = generator.generate(['red shirt'], self.image, self.image, self.mask, size=128, seeds=[5])[0]
+        return np.asarray(image).astype(np.float64)
+
+    def load(self, interval):
+        generator = create_generator('tiny', {'num_inference_steps': 6, 'feature_reuse_interval': interval})
+        generator.load()
+        return generator
+
+    def test_reuses_deep_blocks(self):
+        """Test deep blocks run only on full steps and the result stays close to the baseline."""
+        baseline = self.generate(self.load(0))
+        generator = self.load(3)
+        calls = []
+        # Hooks on sub-modules see whether the patched blocks actually ran
+        generator.pipe.unet.mid_block.resnets[0].register_forward_pre_hook(lambda module, args: calls.append('unet'))
+        cond_embedding = generator.pipe.controlnet.controlnet_cond_embedding.conv_in
+        cond_embedding.register_forward_pre_hook(lambda module, args: calls.append('cond'))
+
+        reused = self.generate(generator)
+        # Steps 0 and 3 of 6 run the UNet's deep blocks; the control image is embedded once
+        self.assertEqual(calls.count('unet'), 2)
+        self.assertEqual(calls.count('cond'), 1)
+        self.assertEqual(generator.feature_cache.stats()['reused_steps'], 4)
+        self.assertLess(np.abs(reused - baseline).mean(), 10)
+        # The cache is cleared between runs, so repeated runs are identical
+        np.testing.assert_array_equal(self.generate(generator), reused)
+
+    def test_detach_restores_full_steps(self):
+        """Test detaching the cache gives back the baseline output exactly."""
+        baseline = self.generate(self.load(0))
+        generator = self.load(2)
+        generator.feature_cache.detach()
+        np.testing.assert_array_equal(self.generate(generator), baseline)
+
+    def test_rejects_bad_settings(self):
+        """Test intervals below 2 and depths leaving nothing to cache are refused."""
+        with self.assertRaises(ValueError):
+            FeatureCache(interval=1)
+        generator = self.load(0)
+        with self.assertRaises(ValueError):
+            FeatureCache(interval=2, depth=2).attach(generator.pipe.unet)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from PIL import Image
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from app import generation_variants, CLOTHING_PROMPTS, MAX_VARIANTS
+from utils.storage import UploadStore
+from utils.model_registry import ModelManager
+from utils.image_processor import ImageProcessor
+
+class TestGenerationVariants(unittest.TestCase):
+    def test_single_default(self):
+        """Test a plain request is one variant with a random seed."""
+        variants = generation_variants({'clothing_type': 'shirt'})
+        self.assertEqual(len(variants), 1)
+        self.assertEqual(variants[0][0], CLOTHING_PROMPTS['shirt'])
+        self.assertIsInstance(variants[0][1], int)
+
+    def test_prompts_times_seeds(self):
+        """Test every prompt is generated once per seed."""
+        variants = generation_variants({'clothing_types': ['shirt', 'dress'], 'seeds': [1, 2]})
+        self.assertEqual(variants, [
+            (CLOTHING_PROMPTS['shirt'], 1), (CLOTHING_PROMPTS['shirt'], 2),
+            (CLOTHING_PROMPTS['dress'], 1), (CLOTHING_PROMPTS['dress'], 2),
+        ])
+
+    def test_num_images_per_prompt(self):
+        """Test num_images_per_prompt draws that many seeds per prompt."""
+        variants = generation_variants({'prompts': ['a red shirt'], 'num_images_per_prompt': 2})
+        self.assertEqual([prompt for prompt, _ in variants], ['a red shirt'] * 2)
+
+    def test_invalid_requests(self):
+        """Test malformed or oversized requests raise ValueError."""
+        for data in (
+            {'prompts': 'a red shirt'},
+            {'clothing_types': 'shirt'},
+            {'clothing_types': ['shirt', 3]},
+            {'clothing_type': ['shirt']},
+            {'seeds': [-1]},
+            {'seeds': [True]},
+            {'num_images_per_prompt': True},
+            {'seeds': [1, 2], 'num_images_per_prompt': 3},
+            {'num_images_per_prompt': 0},
+            {'num_images_per_prompt': MAX_VARIANTS + 1},
+        ):
+            with self.assertRaises(ValueError):
+                generation_variants(data)
+
+class TestGenerateEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original = (app_module.upload_store, app_module.models)
+        app_module.upload_store = UploadStore(os.path.join(self.temp_dir, 'store'))
+        app_module.models = ModelManager()
+        app_module.models.activate(app_module.MODEL_VERSION,
+                                   ImageProcessor(segmenter_backend='stub', generator_backend='stub'))
+        self.client = app_module.app.test_client()
+        buffer = io.BytesIO()
+        Image.new('RGB', (48, 32), 'blue').save(buffer, 'PNG')
+        response = self.client.post('/upload', data={'file': (io.BytesIO(buffer.getvalue()), 'shirt.png')},
+                                    content_type='multipart/form-data')
+        self.filename = response.get_json()['original_image']
+
+    def tearDown(self):
+        app_module.upload_store, app_module.models = self.original
+        shutil.rmtree(self.temp_dir)
+
+    def test_rejects_non_list_fields(self):
+        """Test /generate answers 400 when prompts or clothing types are not lists of strings."""
+        for fields in ({'clothing_types': 'shirt'}, {'clothing_types': [{'type': 'shirt'}]},
+                       {'prompts': 'a red shirt'}, {'prompts': [1, 2]}):
+            response = self.client.post('/generate', json={'filename': self.filename, **fields})
+            self.assertEqual(response.status_code, 400, fields)
+        response = self.client.post('/generate', json={'filename': self.filename, 'clothing_types': ['shirt'],
+                                                       'seeds': [1]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['variants']), 1)
+
+    def test_rejects_non_boolean_flags(self):
+        """Test /generate answers 400 when crop_to_mask or fast is not a JSON boolean."""
+        for fields in ({'crop_to_mask': 'false'}, {'crop_to_mask': 1}, {'fast': 'no'}, {'fast': None}):
+            response = self.client.post('/generate', json={'filename': self.filename, 'seeds': [1], **fields})
+            self.assertEqual(response.status_code, 400, fields)
+            self.assertIn('must be true or false', response.get_json()['error'])
+        response = self.client.post('/generate', json={'filename': self.filename, 'seeds': [1],
+                                                       'crop_to_mask': False, 'fast': True})
+        self.assertEqual(response.status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import importlib.util
+import unittest
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.generators import create_generator
+from utils.tracing import Trace, activate
+
+@unittest.skipUnless(importlib.util.find_spec('torch') and importlib.util.find_spec('diffusers'),
+                     "torch and diffusers are not installed")
+class TestGuidanceTruncation(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.image = Image.new('RGB', (128, 128), (200, 60, 60))
+        cls.mask = Image.new('RGB', (128, 128), (255, 255, 255))
+
+    def tearDown(self):
+        activate(None)
+
+    def load(self, **options):
+        generator = create_generator('tiny', {'num_inference_steps': 4, **options})
+        generator.load()
+        return generator
+
+    def generate(self, generator):
+        images = generator.generate(['red shirt', 'blue shirt'], self.image, self.image, self.mask, size=128,
+                                    seeds=[5, 6])
+        return np.asarray(images[0]).astype(np.float64)
+
+    def test_stops_guidance_after_fraction(self):
+        """Test late steps run the conditional batch alone and savings are counted."""
+        baseline = self.generate(self.load())
+        generator = self.load(cfg_stop=0.5)
+        batches = []
+        generator.pipe.unet.register_forward_pre_hook(lambda module, args: batches.append(args[0].shape[0]))
+        trace = Trace('POST /generate')
+        activate(trace)
+
+        truncated = self.generate(generator)
+        self.assertEqual(batches, [4, 4, 2, 2])
+        # The step timer still sees every step
+        self.assertEqual([s['name'] for s in trace.spans].count('denoise_step'), 4)
+        stats = generator.stats()['guidance']
+        self.assertEqual(stats['truncated'], 1)
+        self.assertEqual(stats['saved_unet_evaluations'], 4)
+        self.assertEqual(stats['unet_evaluations'], 12)
+        self.assertLess(np.abs(truncated - baseline).mean(), 10)
+
+    def test_stops_on_convergence(self):
+        """Test guidance stops once the two predictions are closer than the threshold."""
+        generator = self.load(cfg_converge_threshold=1e6)
+        self.generate(generator)
+        self.assertEqual(generator.stats()['guidance']['saved_unet_evaluations'], 6)
+
+        generator = self.load(cfg_converge_threshold=1e-9)
+        self.generate(generator)
+        self.assertEqual(generator.stats()['guidance']['saved_unet_evaluations'], 0)
+
+    def test_composes_with_feature_reuse(self):
+        """Test cached deep features are recomputed when the batch shrinks."""
+        generator = self.load(cfg_stop=0.5, feature_reuse_interval=4)
+        self.generate(generator)
+        self.assertEqual(generator.stats()['feature_reuse']['reused_steps'], 3)
+
+    def test_compiled_models_run_warmed_up_shapes(self):
+        """Test compiled models run variants one at a time, untruncated, at the warmed-up shapes."""
+        generator = self.load(cfg_stop=0.5, warmup_sizes=[128])
+        # Stands in for compiled models without compiling (see test_torch_compile)
+        generator.compile_models = True
+        shapes = []
+        generator.pipe.unet.register_forward_pre_hook(lambda module, args: shapes.append(tuple(args[0].shape)))
+        generator.warmup()
+        warmed_up = set(shapes)
+        shapes.clear()
+
+        self.generate(generator)
+        self.assertEqual(len(shapes), 8)
+        self.assertEqual(set(shapes), warmed_up)
+        self.assertEqual(generator.stats()['guidance']['saved_unet_evaluations'], 0)
+
+    def test_falsy_options_apply(self):
+        """Test zero-valued settings are passed on rather than replaced by the defaults."""
+        generator = create_generator('tiny', {'fast_guidance': 0.0, 'feature_reuse_interval': 0, 'scheduler': None})
+        self.assertEqual(generator.fast_guidance, 0.0)
+        self.assertEqual(generator.scheduler, 'unipc')
+        with self.assertRaises(ValueError):
+            create_generator('tiny', {'cfg_stop': 0})
+
+if __name__ == '__main__':
+    unittest.main()
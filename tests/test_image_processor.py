@@ -1,7 +1,12 @@
 import os
 import sys
+import inspect
+import shutil
+import tempfile
+import importlib.util
 import unittest
 from pathlib import Path
+import cv2
 import numpy as np
 from PIL import Image
 
@@ -9,6 +14,8 @@ from PIL import Image
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.image_processor import ImageProcessor
+from utils.segmenters import Segmenter, SEGMENTERS, register_segmenter
+from utils.generators import create_generator
 
 class TestImageProcessor(unittest.TestCase):
     def setUp(self):
@@ -110,5 +117,111 @@ class TestImageProcessor(unittest.TestCase):
             resized = self.processor._resize_and_pad(image, (512, 512))
             self.assertEqual(resized.size, (512, 512))
 
+class TestBackends(unittest.TestCase):
+    """ImageProcessor end to end with the checkpoint-free backends."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.image_path = os.path.join(self.test_dir, 'image.png')
+        pixels = np.full((400, 300, 3), 255, dtype=np.uint8)
+        pixels[100:300, 80:220] = [20, 40, 200]
+        Image.fromarray(pixels).save(self.image_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def segment_and_save(self, processor):
+        mask = processor.process_image(self.image_path)
+        mask_path = os.path.join(self.test_dir, 'mask.json')
+        processor.save_mask_rle(mask, mask_path)
+        return mask, mask_path
+
+    def test_stub_backends(self):
+        """Test the stub segmenter finds the garment and the stub generator is seed-deterministic."""
+        processor = ImageProcessor(segmenter_backend='stub', generator_backend='stub')
+        mask, mask_path = self.segment_and_save(processor)
+        self.assertEqual(mask.dtype, bool)
+        self.assertTrue(mask[200, 150])
+        self.assertFalse(mask[10, 10])
+        
+        first = processor.generate_variants(self.image_path, mask_path, ['shirt', 'shirt'], seeds=[1, 2])
+        again = processor.generate_try_on(self.image_path, mask_path, 'shirt', seed=1)
+        self.assertEqual(first[0].size, (512, 512))
+        self.assertEqual(first[0].tobytes(), again.tobytes())
+        self.assertNotEqual(first[0].tobytes(), first[1].tobytes())
+        
+        cropped = processor.generate_try_on(self.image_path, mask_path, 'shirt', crop_to_mask=True, crop_size=64)
+        self.assertEqual(cropped.size, (300, 400))
+
+    def test_registry(self):
+        """Test custom segmenters register by name and unknown names are rejected."""
+        @register_segmenter('everything')
+        class EverythingSegmenter(Segmenter):
+            def segment(self, image, point_coords, point_labels):
+                return np.ones(image.shape[:2], dtype=bool), 0.5, self.name
+        try:
+            processor = ImageProcessor(segmenter_backend='everything', generator_backend='stub')
+            self.assertTrue(processor.process_image(self.image_path).all())
+        finally:
+            del SEGMENTERS['everything']
+        with self.assertRaises(ValueError):
+            ImageProcessor(segmenter_backend='missing', generator_backend='stub')
+        with self.assertRaises(FileNotFoundError):
+            ImageProcessor(os.path.join(self.test_dir, 'missing.pth'), generator_backend='stub')
+
+    @unittest.skipUnless(importlib.util.find_spec('segment_anything') and importlib.util.find_spec('diffusers'),
+                         "segment_anything or diffusers is not installed")
+    def test_tiny_backends(self):
+        """Test the random-weight SAM and ControlNet pipeline run the real code paths reproducibly."""
+        processor = ImageProcessor(segmenter_backend='tiny', generator_backend='tiny', predictor_pool_size=1)
+        mask, mask_path = self.segment_and_save(processor)
+        self.assertEqual(mask.shape, (400, 300))
+        
+        first, second = processor.generate_variants(self.image_path, mask_path, ['a shirt', 'a shirt'],
+                                                    seeds=[3, 4], crop_to_mask=True, crop_size=64)
+        again = processor.generate_try_on(self.image_path, mask_path, 'a shirt', seed=3,
+                                          crop_to_mask=True, crop_size=64)
+        self.assertEqual(first.size, (300, 400))
+        self.assertLess(np.abs(np.asarray(first, float) - np.asarray(again, float)).max(), 2)
+        self.assertNotEqual(first.tobytes(), second.tobytes())
+
+        # The inpaint pipeline repaints the garment; outside the feathered mask the original is kept
+        mask = np.zeros((400, 300), dtype=bool)
+        mask[100:300, 80:220] = True
+        processor.save_mask_rle(mask, mask_path)
+        result = np.asarray(processor.generate_try_on(self.image_path, mask_path, 'a shirt', seed=3,
+                                                      crop_to_mask=True, crop_size=64), dtype=np.float64)
+        original = np.asarray(Image.open(self.image_path), dtype=np.float64)
+        near_mask = cv2.dilate(mask.astype(np.uint8), np.ones((19, 19), np.uint8)) > 0
+        self.assertEqual(np.abs(result - original)[~near_mask].max(), 0)
+        self.assertGreater(np.abs(result - original)[mask].mean(), 1)
+
+@unittest.skipUnless(importlib.util.find_spec('torch') and importlib.util.find_spec('diffusers'),
+                     "torch and diffusers are not installed")
+class TestInpaintGenerator(unittest.TestCase):
+    def setUp(self):
+        self.generator = create_generator('tiny')
+        self.generator.load()
+        self.image = Image.new('RGB', (128, 128), (200, 60, 60))
+
+    def generate(self, mask, control=None):
+        return np.asarray(self.generator.generate(['a shirt'], self.image, control or self.image, mask, size=128,
+                                                  seeds=[7])[0]).astype(np.float64)
+
+    def test_pipeline_takes_mask_and_control_image(self):
+        """Test the pipeline accepts the init image, inpainting mask and control image as separate inputs."""
+        parameters = inspect.signature(self.generator.pipe.__call__).parameters
+        for name in ('image', 'mask_image', 'control_image'):
+            self.assertIn(name, parameters)
+
+    def test_mask_and_control_image_change_output(self):
+        """Test the mask and the control image are both used by the pipeline."""
+        garment = np.full((128, 128), 255, dtype=np.uint8)
+        garment[32:96, 32:96] = 0
+        baseline = self.generate(Image.fromarray(garment))
+        self.assertGreater(np.abs(self.generate(Image.new('L', (128, 128), 0)) - baseline).mean(), 1)
+        control = Image.new('RGB', (128, 128), (255, 255, 255))
+        self.assertGreater(np.abs(self.generate(Image.fromarray(garment), control) - baseline).mean(), 0.1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,40 @@
+import os
+import sys
+import subprocess
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time budget for app.py in milliseconds
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 1500))
+HEAVY_MODULES = {'torch', 'diffusers', 'segment_anything', 'cv2'}
+
+def import_times(statement):
+    """Run a statement under -X importtime and return {module: cumulative_us}."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+class TestImportTime(unittest.TestCase):
+    def test_app_import_budget(self):
+        """Test importing app stays within the budget measured by -X importtime."""
+        times = import_times('import app')
+        self.assertLess(times['app'] / 1000, IMPORT_BUDGET_MS)
+
+    def test_no_heavy_imports(self):
+        """Test app import and /healthz do not load torch, diffusers, SAM or OpenCV."""
+        times = import_times(
+            "import app; assert app.app.test_client().get('/healthz').status_code == 200"
+        )
+        self.assertFalse(HEAVY_MODULES & set(times))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.mask_rle import (
+    rle_counts, compress_counts, decompress_counts, encode, decode, save_rle, load_rle
+)
+
+class TestMaskRle(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.masks = [
+            np.zeros((4, 5), dtype=bool),
+            np.ones((4, 5), dtype=bool),
+            rng.random((37, 53)) < 0.5,
+        ]
+        garment = np.zeros((512, 384), dtype=bool)
+        garment[100:400, 50:300] = True
+        self.masks.append(garment)
+
+    def test_counts_column_major(self):
+        """Test runs are counted column by column, starting with zeros."""
+        mask = np.array([[0, 1], [1, 1]], dtype=bool)
+        self.assertEqual(rle_counts(mask), [1, 3])
+        self.assertEqual(rle_counts(np.ones((2, 2), dtype=bool)), [0, 4])
+
+    def test_compressed_counts_roundtrip(self):
+        """Test the compressed string encoding inverts, including negative deltas."""
+        counts = [0, 5, 300, 2, 1, 70000, 3]
+        self.assertEqual(decompress_counts(compress_counts(counts)), counts)
+
+    def test_known_coco_string(self):
+        """Test output matches the pycocotools encoding for a known mask."""
+        mask = np.zeros((4, 4), dtype=bool)
+        mask[1:3, 1:3] = True
+        self.assertEqual(encode(mask), {'size': [4, 4], 'counts': '52203'})
+
+    def test_encode_decode_roundtrip(self):
+        """Test decode(encode(mask)) reproduces the mask."""
+        for mask in self.masks:
+            np.testing.assert_array_equal(decode(encode(mask)), mask)
+
+    def test_decode_list_counts(self):
+        """Test uncompressed list counts are accepted and validated."""
+        mask = decode({'size': [2, 2], 'counts': [1, 3]})
+        np.testing.assert_array_equal(mask, np.array([[0, 1], [1, 1]], dtype=bool))
+        with self.assertRaises(ValueError):
+            decode({'size': [2, 2], 'counts': [1, 2]})
+
+    def test_save_and_load(self):
+        """Test RLE JSON files roundtrip and are much smaller than raw masks."""
+        test_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(test_dir, 'mask.json')
+            save_rle(self.masks[-1], path)
+            with open(path) as f:
+                self.assertEqual(json.load(f)['format'], 'coco-rle')
+            np.testing.assert_array_equal(load_rle(path), self.masks[-1])
+            self.assertLess(os.path.getsize(path), self.masks[-1].size // 100)
+        finally:
+            shutil.rmtree(test_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import threading
+import unittest
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.memory_budget import MemoryBudget, MemoryMonitor, current_rss
+
+class TestMemoryBudget(unittest.TestCase):
+    def build_budget(self, budget, sizes):
+        self.events = []
+        budget = MemoryBudget(budget)
+        for name, size in sizes.items():
+            budget.register(
+                name,
+                lambda name=name, size=size: self.events.append(('load', name)) or size,
+                lambda name=name: self.events.append(('unload', name)),
+                size=size
+            )
+        return budget
+
+    def test_unlimited_budget_keeps_everything(self):
+        """Test a zero budget never evicts."""
+        budget = self.build_budget(0, {'sam': 10, 'diffusion': 10})
+        budget.load('sam')
+        budget.load('diffusion')
+        with budget.use('sam'):
+            pass
+        self.assertEqual(self.events, [('load', 'sam'), ('load', 'diffusion')])
+
+    def test_evicts_least_recently_used(self):
+        """Test loading over budget unloads the least recently used idle component."""
+        budget = self.build_budget(20, {'a': 10, 'b': 10, 'c': 10})
+        budget.load('a')
+        budget.load('b')
+        with budget.use('a'):
+            pass
+        budget.load('c')
+        self.assertEqual(self.events[-2:], [('unload', 'b'), ('load', 'c')])
+        stats = budget.stats()['components']
+        self.assertTrue(stats['a']['loaded'])
+        self.assertFalse(stats['b']['loaded'])
+        self.assertEqual(stats['b']['evictions'], 1)
+
+    def test_waits_for_busy_component(self):
+        """Test a component in use is not evicted until it is released."""
+        budget = self.build_budget(10, {'sam': 10, 'diffusion': 10})
+        started, release = threading.Event(), threading.Event()
+
+        def segment():
+            with budget.use('sam'):
+                started.set()
+                release.wait(5)
+        thread = threading.Thread(target=segment)
+        thread.start()
+        started.wait(5)
+
+        loader = threading.Thread(target=budget.load, args=('diffusion',))
+        loader.start()
+        time.sleep(0.1)
+        self.assertNotIn(('unload', 'sam'), self.events)
+        release.set()
+        thread.join(5)
+        loader.join(5)
+        self.assertEqual(self.events[-2:], [('unload', 'sam'), ('load', 'diffusion')])
+
+    def test_load_failure_releases_slot(self):
+        """Test a failed load can be retried."""
+        budget = MemoryBudget(10)
+        attempts = []
+
+        def load():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise IOError("checkpoint missing")
+            return 5
+        budget.register('sam', load, lambda: None)
+        with self.assertRaises(IOError):
+            budget.load('sam')
+        budget.load('sam')
+        self.assertTrue(budget.stats()['components']['sam']['loaded'])
+
+class TestMemoryMonitor(unittest.TestCase):
+    def test_stage_peak(self):
+        """Test a stage records a peak at least as large as RSS inside it."""
+        monitor = MemoryMonitor(interval=0.005)
+        with monitor.stage('generation'):
+            data = bytearray(32 * 1024 * 1024)
+            inside = current_rss()
+            # Hold the allocation across a few samples
+            time.sleep(0.05)
+            del data
+        stats = monitor.stats()['generation']
+        self.assertEqual(stats['count'], 1)
+        self.assertGreaterEqual(stats['peak_rss_mb'] * 1024 * 1024, inside)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,255 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from PIL import Image
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from utils.storage import UploadStore
+from utils.model_registry import ModelRegistry, ModelManager, SwapInProgress
+
+STUB_SETTINGS = {'segmenter_backend': 'stub', 'generator_backend': 'stub'}
+
+class FakeProcessor:
+    def __init__(self, name, warmup_error=None):
+        self.name = name
+        self.warmup_error = warmup_error
+        self.released = False
+
+    def warmup(self, raise_errors=False):
+        if self.warmup_error:
+            raise RuntimeError(self.warmup_error)
+
+    def release(self):
+        self.released = True
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'registry.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_register_and_reload(self):
+        """Test versions persist and IDs are validated."""
+        registry = ModelRegistry(self.path)
+        registry.register('v1', {'model_type': 'vit_b'}, dtype='float16')
+        registry.register('v1', exist_ok=True)
+        with self.assertRaises(ValueError):
+            registry.register('v1')
+        with self.assertRaises(ValueError):
+            registry.register('../v2')
+        entry = ModelRegistry(self.path).get('v1')
+        self.assertEqual(entry['settings'], {'model_type': 'vit_b'})
+        self.assertEqual(entry['dtype'], 'float16')
+
+    def test_pins_file_hashes(self):
+        """Test model files are pinned on first verification and changes are refused."""
+        checkpoint = os.path.join(self.temp_dir, 'sam.pth')
+        with open(checkpoint, 'wb') as f:
+            f.write(b'weights-1')
+        registry = ModelRegistry(self.path)
+        registry.register('v1')
+        digest = registry.verify_files('v1', [checkpoint])[checkpoint]
+        self.assertEqual(ModelRegistry(self.path).get('v1')['files'][checkpoint]['sha256'], digest)
+
+        with open(checkpoint, 'wb') as f:
+            f.write(b'weights-22')
+        with self.assertRaises(ValueError):
+            ModelRegistry(self.path).verify_files('v1', [checkpoint])
+
+    def test_merges_writes_from_other_processes(self):
+        """Test registries sharing a file see each other's writes and do not overwrite them."""
+        checkpoint = os.path.join(self.temp_dir, 'sam.pth')
+        with open(checkpoint, 'wb') as f:
+            f.write(b'weights-1')
+        first, second = ModelRegistry(self.path), ModelRegistry(self.path)
+        first.register('v1')
+        second.register('v2')
+        first.verify_files('v1', [checkpoint])
+        second.set_active('v2')
+        self.assertEqual([entry['id'] for entry in first.versions()], ['v1', 'v2'])
+        self.assertEqual(first.active_version(), 'v2')
+        self.assertIn(checkpoint, second.get('v1')['files'])
+        self.assertEqual(len(ModelRegistry(self.path).versions()), 2)
+
+class TestModelManager(unittest.TestCase):
+    def test_swap_drains_old_version(self):
+        """Test new leases get the new version while the old one drains its running job."""
+        manager = ModelManager()
+        old = FakeProcessor('old')
+        manager.activate('v1', old)
+        job_started, finish_job = threading.Event(), threading.Event()
+
+        def job():
+            with manager.lease() as deployment:
+                job_started.set()
+                finish_job.wait(5)
+                self.assertIs(deployment.processor, old)
+
+        thread = threading.Thread(target=job)
+        thread.start()
+        job_started.wait(5)
+        manager.swap('v2', lambda: FakeProcessor('new'))
+        self.assertFalse(manager.wait(timeout=0.5))
+        self.assertEqual(manager.version, 'v2')
+        with manager.lease() as deployment:
+            self.assertEqual(deployment.processor.name, 'new')
+        self.assertEqual([d['version'] for d in manager.stats()['draining']], ['v1'])
+        self.assertFalse(old.released)
+
+        finish_job.set()
+        thread.join()
+        self.assertTrue(manager.wait(timeout=5))
+        self.assertTrue(old.released)
+        self.assertEqual(manager.stats()['history'][0]['state'], 'retired')
+
+    def test_failed_warmup_keeps_active(self):
+        """Test a version failing warm-up is discarded and the active one keeps serving."""
+        manager = ModelManager()
+        manager.activate('v1', FakeProcessor('old'))
+        broken = FakeProcessor('broken', warmup_error='bad weights')
+        deployment = manager.swap('v2', lambda: broken)
+        self.assertTrue(manager.wait(timeout=5))
+        self.assertEqual(manager.version, 'v1')
+        self.assertEqual(deployment.state, 'failed')
+        self.assertEqual(deployment.error, 'bad weights')
+        self.assertTrue(broken.released)
+
+    def test_one_swap_at_a_time(self):
+        """Test a second swap is refused while one is loading."""
+        manager = ModelManager()
+        loading = threading.Event()
+        manager.swap('v1', lambda: loading.wait(5) and FakeProcessor('v1'))
+        with self.assertRaises(SwapInProgress):
+            manager.swap('v2', lambda: FakeProcessor('v2'))
+        loading.set()
+        self.assertTrue(manager.wait(timeout=5))
+        self.assertEqual(manager.version, 'v1')
+
+class TestHotSwapEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original = (app_module.upload_store, app_module.model_registry, app_module.models,
+                         app_module.ADMIN_TOKEN, app_module.followed_version)
+        app_module.ADMIN_TOKEN = 'secret'
+        app_module.upload_store = UploadStore(os.path.join(self.temp_dir, 'store'))
+        app_module.model_registry = ModelRegistry(os.path.join(self.temp_dir, 'registry.json'))
+        app_module.model_registry.register(app_module.MODEL_VERSION, STUB_SETTINGS)
+        app_module.models = ModelManager()
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        (app_module.upload_store, app_module.model_registry, app_module.models,
+         app_module.ADMIN_TOKEN, app_module.followed_version) = self.original
+        shutil.rmtree(self.temp_dir)
+
+    def admin(self, path, json=None):
+        headers = {'X-Admin-Token': 'secret'}
+        if json is None:
+            return self.client.get(path, headers=headers)
+        return self.client.post(path, json=json, headers=headers)
+
+    def upload(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (48, 32), 'blue').save(buffer, 'PNG')
+        response = self.client.post('/upload', data={'file': (io.BytesIO(buffer.getvalue()), 'shirt.png')},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_register_activate_and_cache_keys(self):
+        """Test a registered version is swapped in and segmentation caches are per version."""
+        first = self.upload()
+        self.assertEqual(first['model_version'], app_module.MODEL_VERSION)
+        # Same content and version: the segmentation is reused, not queued
+        reused = self.upload()
+        self.assertEqual(reused['model_version'], app_module.MODEL_VERSION)
+        self.assertNotIn('predicted_wait', reused)
+
+        response = self.admin('/admin/models', {'version': 'v2', 'settings': STUB_SETTINGS})
+        self.assertEqual(response.status_code, 201)
+        response = self.admin('/admin/models/activate', {'version': 'v2'})
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(app_module.models.wait(timeout=10))
+        self.assertEqual(self.client.get('/healthz').get_json()['model_version'], 'v2')
+
+        # The v1 mask is not reused under v2
+        second = self.upload()
+        self.assertEqual(second['model_version'], 'v2')
+        self.assertIn('predicted_wait', second)
+        response = self.client.post('/generate', json={'filename': second['original_image'], 'seeds': [3]})
+        self.assertEqual(response.get_json()['model_version'], 'v2')
+        with Image.open(app_module.upload_store.path_for(response.get_json()['tryon_image'])) as image:
+            self.assertEqual(image.text['model_version'], 'v2')
+
+        listing = self.admin('/admin/models').get_json()
+        self.assertEqual(listing['active_version'], 'v2')
+        self.assertEqual(listing['deployments']['history'][0]['state'], 'retired')
+
+    def test_follows_version_activated_by_another_process(self):
+        """Test a version activated in another worker process is swapped in on the next job."""
+        self.assertEqual(self.upload()['model_version'], app_module.MODEL_VERSION)
+        # Another gunicorn worker registers and activates v2 in the shared registry file
+        other = ModelRegistry(app_module.model_registry.path)
+        other.register('v2', STUB_SETTINGS)
+        other.set_active('v2')
+
+        self.upload()
+        self.assertTrue(app_module.models.wait(timeout=10))
+        self.assertEqual(app_module.models.version, 'v2')
+        self.assertEqual(self.upload()['model_version'], 'v2')
+
+    def test_activation_is_shared(self):
+        """Test a hot-swap is recorded in the registry for the other worker processes."""
+        self.upload()
+        self.admin('/admin/models', {'version': 'v2', 'settings': STUB_SETTINGS})
+        self.assertEqual(self.admin('/admin/models/activate', {'version': 'v2'}).status_code, 202)
+        self.assertTrue(app_module.models.wait(timeout=10))
+        self.assertEqual(ModelRegistry(app_module.model_registry.path).active_version(), 'v2')
+
+    def test_rejects_bad_requests(self):
+        """Test unknown or invalid settings, unknown versions and re-activating the active version."""
+        response = self.admin('/admin/models', {'version': 'v3', 'settings': {'rm': '-rf'}})
+        self.assertEqual(response.status_code, 400)
+        response = self.admin('/admin/models', {'version': 'v3', 'settings': {'generator_options': {'cfg_stop': 0}}})
+        self.assertEqual(response.status_code, 400)
+        response = self.admin('/admin/models/activate', {'version': 'missing'})
+        self.assertEqual(response.status_code, 404)
+        self.upload()
+        response = self.admin('/admin/models/activate', {'version': app_module.MODEL_VERSION})
+        self.assertEqual(response.status_code, 409)
+
+    def test_rejects_paths_outside_model_dir(self):
+        """Test model files set through the API must sit inside MODEL_DIR."""
+        for settings in ({'checkpoint_path': '/tmp/upload.pth'},
+                         {'onnx_dir': os.path.join(app_module.MODEL_DIR, '..', 'uploads')},
+                         {'generator_options': {'lcm_lora': '/tmp/lora'}},
+                         {'generator_options': {'base_model': 'someone/model'}},
+                         {'generator_options': {'pipeline': 'x'}}):
+            response = self.admin('/admin/models', {'version': 'v3', 'settings': settings})
+            self.assertEqual(response.status_code, 400, settings)
+        response = self.admin('/admin/models', {'version': 'v3', 'settings': STUB_SETTINGS, 'dtype': 'pickle'})
+        self.assertEqual(response.status_code, 400)
+        settings = {**STUB_SETTINGS, 'checkpoint_path': os.path.join(app_module.MODEL_DIR, 'sam_vit_b_01ec64.pth')}
+        response = self.admin('/admin/models', {'version': 'v3', 'settings': settings})
+        self.assertEqual(response.status_code, 201)
+
+    def test_admin_disabled_without_token(self):
+        """Test admin routes are refused while ADMIN_TOKEN is unset, even with a header."""
+        app_module.ADMIN_TOKEN = None
+        self.assertEqual(self.admin('/admin/models').status_code, 403)
+        self.assertEqual(self.admin('/admin/models', {'version': 'v2', 'settings': STUB_SETTINGS}).status_code, 403)
+        self.assertEqual(self.admin('/admin/models/activate', {'version': 'v2'}).status_code, 403)
+        app_module.ADMIN_TOKEN = 'secret'
+        self.assertEqual(self.client.get('/admin/models').status_code, 403)
+
+if __name__ == '__main__':
+    unittest.main()
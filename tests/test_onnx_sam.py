@@ -0,0 +1,139 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from functools import partial
+import numpy as np
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import onnxruntime  # noqa: F401
+    import torch
+    from segment_anything import SamPredictor
+    from segment_anything.modeling import (
+        ImageEncoderViT, MaskDecoder, PromptEncoder, Sam, TwoWayTransformer
+    )
+    HAS_ONNX_DEPS = True
+except ImportError:
+    HAS_ONNX_DEPS = False
+
+
+def build_tiny_sam():
+    """Build a small random-weight SAM with the real input/output geometry."""
+    torch.manual_seed(0)
+    sam = Sam(
+        image_encoder=ImageEncoderViT(
+            depth=2,
+            embed_dim=64,
+            img_size=1024,
+            mlp_ratio=2,
+            norm_layer=partial(torch.nn.LayerNorm, eps=1e-6),
+            num_heads=2,
+            patch_size=16,
+            qkv_bias=True,
+            use_rel_pos=True,
+            global_attn_indexes=[1],
+            window_size=14,
+            out_chans=256,
+        ),
+        prompt_encoder=PromptEncoder(
+            embed_dim=256,
+            image_embedding_size=(64, 64),
+            input_image_size=(1024, 1024),
+            mask_in_chans=16,
+        ),
+        mask_decoder=MaskDecoder(
+            num_multimask_outputs=3,
+            transformer=TwoWayTransformer(depth=2, embedding_dim=256, mlp_dim=256, num_heads=8),
+            transformer_dim=256,
+            iou_head_depth=3,
+            iou_head_hidden_dim=64,
+        ),
+        pixel_mean=[123.675, 116.28, 103.53],
+        pixel_std=[58.395, 57.12, 57.375],
+    )
+    return sam.eval()
+
+
+@unittest.skipIf(not HAS_ONNX_DEPS, "onnxruntime/segment_anything not installed")
+class TestOnnxSam(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from utils.onnx_sam import export_sam_onnx
+
+        cls.onnx_dir = tempfile.mkdtemp()
+        cls.sam = build_tiny_sam()
+        export_sam_onnx(cls.sam, cls.onnx_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.onnx_dir, ignore_errors=True)
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.image = rng.integers(0, 256, size=(600, 800, 3), dtype=np.uint8)
+        self.points = np.array([[400, 300], [300, 300], [500, 300], [400, 200], [400, 400]])
+        self.labels = np.array([1, 1, 1, 1, 1])
+
+    def test_export_creates_graphs(self):
+        """Test both encoder and decoder graphs are written."""
+        from utils.onnx_sam import ENCODER_FILENAME, DECODER_FILENAME
+        self.assertTrue(os.path.exists(os.path.join(self.onnx_dir, ENCODER_FILENAME)))
+        self.assertTrue(os.path.exists(os.path.join(self.onnx_dir, DECODER_FILENAME)))
+
+    def test_parity_with_torch(self):
+        """Test ONNX Runtime masks match the torch SamPredictor path (mask IoU)."""
+        from utils.onnx_sam import OnnxSamPredictor
+
+        torch_predictor = SamPredictor(self.sam)
+        torch_predictor.set_image(self.image)
+        torch_masks, torch_scores, _ = torch_predictor.predict(
+            point_coords=self.points, point_labels=self.labels, multimask_output=True
+        )
+
+        onnx_predictor = OnnxSamPredictor(self.onnx_dir, num_threads=2)
+        onnx_predictor.set_image(self.image)
+        onnx_masks, onnx_scores, _ = onnx_predictor.predict(
+            point_coords=self.points, point_labels=self.labels, multimask_output=True
+        )
+
+        self.assertEqual(onnx_masks.shape, torch_masks.shape)
+        self.assertEqual(onnx_masks.dtype, bool)
+        np.testing.assert_allclose(onnx_scores, torch_scores, atol=1e-3)
+        for torch_mask, onnx_mask in zip(torch_masks, onnx_masks):
+            union = np.logical_or(torch_mask, onnx_mask).sum()
+            intersection = np.logical_and(torch_mask, onnx_mask).sum()
+            iou = intersection / union if union else 1.0
+            self.assertGreaterEqual(iou, 0.99)
+
+    def test_box_parity_with_torch(self):
+        """Test box prompts, alone and with points, match the torch SamPredictor path."""
+        from utils.onnx_sam import OnnxSamPredictor
+
+        torch_predictor = SamPredictor(self.sam)
+        torch_predictor.set_image(self.image)
+        onnx_predictor = OnnxSamPredictor(self.onnx_dir, num_threads=2)
+        onnx_predictor.set_image(self.image)
+        box = np.array([250, 150, 550, 450])
+
+        for prompts in ({'box': box}, {'point_coords': self.points, 'point_labels': self.labels, 'box': box}):
+            torch_masks, torch_scores, _ = torch_predictor.predict(multimask_output=False, **prompts)
+            onnx_masks, onnx_scores, _ = onnx_predictor.predict(multimask_output=False, **prompts)
+            np.testing.assert_allclose(onnx_scores, torch_scores, atol=1e-3)
+            union = np.logical_or(torch_masks[0], onnx_masks[0]).sum()
+            intersection = np.logical_and(torch_masks[0], onnx_masks[0]).sum()
+            self.assertGreaterEqual(intersection / union if union else 1.0, 0.99)
+
+    def test_predict_requires_image(self):
+        """Test predicting before set_image raises like SamPredictor."""
+        from utils.onnx_sam import OnnxSamPredictor
+
+        predictor = OnnxSamPredictor(self.onnx_dir)
+        with self.assertRaises(RuntimeError):
+            predictor.predict(point_coords=self.points, point_labels=self.labels)
+
+if __name__ == '__main__':
+    unittest.main()
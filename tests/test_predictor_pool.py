@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.predictor_pool import PredictorPool
+
+class StatefulPredictor:
+    """Mimics SamPredictor: set_image stores state that predict reads back."""
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def __init__(self, model):
+        self.model = model
+        self.image = None
+
+    def fork(self):
+        return StatefulPredictor(self.model)
+
+    def set_image(self, image):
+        with StatefulPredictor.lock:
+            StatefulPredictor.active += 1
+            StatefulPredictor.max_active = max(StatefulPredictor.max_active, StatefulPredictor.active)
+        self.image = image
+        time.sleep(0.01)  # Widen the race window between set_image and predict
+
+    def predict(self, **kwargs):
+        result = int(self.image[0, 0])
+        with StatefulPredictor.lock:
+            StatefulPredictor.active -= 1
+        return result
+
+    def reset_image(self):
+        self.image = None
+
+class TestPredictorPool(unittest.TestCase):
+    def setUp(self):
+        StatefulPredictor.active = 0
+        StatefulPredictor.max_active = 0
+        self.model = object()
+
+    def segment(self, pool, value):
+        with pool.acquire() as predictor:
+            predictor.set_image(np.full((2, 2), value))
+            return predictor.predict()
+
+    def test_contexts_share_model(self):
+        """Test forked contexts reuse the same model object."""
+        pool = PredictorPool(StatefulPredictor(self.model), size=3)
+        seen = []
+        with pool.acquire() as a, pool.acquire() as b, pool.acquire() as c:
+            seen = [a, b, c]
+        self.assertEqual(len({id(p) for p in seen}), 3)
+        self.assertTrue(all(p.model is self.model for p in seen))
+
+    def test_concurrent_requests_get_their_own_result(self):
+        """Test concurrent set_image/predict pairs never see another request's image."""
+        pool = PredictorPool(StatefulPredictor(self.model), size=3)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda v: self.segment(pool, v), range(40)))
+        self.assertEqual(results, list(range(40)))
+
+    def test_concurrency_is_bounded(self):
+        """Test no more than size predictors run at once; the rest queue."""
+        pool = PredictorPool(StatefulPredictor(self.model), size=2)
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            list(executor.map(lambda v: self.segment(pool, v), range(12)))
+        self.assertLessEqual(StatefulPredictor.max_active, 2)
+        self.assertEqual(pool.stats(), {'size': 2, 'in_use': 0, 'waiting': 0})
+
+    def test_acquire_timeout(self):
+        """Test acquiring from an exhausted pool times out."""
+        pool = PredictorPool(StatefulPredictor(self.model), size=1)
+        with pool.acquire():
+            with self.assertRaises(TimeoutError):
+                with pool.acquire(timeout=0.01):
+                    pass
+
+    def test_released_predictor_is_reset(self):
+        """Test embedding state does not leak to the next borrower."""
+        pool = PredictorPool(StatefulPredictor(self.model), size=1)
+        self.segment(pool, 7)
+        with pool.acquire() as predictor:
+            self.assertIsNone(predictor.image)
+
+if __name__ == '__main__':
+    unittest.main()
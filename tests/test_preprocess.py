@@ -0,0 +1,87 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.preprocess import Preprocessor, letterbox_geometry, whiten_background, SCRATCH_BUFFERS
+
+class TestPreprocess(unittest.TestCase):
+    def setUp(self):
+        self.preprocessor = Preprocessor()
+        self.image = np.full((300, 600, 3), 50, dtype=np.uint8)
+        self.mask = np.zeros((300, 600), dtype=np.uint8)
+        self.mask[100:200, 200:400] = 255
+
+    def test_letterbox_geometry(self):
+        """Test wide and tall images are centered with padding on one axis."""
+        self.assertEqual(letterbox_geometry(600, 300, (512, 512)), (512, 256, 0, 128))
+        self.assertEqual(letterbox_geometry(300, 600, (512, 512)), (256, 512, 128, 0))
+        self.assertEqual(letterbox_geometry(512, 512, (512, 512)), (512, 512, 0, 0))
+
+    def test_prepare_outputs(self):
+        """Test init, inverted mask and control image share the same geometry."""
+        init, inpaint_mask, control = self.preprocessor.prepare(self.image, self.mask)
+        self.assertEqual(init.shape, (512, 512, 3))
+        self.assertEqual(inpaint_mask.shape, (512, 512))
+
+        # Padding is white, the image content is kept
+        self.assertTrue((init[0, 0] == 255).all())
+        self.assertTrue((init[256, 256] == 50).all())
+
+        # Garment pixels are 0 in the inpaint mask and white in the control image, which keeps
+        # the rest of the image
+        self.assertEqual(inpaint_mask[256, 256], 0)
+        self.assertEqual(inpaint_mask[140, 20], 255)
+        self.assertTrue((control[256, 256] == 255).all())
+        self.assertTrue((control[140, 20] == 50).all())
+        self.assertTrue((control[0, 0] == 255).all())
+
+    def test_prepare_reuses_buffers(self):
+        """Test repeated calls write into the same output arrays."""
+        first = self.preprocessor.prepare(self.image, self.mask)
+        second = self.preprocessor.prepare(self.image, self.mask)
+        for a, b in zip(first, second):
+            self.assertIs(a, b)
+
+    def test_pil_images_do_not_alias_buffers(self):
+        """Test the PIL images handed to the pipeline survive the next prepare on the thread."""
+        from utils.image_processor import ImageProcessor
+        images = ImageProcessor._to_pil(*self.preprocessor.prepare(self.image, self.mask))
+        before = [np.array(image) for image in images]
+        self.preprocessor.prepare(np.zeros_like(self.image), np.full_like(self.mask, 255))
+        for image, expected in zip(images, before):
+            np.testing.assert_array_equal(np.asarray(image), expected)
+
+    def test_scratch_is_bounded(self):
+        """Test intermediates for many source sizes do not accumulate."""
+        for width in range(100, 120):
+            self.preprocessor.prepare(self.image[:, :width], self.mask[:, :width])
+        self.assertLessEqual(len(self.preprocessor._local.scratch), SCRATCH_BUFFERS)
+
+    def test_prepare_bgr_and_bool_mask(self):
+        """Test BGR input is swapped to RGB and boolean masks are accepted."""
+        image = np.zeros((300, 600, 3), dtype=np.uint8)
+        image[:, :, 0] = 255  # Blue in BGR
+        init, inpaint_mask, _ = self.preprocessor.prepare(image, self.mask > 0, bgr=True)
+        self.assertEqual(list(init[256, 256]), [0, 0, 255])
+        self.assertEqual(inpaint_mask[256, 256], 0)
+
+    def test_prepare_stretch(self):
+        """Test disabling letterbox stretches without padding."""
+        init, _, _ = self.preprocessor.prepare(self.image, self.mask, (256, 256), letterbox=False)
+        self.assertEqual(init.shape, (256, 256, 3))
+        self.assertTrue((init == 50).all())
+
+    def test_whiten_background(self):
+        """Test pixels outside the mask are painted white in place."""
+        image = self.image.copy()
+        result = whiten_background(image, self.mask)
+        self.assertIs(result, image)
+        self.assertTrue((image[0, 0] == 255).all())
+        self.assertTrue((image[150, 300] == 50).all())
+
+if __name__ == '__main__':
+    unittest.main()
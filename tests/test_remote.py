@@ -0,0 +1,273 @@
+import io
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import shutil
+import tempfile
+import subprocess
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from utils.storage import UploadStore
+from utils.model_registry import ModelManager
+from utils.image_processor import ImageProcessor
+from utils.remote import (WorkerPool, WorkerUnavailable, RemoteError, encode_image, decode_image,
+                          encode_mask, decode_mask)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_worker(port, registry_path):
+    """An inference_worker.py process with stub backends."""
+    env = {key: value for key, value in os.environ.items() if key != 'INFERENCE_WORKERS'}
+    env.update(SEGMENTER_BACKEND='stub', GENERATOR_BACKEND='stub', MODEL_REGISTRY=registry_path)
+    return subprocess.Popen(
+        [sys.executable, 'inference_worker.py', '--host', '127.0.0.1', '--port', str(port)],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def garment_image(path):
+    image = np.full((96, 64, 3), 235, dtype=np.uint8)
+    image[24:72, 16:48] = (180, 40, 60)
+    Image.fromarray(image).save(path)
+
+class FakeWorker:
+    """A worker that passes health checks but answers every job with ``status`` and ``body``,
+    after ``delay`` seconds."""
+
+    def __init__(self, status, body, delay=0):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.reply(200, {'status': 'ok', 'roles': {'segment': {'active': 0, 'capacity': 8}}})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                time.sleep(delay)
+                self.reply(status, body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class TestEncoding(unittest.TestCase):
+    def test_round_trip(self):
+        """Test images and masks survive encoding unchanged."""
+        image = np.random.RandomState(0).randint(0, 256, (20, 30, 3), dtype=np.uint8)
+        np.testing.assert_array_equal(np.asarray(decode_image(encode_image(image))), image)
+        mask = np.random.RandomState(1).rand(20, 30) > 0.5
+        np.testing.assert_array_equal(decode_mask(encode_mask(mask)), mask)
+
+class TestRouting(unittest.TestCase):
+    def make_pool(self, loads):
+        pool = WorkerPool([f'http://worker{index}' for index in range(len(loads))])
+        for worker, (active, capacity) in zip(pool.workers, loads):
+            worker.healthy = True
+            worker.roles = {'generate': {'active': active, 'waiting': 0, 'capacity': capacity}}
+        return pool
+
+    def test_least_loaded(self):
+        """Test jobs go to the worker with the lowest busy fraction."""
+        pool = self.make_pool([(2, 2), (1, 2), (3, 4)])
+        self.assertEqual(pool._choose('generate', []).url, 'http://worker1')
+        # Our own in-flight job now fills worker1
+        self.assertEqual(pool._choose('generate', []).url, 'http://worker2')
+
+    def test_skips_unhealthy_and_excluded(self):
+        """Test unhealthy, already tried and role-less workers are not chosen."""
+        pool = self.make_pool([(0, 1), (0, 1), (0, 1)])
+        pool.workers[0].healthy = False
+        self.assertEqual(pool._choose('generate', [pool.workers[1]]).url, 'http://worker2')
+        self.assertIsNone(pool._choose('segment', []))
+
+class TestRemoteWorkers(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.registry_dir = tempfile.mkdtemp()
+        cls.ports = [free_port(), free_port()]
+        cls.processes = [start_worker(port, os.path.join(cls.registry_dir, 'registry.json')) for port in cls.ports]
+        cls.urls = [f'http://127.0.0.1:{port}' for port in cls.ports]
+        cls.pool = WorkerPool(cls.urls, health_interval=0.5, timeout=30)
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            cls.pool.check_all()
+            if all(worker.healthy for worker in cls.pool.workers):
+                break
+            time.sleep(0.2)
+        else:
+            cls.tearDownClass()
+            raise RuntimeError("Inference workers did not become healthy")
+
+    @classmethod
+    def tearDownClass(cls):
+        for process in cls.processes:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(cls.registry_dir)
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pool.check_all()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_remote_matches_local(self):
+        """Test remote backends return what the same backends return locally."""
+        image_path = os.path.join(self.temp_dir, 'garment.png')
+        mask_path = os.path.join(self.temp_dir, 'garment_mask.png')
+        garment_image(image_path)
+        remote = ImageProcessor(segmenter_backend='remote', generator_backend='remote', worker_pool=self.pool)
+        local = ImageProcessor(segmenter_backend='stub', generator_backend='stub')
+
+        mask = remote.process_image(image_path)
+        np.testing.assert_array_equal(mask, local.process_image(image_path))
+        remote.save_mask(mask, mask_path)
+
+        prompts = ['red shirt', 'blue shirt']
+        remote_images = remote.generate_variants(image_path, mask_path, prompts, seeds=[1, 2])
+        local_images = local.generate_variants(image_path, mask_path, prompts, seeds=[1, 2])
+        for remote_image, local_image in zip(remote_images, local_images):
+            np.testing.assert_array_equal(np.asarray(remote_image), np.asarray(local_image))
+
+    def test_health_reports_roles(self):
+        """Test workers report readiness, backends and per-role capacity."""
+        stats = self.pool.stats()
+        for worker in stats['workers']:
+            self.assertEqual(worker['status'], 'ok')
+            self.assertEqual(worker['roles']['generate']['capacity'], 1)
+            self.assertIn('segment', worker['roles'])
+            self.assertEqual(worker['model_version'], 'default')
+        self.assertEqual(self.pool.versions('segment'), {'default'})
+
+    def test_records_worker_version(self):
+        """Test the front end records the model version of the worker that ran each job."""
+        original = (app_module.upload_store, app_module.models)
+        app_module.upload_store = UploadStore(os.path.join(self.temp_dir, 'store'))
+        app_module.models = ModelManager()
+        app_module.models.activate('frontend', ImageProcessor(segmenter_backend='remote', generator_backend='remote',
+                                                              worker_pool=self.pool))
+        try:
+            client = app_module.app.test_client()
+            buffer = io.BytesIO()
+            Image.new('RGB', (48, 32), 'blue').save(buffer, 'PNG')
+            upload = lambda: client.post('/upload', data={'file': (io.BytesIO(buffer.getvalue()), 'shirt.png')},
+                                         content_type='multipart/form-data').get_json()
+            first = upload()
+            self.assertEqual(first['model_version'], 'default')
+            # The cached mask is current while the workers still serve its version
+            self.assertNotIn('predicted_wait', upload())
+
+            response = client.post('/generate', json={'filename': first['original_image'], 'seeds': [1]})
+            self.assertEqual(response.get_json()['model_version'], 'default')
+            with Image.open(app_module.upload_store.path_for(response.get_json()['tryon_image'])) as image:
+                self.assertEqual(image.text['model_version'], 'default')
+        finally:
+            app_module.upload_store, app_module.models = original
+
+    def test_retries_on_dead_worker(self):
+        """Test a job sent to an unreachable worker is retried on a healthy one."""
+        pool = WorkerPool([f'http://127.0.0.1:{free_port()}', self.urls[0]], retries=1, timeout=30)
+        pool.check_all()
+        dead = pool.workers[0]
+        # Pretend the dead worker passed its last health check and is idle
+        dead.healthy = True
+        dead.roles = {'segment': {'active': 0, 'capacity': 8}}
+        pool.workers[1].roles['segment']['active'] = 2
+        image = np.zeros((16, 16, 3), dtype=np.uint8)
+        result = pool.call('segment', {'image': encode_image(image), 'point_coords': [[8, 8]], 'point_labels': [1]})
+        self.assertEqual(result['label'], 'stub')
+        self.assertEqual(pool.retried, 1)
+        self.assertFalse(dead.healthy)
+        self.assertEqual(dead.failures, 1)
+
+    def test_no_healthy_workers(self):
+        """Test WorkerUnavailable when every worker is down."""
+        pool = WorkerPool([f'http://127.0.0.1:{free_port()}'], health_timeout=0.5)
+        with self.assertRaises(WorkerUnavailable):
+            pool.call('segment', {})
+
+    def failover_pool(self, fake):
+        """A pool preferring ``fake`` (idle) over the real worker (reported busier)."""
+        pool = WorkerPool([fake.url, self.urls[0]], retries=1, timeout=1)
+        pool.check_all()
+        pool.workers[1].roles['segment']['active'] = 2
+        return pool
+
+    def segment(self, pool):
+        image = np.zeros((16, 16, 3), dtype=np.uint8)
+        return pool.call('segment', {'image': encode_image(image), 'point_coords': [[8, 8]], 'point_labels': [1]})
+
+    def test_busy_worker_not_marked_down(self):
+        """Test a worker answering busy is skipped for the job but stays in rotation."""
+        fake = FakeWorker(503, {'error': 'Worker busy: 4 jobs already queued', 'busy': True})
+        try:
+            pool = self.failover_pool(fake)
+            self.assertEqual(self.segment(pool)['label'], 'stub')
+            self.assertEqual(pool.retried, 1)
+            self.assertTrue(pool.workers[0].healthy)
+            self.assertEqual(pool.workers[0].failures, 1)
+        finally:
+            fake.close()
+
+    def test_retries_after_read_timeout(self):
+        """Test a job timing out on one worker is retried on another."""
+        fake = FakeWorker(200, {'label': 'late'}, delay=3)
+        try:
+            pool = self.failover_pool(fake)
+            self.assertEqual(self.segment(pool)['label'], 'stub')
+            self.assertEqual(pool.retried, 1)
+            self.assertIn('Timed out', pool.workers[0].last_error)
+        finally:
+            fake.close()
+
+    def test_resets_after_fork(self):
+        """Test a pool used in a forked process gets its own session and health thread."""
+        pool = WorkerPool(self.urls, health_interval=60)
+        pool.start()
+        try:
+            session, thread = pool._session, pool._thread
+            # As if gunicorn forked this process after the pool was created in the master
+            pool._pid = -1
+            self.assertEqual(self.segment(pool)['label'], 'stub')
+            self.assertIsNot(pool._session, session)
+            self.assertIsNot(pool._thread, thread)
+            self.assertTrue(pool._thread.is_alive())
+        finally:
+            pool.stop()
+
+    def test_bad_job_not_retried(self):
+        """Test a rejected job raises RemoteError without trying other workers."""
+        with self.assertRaises(RemoteError):
+            self.pool.call('generate', {'prompts': ['x']})
+        self.assertTrue(all(worker.healthy for worker in self.pool.workers))
+
+if __name__ == '__main__':
+    unittest.main()
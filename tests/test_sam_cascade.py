@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import threading
+import unittest
+import numpy as np
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.sam_cascade import SamCascade
+
+class FakePredictor:
+    """Predictor returning a fixed mask coverage and score."""
+    def __init__(self, score, coverage):
+        self.score = score
+        self.coverage = coverage
+        self.calls = 0
+
+    def set_image(self, image):
+        self.shape = image.shape[:2]
+
+    def predict(self, point_coords, point_labels, multimask_output=True):
+        self.calls += 1
+        mask = np.zeros(self.shape, dtype=bool)
+        mask.flat[:int(mask.size * self.coverage)] = True
+        masks = np.stack([mask, np.zeros_like(mask), np.zeros_like(mask)])
+        return masks, np.array([self.score, 0.1, 0.1]), None
+
+    def reset_image(self):
+        self.shape = None
+
+class TestSamCascade(unittest.TestCase):
+    def setUp(self):
+        self.image = np.zeros((100, 100, 3), dtype=np.uint8)
+        self.points = np.array([[50, 50]])
+        self.labels = np.array([1])
+
+    def build_cascade(self, predictors):
+        self.loaded = []
+
+        def factory(tier):
+            self.loaded.append(tier)
+            return predictors[tier]
+        return SamCascade(list(predictors), factory, min_score=0.9, min_coverage=0.05, max_coverage=0.9)
+
+    def test_accepts_first_tier(self):
+        """Test a confident small-model mask is accepted without loading larger tiers."""
+        cascade = self.build_cascade({
+            'vit_b': FakePredictor(0.95, 0.3),
+            'vit_h': FakePredictor(0.99, 0.3),
+        })
+        mask, score, tier = cascade.segment(self.image, self.points, self.labels)
+        self.assertEqual(tier, 'vit_b')
+        self.assertEqual(self.loaded, ['vit_b'])
+        self.assertAlmostEqual(mask.mean(), 0.3)
+
+    def test_escalates_on_low_score_and_coverage(self):
+        """Test low score and bad coverage escalate to the next tier."""
+        cascade = self.build_cascade({
+            'vit_b': FakePredictor(0.5, 0.3),
+            'vit_l': FakePredictor(0.95, 0.99),
+            'vit_h': FakePredictor(0.97, 0.3),
+        })
+        _, score, tier = cascade.segment(self.image, self.points, self.labels)
+        self.assertEqual(tier, 'vit_h')
+        self.assertAlmostEqual(score, 0.97)
+
+    def test_last_tier_always_accepted(self):
+        """Test the largest tier's mask is returned even below thresholds."""
+        cascade = self.build_cascade({
+            'vit_b': FakePredictor(0.1, 0.3),
+            'vit_h': FakePredictor(0.2, 0.3),
+        })
+        _, _, tier = cascade.segment(self.image, self.points, self.labels)
+        self.assertEqual(tier, 'vit_h')
+
+    def test_timing_excludes_tier_loading(self):
+        """Test a tier's mean time covers inference only, not loading it on first use."""
+        predictor = FakePredictor(0.95, 0.3)
+
+        def slow_factory(tier):
+            time.sleep(0.2)
+            return predictor
+        cascade = SamCascade(['vit_b'], slow_factory, min_score=0.9, min_coverage=0.05, max_coverage=0.9)
+        cascade.segment(self.image, self.points, self.labels)
+        self.assertLess(cascade.stats()['tiers']['vit_b']['mean_time'], 0.1)
+
+    def test_loading_a_tier_blocks_only_that_tier(self):
+        """Test a slow tier load leaves other tiers and stats usable and loads the tier once."""
+        predictors = {'vit_b': FakePredictor(0.5, 0.3), 'vit_h': FakePredictor(0.99, 0.3)}
+        loading, release, loaded = threading.Event(), threading.Event(), []
+
+        def factory(tier):
+            loaded.append(tier)
+            if tier == 'vit_h':
+                loading.set()
+                release.wait(5)
+            return predictors[tier]
+        cascade = SamCascade(list(predictors), factory, min_score=0.9, min_coverage=0.05, max_coverage=0.9)
+        threads = [threading.Thread(target=cascade.segment, args=(self.image, self.points, self.labels))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(loading.wait(5))
+        # vit_h is loading: stats and the loaded tier do not wait for it, and the second request
+        # still gets through vit_b
+        start = time.time()
+        while cascade.stats()['tiers']['vit_b']['attempts'] < 2 and time.time() < start + 5:
+            time.sleep(0.01)
+        self.assertIs(cascade._get_pool('vit_b'), cascade._pools['vit_b'])
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(cascade.stats()['tiers']['vit_b']['attempts'], 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(loaded, ['vit_b', 'vit_h'])
+        self.assertEqual(cascade.stats()['tiers']['vit_h']['accepted'], 2)
+
+    def test_stats_report_hit_rates(self):
+        """Test per-tier hit rates add up over requests."""
+        predictors = {
+            'vit_b': FakePredictor(0.95, 0.3),
+            'vit_h': FakePredictor(0.99, 0.3),
+        }
+        cascade = self.build_cascade(predictors)
+        cascade.segment(self.image, self.points, self.labels)
+        predictors['vit_b'].score = 0.5
+        cascade.segment(self.image, self.points, self.labels)
+        cascade.segment(self.image, self.points, self.labels)
+
+        stats = cascade.stats()
+        self.assertEqual(stats['total'], 3)
+        self.assertEqual(stats['tiers']['vit_b']['attempts'], 3)
+        self.assertEqual(stats['tiers']['vit_b']['escalated'], 2)
+        self.assertAlmostEqual(stats['tiers']['vit_b']['hit_rate'], 1 / 3)
+        self.assertAlmostEqual(stats['tiers']['vit_h']['hit_rate'], 2 / 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import unittest
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.scheduler import Lane, Scheduler, QueueFullError
+
+class TestLane(unittest.TestCase):
+    def setUp(self):
+        self.lanes = []
+
+    def tearDown(self):
+        for lane in self.lanes:
+            lane.shutdown()
+
+    def build_lane(self, **kwargs):
+        lane = Lane('test', **kwargs)
+        self.lanes.append(lane)
+        return lane
+
+    def block(self, lane):
+        """Occupy the lane's single worker until the returned event is set."""
+        started, release = threading.Event(), threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(5)
+        future = lane.submit(blocker)
+        started.wait(5)
+        return release, future
+
+    def test_priority_order(self):
+        """Test lower priority values run first, FIFO among equals."""
+        lane = self.build_lane()
+        order = []
+        release, _ = self.block(lane)
+        futures = [
+            lane.submit(order.append, 'low', priority=5),
+            lane.submit(order.append, 'high-1', priority=0),
+            lane.submit(order.append, 'high-2', priority=0),
+        ]
+        release.set()
+        for future in futures:
+            future.result(5)
+        self.assertEqual(order, ['high-1', 'high-2', 'low'])
+
+    def test_fair_queuing_round_robin(self):
+        """Test a burst from one client does not delay another client's job."""
+        lane = self.build_lane(fair=True)
+        order = []
+        release, _ = self.block(lane)
+        futures = [lane.submit(order.append, f'a{i}', client_id='a') for i in range(3)]
+        futures.append(lane.submit(order.append, 'b0', client_id='b'))
+        release.set()
+        for future in futures:
+            future.result(5)
+        self.assertEqual(order[:2], ['a0', 'b0'])
+
+    def test_max_queue(self):
+        """Test submissions beyond max_queue are rejected."""
+        lane = self.build_lane(max_queue=1)
+        release, _ = self.block(lane)
+        lane.submit(lambda: None)
+        with self.assertRaises(QueueFullError):
+            lane.submit(lambda: None)
+        release.set()
+
+    def test_exception_propagates(self):
+        """Test job exceptions surface through the future and are counted."""
+        lane = self.build_lane()
+        future = lane.submit(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            future.result(5)
+        stats = lane.stats()
+        self.assertEqual(stats['completed'], 1)
+        self.assertEqual(stats['failed'], 1)
+
+class TestScheduler(unittest.TestCase):
+    def test_lanes_are_isolated(self):
+        """Test a busy generation lane does not block segmentation jobs."""
+        scheduler = Scheduler([Lane('segmentation'), Lane('generation')])
+        release = threading.Event()
+        try:
+            scheduler.submit('generation', release.wait, 5)
+            result = scheduler.submit('segmentation', lambda: 'mask').result(5)
+            self.assertEqual(result, 'mask')
+            self.assertEqual(scheduler.stats()['generation']['running'], 1)
+        finally:
+            release.set()
+            scheduler.shutdown()
+
+    def test_unknown_lane(self):
+        """Test submitting to an unknown lane raises ValueError."""
+        scheduler = Scheduler([Lane('segmentation')])
+        with self.assertRaises(ValueError):
+            scheduler.submit('generation', lambda: None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.storage import UploadStore
+
+class TestUploadStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = UploadStore(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_put_stream_shards_by_hash(self):
+        """Test stored files are named by content hash in sharded directories."""
+        name = self.store.put_stream(io.BytesIO(b'image-bytes'), 'PNG')
+        self.assertTrue(name.endswith('.png'))
+        self.assertEqual(len(name), 64 + 4)
+        path = self.store.path_for(name)
+        self.assertEqual(path, os.path.join(self.root, name[:2], name[2:4], name))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'image-bytes')
+
+    def test_identical_content_deduplicated(self):
+        """Test identical uploads share one file and different ones do not overwrite."""
+        first = self.store.put_stream(io.BytesIO(b'same'), 'jpg')
+        second = self.store.put_stream(io.BytesIO(b'same'), 'jpg')
+        third = self.store.put_stream(io.BytesIO(b'other'), 'jpg')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertEqual(self.store.usage(), (9, 2))
+        self.assertEqual(os.listdir(os.path.join(self.root, 'tmp')), [])
+
+    def test_invalid_names_rejected(self):
+        """Test names that are not store names never map to paths."""
+        for name in ['../app.py', 'photo.png', 'a' * 64, None]:
+            self.assertFalse(self.store.is_valid_name(name))
+        with self.assertRaises(ValueError):
+            self.store.path_for('../../etc/passwd')
+
+    def test_derived_name(self):
+        """Test derived files reuse the digest and extension."""
+        name = self.store.put_stream(io.BytesIO(b'x'), 'jpg')
+        mask_name = UploadStore.derived_name(name, 'mask')
+        self.assertEqual(mask_name, name[:64] + '_mask.jpg')
+        self.assertEqual(os.path.dirname(self.store.path_for(mask_name)),
+                         os.path.dirname(self.store.path_for(name)))
+
+    def test_immutable_names(self):
+        """Test uploads and their thumbnails are immutable, masks are not."""
+        name = self.store.put_stream(io.BytesIO(b'x'), 'jpg')
+        mask_name = UploadStore.derived_name(name, 'mask')
+        self.assertTrue(UploadStore.is_immutable(name))
+        self.assertTrue(UploadStore.is_immutable(UploadStore.derived_name(name, 'w256', ext='webp')))
+        self.assertFalse(UploadStore.is_immutable(mask_name))
+        self.assertEqual(UploadStore.derived_name(mask_name, 'w256', ext='webp'), name[:64] + '_mask-w256.webp')
+        self.assertFalse(UploadStore.is_immutable(UploadStore.derived_name(mask_name, 'w256')))
+
+    def test_add_file(self):
+        """Test adding a file written to a temp path."""
+        temp_path = self.store.temp_path('png')
+        with open(temp_path, 'wb') as f:
+            f.write(b'generated')
+        name = self.store.add_file(temp_path, 'png')
+        self.assertTrue(self.store.exists(name))
+        self.assertFalse(os.path.exists(temp_path))
+
+    def write_group(self, content, last_access):
+        name = self.store.put_stream(io.BytesIO(content), 'png')
+        mask_path = self.store.path_for(UploadStore.derived_name(name, 'mask'))
+        with open(mask_path, 'wb') as f:
+            f.write(b'm')
+        for path in (self.store.path_for(name), mask_path):
+            os.utime(path, (last_access, last_access))
+        return name
+
+    def test_gc_ttl(self):
+        """Test groups not accessed within the TTL are removed together."""
+        now = time.time()
+        old = self.write_group(b'old', now - 7200)
+        recent = self.write_group(b'recent', now - 60)
+        self.store.ttl_seconds = 3600
+
+        removed, _ = self.store.collect_garbage(now=now)
+        self.assertEqual(removed, 2)
+        self.assertFalse(self.store.exists(old))
+        self.assertFalse(self.store.exists(UploadStore.derived_name(old, 'mask')))
+        self.assertTrue(self.store.exists(recent))
+
+    def test_gc_quota_evicts_least_recently_used(self):
+        """Test the quota is enforced by evicting least recently accessed groups first."""
+        now = time.time()
+        first = self.write_group(b'a' * 100, now - 300)
+        second = self.write_group(b'b' * 100, now - 200)
+        third = self.write_group(b'c' * 100, now - 100)
+        self.store.touch(first)
+        self.store.quota_bytes = 210
+
+        self.store.collect_garbage(now=now)
+        self.assertTrue(self.store.exists(first))
+        self.assertFalse(self.store.exists(second))
+        self.assertTrue(self.store.exists(third))
+
+    def test_gc_quota_spares_recent_groups(self):
+        """Test groups used within min_age_seconds are kept even while over quota."""
+        now = time.time()
+        old = self.write_group(b'a' * 100, now - 3600)
+        recent = self.write_group(b'b' * 100, now - 60)
+        self.store.quota_bytes = 50
+        self.store.min_age_seconds = 900
+
+        self.store.collect_garbage(now=now)
+        self.assertFalse(self.store.exists(old))
+        self.assertTrue(self.store.exists(recent))
+
+    def test_gc_tolerates_vanishing_temp_files(self):
+        """Test a temp file renamed away during the sweep does not abort collection."""
+        temp_path = self.store.temp_path('png')
+        with open(temp_path, 'wb') as f:
+            f.write(b'partial')
+        scandir = os.scandir
+
+        def racing_scandir(path):
+            entries = list(scandir(path))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return iter(entries)
+        with mock.patch('os.scandir', racing_scandir):
+            self.assertEqual(self.store.collect_garbage(now=time.time() + 7200), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from PIL import Image
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from utils.storage import UploadStore
+from utils.thumbnails import make_thumbnail, snap_width
+
+class TestThumbnails(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.src_path = os.path.join(self.test_dir, 'source.png')
+        Image.new('RGB', (1000, 500), 'white').save(self.src_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_snap_width(self):
+        """Test widths round up to the supported set."""
+        self.assertEqual(snap_width(1), 64)
+        self.assertEqual(snap_width(256), 256)
+        self.assertEqual(snap_width(300), 512)
+        self.assertEqual(snap_width(5000), 1024)
+
+    def test_make_thumbnail_keeps_aspect(self):
+        """Test thumbnails are resized to the width with the aspect ratio kept."""
+        for fmt, pil_format in [('webp', 'WEBP'), ('jpeg', 'JPEG')]:
+            dst_path = os.path.join(self.test_dir, f'thumb.{fmt}')
+            make_thumbnail(self.src_path, dst_path, 256, fmt)
+            with Image.open(dst_path) as thumb:
+                self.assertEqual(thumb.size, (256, 128))
+                self.assertEqual(thumb.format, pil_format)
+
+    def test_make_thumbnail_no_upscale(self):
+        """Test small images are not enlarged and no temp files are left behind."""
+        dst_path = os.path.join(self.test_dir, 'thumb.webp')
+        make_thumbnail(self.src_path, dst_path, 1024)
+        with Image.open(dst_path) as thumb:
+            self.assertEqual(thumb.size, (1000, 500))
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['source.png', 'thumb.webp'])
+
+class TestThumbnailEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_store = app_module.upload_store
+        app_module.upload_store = UploadStore(self.test_dir)
+        src_path = os.path.join(self.test_dir, 'source.png')
+        Image.new('RGB', (1000, 500), 'white').save(src_path)
+        self.filename = app_module.upload_store.add_file(src_path, 'png')
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        app_module.upload_store = self.original_store
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_renditions_have_distinct_etags(self):
+        """Test the original and each thumbnail width and format get their own ETag."""
+        urls = [f'/uploads/{self.filename}', f'/uploads/{self.filename}?w=64', f'/uploads/{self.filename}?w=128',
+                f'/uploads/{self.filename}?w=64&format=jpeg']
+        etags = [self.client.get(url).headers['ETag'] for url in urls]
+        self.assertEqual(len(set(etags)), len(urls))
+        response = self.client.get(urls[3], headers={'If-None-Match': etags[3]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_rejects_invalid_widths(self):
+        """Test a zero, negative or non-numeric width answers 400 instead of serving the original."""
+        for query in ('w=0', 'w=-64', 'w=abc', 'w=', 'w=64&format=gif'):
+            response = self.client.get(f'/uploads/{self.filename}?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import importlib.util
+import unittest
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from utils.storage import UploadStore
+from utils.model_registry import ModelManager
+from utils.image_processor import ImageProcessor
+
+HAS_DIFFUSERS = importlib.util.find_spec('torch') and importlib.util.find_spec('diffusers')
+
+@unittest.skipUnless(HAS_DIFFUSERS, "torch and diffusers are not installed")
+class TestBipartiteMerge(unittest.TestCase):
+    def test_merge_and_unmerge(self):
+        """Test merged tokens are averaged and every token gets an output back."""
+        import torch
+        from utils.token_merging import bipartite_merge
+        tokens = torch.randn(2, 64, 8)
+        # Duplicate tokens are the most similar pairs, so they merge first
+        tokens[:, 1] = tokens[:, 0]
+        merge, unmerge = bipartite_merge(tokens, 8, 8, 16, torch.Generator().manual_seed(0))
+        merged = merge(tokens)
+        self.assertEqual(merged.shape, (2, 48, 8))
+        restored = unmerge(merged)
+        self.assertEqual(restored.shape, tokens.shape)
+        torch.testing.assert_close(restored[:, 0], restored[:, 1])
+        # Tokens that were not merged come back unchanged
+        unchanged = (restored == tokens).all(dim=-1).sum(dim=-1)
+        self.assertTrue(bool((unchanged >= 48 - 16).all()))
+
+@unittest.skipUnless(HAS_DIFFUSERS, "torch and diffusers are not installed")
+class TestTokenMergingGenerator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from utils.generators import create_generator
+        cls.generator = create_generator('tiny', {'num_inference_steps': 3})
+        cls.generator.load()
+        cls.image = Image.new('RGB', (128, 128), (200, 60, 60))
+        cls.mask = Image.new('RGB', (128, 128), (255, 255, 255))
+
+    def generate(self, token_merging=None):
+        image = self.generator.generate(['red shirt'], self.image, self.image, self.mask, size=128, seeds=[5],
+                                        token_merging=token_merging)[0]
+        return np.asarray(image).astype(np.float64)
+
+    def test_per_call_ratio(self):
+        """Test a per-call ratio shrinks self-attention inputs and is reproducible."""
+        attention = self.generator.pipe.unet.down_blocks[1].attentions[0].transformer_blocks[0].attn1
+        lengths = []
+        hook = attention.to_q.register_forward_pre_hook(lambda module, args: lengths.append(args[0].shape[1]))
+        try:
+            baseline = self.generate()
+            full_length = lengths[-1]
+            merged = self.generate(token_merging=0.5)
+            self.assertEqual(lengths[-1], full_length // 2)
+        finally:
+            hook.remove()
+        np.testing.assert_array_equal(self.generate(token_merging=0.5), merged)
+        self.assertLess(np.abs(merged - baseline).mean(), 10)
+        # The default ratio (0) applies again without an override
+        np.testing.assert_array_equal(self.generate(), baseline)
+
+    def test_concurrent_calls_keep_their_ratio(self):
+        """Test concurrent generations with different ratios match the same calls run one at a time."""
+        expected = {ratio: self.generate(token_merging=ratio) for ratio in (0.0, 0.5)}
+        results = []
+        threads = [threading.Thread(target=lambda ratio=ratio: results.append((ratio, self.generate(ratio))))
+                   for ratio in (0.0, 0.5, 0.0, 0.5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 4)
+        for ratio, image in results:
+            np.testing.assert_array_equal(image, expected[ratio])
+
+    def test_rejects_bad_ratio(self):
+        """Test ratios outside 0-0.75 are refused."""
+        with self.assertRaises(ValueError):
+            self.generate(token_merging=0.9)
+
+class TestTokenMergingEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.original = (app_module.upload_store, app_module.models)
+        app_module.upload_store = UploadStore(os.path.join(self.temp_dir, 'store'))
+        app_module.models = ModelManager()
+        app_module.models.activate(app_module.MODEL_VERSION,
+                                   ImageProcessor(segmenter_backend='stub', generator_backend='stub'))
+        self.client = app_module.app.test_client()
+        buffer = io.BytesIO()
+        Image.new('RGB', (48, 32), 'blue').save(buffer, 'PNG')
+        response = self.client.post('/upload', data={'file': (io.BytesIO(buffer.getvalue()), 'shirt.png')},
+                                    content_type='multipart/form-data')
+        self.filename = response.get_json()['original_image']
+
+    def tearDown(self):
+        app_module.upload_store, app_module.models = self.original
+        shutil.rmtree(self.temp_dir)
+
+    def test_token_merging_field(self):
+        """Test /generate accepts a ratio, echoes it and rejects invalid ones."""
+        response = self.client.post('/generate', json={'filename': self.filename, 'token_merging': 0.5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['token_merging'], 0.5)
+        for bad in (0.8, -0.1, 'half', True):
+            response = self.client.post('/generate', json={'filename': self.filename, 'token_merging': bad})
+            self.assertEqual(response.status_code, 400)
+        self.assertIn('generation/full/tome0.5', app_module.admission.estimator.stats())
+
+if __name__ == '__main__':
+    unittest.main()
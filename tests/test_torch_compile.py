@@ -0,0 +1,119 @@
+import os
+import sys
+import shutil
+import tempfile
+import importlib.util
+import unittest
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.torch_compile import configure_compile_cache, compile_module
+from utils.segmenters import Segmenter
+
+HAS_TORCH = importlib.util.find_spec('torch') is not None
+# Inductor's CPU backend builds its kernels with a C++ compiler
+HAS_INDUCTOR = (HAS_TORCH and importlib.util.find_spec('torch._inductor') is not None and
+                any(shutil.which(cxx) for cxx in (os.environ.get('CXX', 'g++'), 'c++', 'clang++')))
+
+def build_module():
+    import torch
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.Conv2d(3, 8, 3, padding=1), torch.nn.ReLU()).eval()
+
+class CompiledSegmenter(Segmenter):
+    """Stands in for SAM's compiled image encoder: a small conv net compiled on load, run by warmup."""
+    name = 'compiled'
+
+    def __init__(self):
+        self.module = None
+        self.output = None
+
+    def load(self):
+        self.module = compile_module(build_module())
+        return 0
+
+    def unload(self):
+        self.module = None
+
+    def warmup(self):
+        import torch
+        with torch.no_grad():
+            self.output = self.module(torch.ones(1, 3, 16, 16))
+
+class InductorConfigTestCase(unittest.TestCase):
+    """Restores the inductor settings and cache directory changed by configure_compile_cache."""
+    def setUp(self):
+        import torch._inductor.config as inductor_config
+        self.config = inductor_config
+        self.saved = (os.environ.get('TORCHINDUCTOR_CACHE_DIR'), inductor_config.fx_graph_cache,
+                      inductor_config.freezing)
+
+    def tearDown(self):
+        cache_dir, self.config.fx_graph_cache, self.config.freezing = self.saved
+        if cache_dir is None:
+            os.environ.pop('TORCHINDUCTOR_CACHE_DIR', None)
+        else:
+            os.environ['TORCHINDUCTOR_CACHE_DIR'] = cache_dir
+
+class CountingSegmenter(Segmenter):
+    name = 'counting'
+
+    def __init__(self):
+        self.warmups = 0
+
+    def warmup(self):
+        self.warmups += 1
+
+class TestWarmup(unittest.TestCase):
+    def test_warms_up_once(self):
+        """Test a second warm-up (a hot-swap after the compile warm-up thread) does not run again."""
+        from utils.image_processor import ImageProcessor
+        segmenter = CountingSegmenter()
+        processor = ImageProcessor(segmenter=segmenter, generator_backend='stub')
+        processor.warmup(raise_errors=True)
+        processor.warmup(raise_errors=True)
+        self.assertEqual(segmenter.warmups, 1)
+
+@unittest.skipUnless(HAS_TORCH, "torch is not installed")
+class TestConfigureCompileCache(InductorConfigTestCase):
+    def test_sets_cache_dir_and_config(self):
+        """Test the cache directory is created and inductor caching and freezing are enabled."""
+        with tempfile.TemporaryDirectory() as root:
+            cache_dir = os.path.join(root, 'cache')
+            configure_compile_cache(cache_dir)
+            self.assertTrue(os.path.isdir(cache_dir))
+            self.assertEqual(os.environ['TORCHINDUCTOR_CACHE_DIR'], os.path.abspath(cache_dir))
+            self.assertTrue(self.config.fx_graph_cache)
+            self.assertTrue(self.config.freezing)
+
+@unittest.skipUnless(HAS_INDUCTOR, "torch inductor or a C++ compiler is not available")
+class TestCompileModule(InductorConfigTestCase):
+    def tearDown(self):
+        import torch
+        torch._dynamo.reset()
+        super().tearDown()
+
+    def test_compiled_warmup(self):
+        """Test a compiled module warms up in the background, matches eager and fills the cache dir."""
+        import torch
+        from utils.image_processor import ImageProcessor
+
+        with tempfile.TemporaryDirectory() as root:
+            cache_dir = os.path.join(root, 'cache')
+            segmenter = CompiledSegmenter()
+            processor = ImageProcessor(segmenter=segmenter, generator_backend='stub', compile_models=True,
+                                       compile_cache_dir=cache_dir)
+            processor.warmup_thread.join(timeout=600)
+            self.assertFalse(processor.warmup_thread.is_alive())
+
+            self.assertIsNotNone(segmenter.output)
+            with torch.no_grad():
+                expected = build_module()(torch.ones(1, 3, 16, 16))
+            torch.testing.assert_close(segmenter.output.contiguous(), expected, atol=1e-4, rtol=1e-4)
+            # Inductor wrote its generated and built kernels under the configured cache dir
+            artifacts = [name for _, _, files in os.walk(cache_dir) for name in files]
+            self.assertTrue(any(name.endswith('.py') for name in artifacts))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import sys
+import importlib.util
+import unittest
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from utils.scheduler import Lane
+from utils.tracing import Trace, TraceBuffer, ProfilerCapture, StepTimer, activate, span
+
+class TestTracing(unittest.TestCase):
+    def tearDown(self):
+        activate(None)
+
+    def test_span_without_trace_is_noop(self):
+        """Test spans outside a request trace record nothing and do not fail."""
+        with span('decode'):
+            pass
+
+    def test_spans_follow_lane_jobs(self):
+        """Test spans recorded in a lane worker land on the submitting request's trace."""
+        lane = Lane('test')
+        trace = Trace('POST /upload')
+        activate(trace)
+
+        def job():
+            with span('sam_encode', tier='vit_b'):
+                pass
+        lane.submit(job).result(5)
+        activate(None)
+        lane.submit(job).result(5)
+        lane.shutdown()
+
+        self.assertEqual([s['name'] for s in trace.spans], ['sam_encode'])
+        self.assertEqual(trace.spans[0]['args'], {'tier': 'vit_b'})
+        self.assertEqual(trace.spans[0]['thread_name'], 'test-0')
+
+    def test_step_timer(self):
+        """Test the step callback records one span per step, then the decode."""
+        trace = Trace('POST /generate')
+        activate(trace)
+        steps = StepTimer()
+        for step, timestep in enumerate([999, 500, 1]):
+            self.assertEqual(steps(None, step, timestep, {'latents': None}), {'latents': None})
+        steps.finish()
+
+        names = [s['name'] for s in trace.spans]
+        self.assertEqual(names, ['denoise_step'] * 3 + ['vae_decode'])
+        self.assertEqual(trace.spans[1]['args'], {'step': 1, 'timestep': 500})
+
+    def test_ring_buffer_and_chrome_export(self):
+        """Test the buffer keeps the newest traces and exports complete events."""
+        buffer = TraceBuffer(capacity=2)
+        for index in range(3):
+            trace = Trace('POST /generate', trace_id=f"t{index}")
+            trace.add_span('save', trace.start, trace.start + 0.001)
+            trace.finish(200)
+            buffer.add(trace)
+
+        self.assertEqual([trace.trace_id for trace in buffer.recent()], ['t2', 't1'])
+        self.assertIsNone(buffer.get('t0'))
+        events = buffer.chrome_trace({'t1'})['traceEvents']
+        complete = [event for event in events if event['ph'] == 'X']
+        self.assertEqual([event['name'] for event in complete], ['POST /generate', 'save'])
+        self.assertAlmostEqual(complete[1]['dur'], 1000, places=3)
+        self.assertTrue(all(event['args']['trace_id'] == 't1' for event in complete))
+
+    @unittest.skipUnless(importlib.util.find_spec('torch'), "torch is not installed")
+    def test_profiler_capture(self):
+        """Test an armed capture profiles exactly the requested number of blocks."""
+        import torch
+        profiler = ProfilerCapture()
+        profiler.arm(1)
+        for _ in range(2):
+            with profiler.capture('generate_result'):
+                torch.mm(torch.randn(32, 32), torch.randn(32, 32))
+
+        stats = profiler.stats()
+        self.assertEqual(stats['remaining'], 0)
+        self.assertEqual(len(stats['profiles']), 1)
+        self.assertIn('aten::mm', [op['name'] for op in stats['profiles'][0]['operators']])
+
+class TestTraceEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.client = app_module.app.test_client()
+        self.saved_token = app_module.ADMIN_TOKEN
+
+    def tearDown(self):
+        app_module.ADMIN_TOKEN = self.saved_token
+        app_module.profiler.arm(0)
+
+    def test_request_trace(self):
+        """Test model endpoints return a trace ID that /traces can look up."""
+        response = self.client.post('/generate', json={'filename': 'missing.png'},
+                                    headers={'X-Trace-Id': 'client-trace-1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.headers['X-Trace-Id'], 'client-trace-1')
+
+        app_module.ADMIN_TOKEN = 'secret'
+        headers = {'X-Admin-Token': 'secret'}
+        detail = self.client.get('/traces/client-trace-1', headers=headers).get_json()
+        self.assertEqual(detail['name'], 'POST /generate')
+        self.assertEqual(detail['status'], 400)
+        export = self.client.get('/traces/export?trace_id=client-trace-1', headers=headers).get_json()
+        self.assertIn('POST /generate', [event['name'] for event in export['traceEvents']])
+        recent = self.client.get('/traces', headers=headers).get_json()
+        self.assertIn('client-trace-1', [trace['trace_id'] for trace in recent])
+
+        # Stats endpoints are not traced
+        self.assertNotIn('X-Trace-Id', self.client.get('/healthz').headers)
+
+    def test_traces_require_admin_token(self):
+        """Test trace routes are refused without the admin token, or while none is configured."""
+        for path in ('/traces', '/traces/export', '/traces/client-trace-1'):
+            app_module.ADMIN_TOKEN = None
+            self.assertEqual(self.client.get(path, headers={'X-Admin-Token': ''}).status_code, 403)
+            app_module.ADMIN_TOKEN = 'secret'
+            self.assertEqual(self.client.get(path).status_code, 403)
+            self.assertEqual(self.client.get(path, headers={'X-Admin-Token': 'wrong'}).status_code, 403)
+
+    def test_admin_profile_token(self):
+        """Test arming the profiler requires the admin token, and is refused while none is configured."""
+        app_module.ADMIN_TOKEN = None
+        response = self.client.post('/admin/profile', json={'requests': 2}, headers={'X-Admin-Token': ''})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get('/admin/profile').status_code, 403)
+        app_module.ADMIN_TOKEN = 'secret'
+        self.assertEqual(self.client.post('/admin/profile', json={'requests': 2}).status_code, 403)
+        response = self.client.post('/admin/profile', json={'requests': 2}, headers={'X-Admin-Token': 'secret'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()['remaining'], 2)
+        response = self.client.post('/admin/profile', json={'requests': -1}, headers={'X-Admin-Token': 'secret'})
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
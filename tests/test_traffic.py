@@ -0,0 +1,115 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from PIL import Image
+
+# Add parent directory to path to import from main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+import loadgen
+from utils.storage import UploadStore
+from utils.image_processor import ImageProcessor
+from utils.model_registry import ModelManager
+from utils.traffic import TrafficRecorder, load_log
+
+def png_bytes(color, size=(48, 32)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+class TestTrafficRecorder(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_append_and_load(self):
+        """Test entries are appended one per line and malformed lines are skipped."""
+        path = os.path.join(self.temp_dir, 'logs', 'traffic.jsonl')
+        recorder = TrafficRecorder(path)
+        recorder.record({'endpoint': '/upload', 'status': 200})
+        with open(path, 'a') as f:
+            f.write('{not json\n\n')
+        recorder.record({'endpoint': '/generate', 'status': 429})
+        recorder.close()
+        self.assertEqual([entry['status'] for entry in load_log(path)], [200, 429])
+
+class TestRecordAndReplay(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.temp_dir, 'store')
+        self.log_path = os.path.join(self.temp_dir, 'traffic.jsonl')
+        self.original = (app_module.upload_store, app_module.models, app_module.traffic_recorder)
+        app_module.upload_store = UploadStore(self.store_dir)
+        app_module.models = ModelManager()
+        app_module.models.activate(app_module.MODEL_VERSION,
+                                   ImageProcessor(segmenter_backend='stub', generator_backend='stub'))
+        self.recorder = app_module.traffic_recorder = TrafficRecorder(self.log_path)
+        self.client = app_module.app.test_client()
+
+    def tearDown(self):
+        self.recorder.close()
+        app_module.upload_store, app_module.models, app_module.traffic_recorder = self.original
+        shutil.rmtree(self.temp_dir)
+
+    def record_session(self):
+        response = self.client.post('/upload', data={'file': (io.BytesIO(png_bytes('blue')), 'shirt.png')},
+                                    content_type='multipart/form-data')
+        filename = response.get_json()['original_image']
+        self.client.post('/generate', json={'filename': filename, 'clothing_type': 'dress', 'seeds': [7]})
+        self.client.post('/generate', json={'filename': 'missing.png'})
+        self.client.get('/healthz')
+        return filename
+
+    def test_records_requests(self):
+        """Test /upload and /generate requests are logged with inputs, request fields and timings."""
+        filename = self.record_session()
+        entries = load_log(self.log_path)
+        self.assertEqual([(e['endpoint'], e['status']) for e in entries],
+                         [('/upload', 200), ('/generate', 200), ('/generate', 400)])
+
+        upload, generate, missing = entries
+        self.assertEqual(upload['input'], {'filename': filename, 'bytes': len(png_bytes('blue')),
+                                           'width': 48, 'height': 32})
+        self.assertIn('predicted_wait', upload)
+        self.assertEqual(generate['request'], {'clothing_type': 'dress', 'seeds': [7]})
+        self.assertEqual(generate['input']['filename'], filename)
+        self.assertEqual(generate['variants'], 1)
+        self.assertGreater(generate['duration'], 0)
+        self.assertNotIn('input', missing)
+
+    def test_replay_in_process(self):
+        """Test a recorded log replays against the app with original and synthetic images."""
+        self.record_session()
+        entries = loadgen.replayable(load_log(self.log_path))
+        self.assertEqual(len(entries), 2)
+        app_module.traffic_recorder = None
+
+        # The original image is found in the recorded store by its content hash
+        images = loadgen.ImageSource([self.store_dir])
+        replayer = loadgen.Replayer(loadgen.AppClient(app_module.app), images, concurrency=2)
+        results, elapsed = replayer.replay(entries, speed=0)
+        report = loadgen.summarize(results, elapsed)
+        self.assertEqual(report['overall']['errors'], 0)
+        self.assertEqual(report['endpoints']['/generate']['requests'], 1)
+        self.assertEqual(images.found, 1)
+
+        # Without the original, a generate-only replay uploads a synthetic stand-in first
+        images = loadgen.ImageSource()
+        replayer = loadgen.Replayer(loadgen.AppClient(app_module.app), images)
+        results, _ = replayer.replay(entries[1:], speed=0)
+        self.assertEqual([r['status'] for r in results], [200])
+        self.assertEqual(images.synthesized, 1)
+
+    def test_percentile(self):
+        self.assertIsNone(loadgen.percentile([], 50))
+        self.assertEqual(loadgen.percentile([3, 1, 2], 50), 2)
+        self.assertAlmostEqual(loadgen.percentile([1, 2, 3, 4], 90), 3.7)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import math
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job would miss its lane's latency SLO."""
+
+    def __init__(self, lane, predicted_wait, predicted_duration, retry_after):
+        super().__init__(
+            f"{lane} is overloaded: predicted latency "
+            f"{predicted_wait + predicted_duration:.1f}s exceeds the SLO"
+        )
+        self.lane = lane
+        self.predicted_wait = predicted_wait
+        self.predicted_duration = predicted_duration
+        self.retry_after = retry_after
+
+
+class DurationEstimator:
+    """Predict job duration as ``base + rate * units`` from recently measured jobs.
+
+    ``units`` is the job size (megapixels for segmentation, scaled denoising steps for
+    generation). Observations are kept per (lane, profile) as exponentially decayed sums,
+    so the fit tracks recent throughput. Until ``min_samples`` jobs have been seen, or when
+    all recent jobs had the same size, the estimate falls back to a pure rate.
+    """
+
+    def __init__(self, priors, decay=0.9, min_samples=3):
+        self.priors = dict(priors)
+        self.decay = decay
+        self.min_samples = min_samples
+        self._sums = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def observe(self, lane, units, seconds, profile=None):
+        """Record a finished job's size and measured run time."""
+        key = (lane, profile)
+        with self._lock:
+            sums = self._sums.setdefault(key, [0.0] * 5)
+            for i in range(5):
+                sums[i] *= self.decay
+            sums[0] += 1.0
+            sums[1] += units
+            sums[2] += seconds
+            sums[3] += units * units
+            sums[4] += units * seconds
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def _fit(self, key):
+        """Return (base, rate) for a key, or None without enough samples. Caller holds the lock."""
+        if self._counts.get(key, 0) < self.min_samples:
+            return None
+        n, sx, sy, sxx, sxy = self._sums[key]
+        mean_x, mean_y = sx / n, sy / n
+        var_x = sxx / n - mean_x * mean_x
+        if var_x > 1e-6 * max(mean_x * mean_x, 1e-12):
+            rate = (sxy / n - mean_x * mean_y) / var_x
+            base = mean_y - rate * mean_x
+            if rate >= 0 and base >= 0:
+                return base, rate
+        return 0.0, mean_y / mean_x if mean_x > 0 else 0.0
+
+    def estimate(self, lane, units, profile=None):
+        """Predicted run time in seconds for a job of the given size."""
+        with self._lock:
+            fit = self._fit((lane, profile))
+        if fit is None:
+            return self.priors.get(lane, 1.0) * units
+        base, rate = fit
+        return base + rate * units
+
+    def stats(self):
+        """Fitted base/rate per (lane, profile)."""
+        with self._lock:
+            report = {}
+            for key, count in self._counts.items():
+                fit = self._fit(key)
+                lane, profile = key
+                report[f"{lane}/{profile}" if profile else lane] = {
+                    'samples': count,
+                    'base': fit[0] if fit else None,
+                    'rate': fit[1] if fit else self.priors.get(lane, 1.0),
+                }
+            return report
+
+
+class AdmissionController:
+    """Admit scheduler jobs only when their predicted latency fits the lane's SLO.
+
+    Predicted wait is the estimated work already admitted to the lane divided by its
+    workers; predicted latency adds the job's own estimate. A job that would exceed
+    ``slo[lane]`` seconds is rejected with a retry-after of the excess, i.e. roughly the
+    time until enough queued work has drained. An idle lane always admits. An SLO of 0
+    disables admission control for that lane while still reporting predictions.
+    """
+
+    def __init__(self, scheduler, estimator, slo):
+        self.scheduler = scheduler
+        self.estimator = estimator
+        self.slo = dict(slo)
+        self._lock = threading.Lock()
+        self._outstanding = {lane: 0.0 for lane in scheduler.lanes}
+        self._admitted = {lane: 0 for lane in scheduler.lanes}
+        self._rejected = {lane: 0 for lane in scheduler.lanes}
+
+    def predict(self, lane, units, profile=None):
+        """Return (predicted_wait, predicted_duration) in seconds for a job."""
+        duration = self.estimator.estimate(lane, units, profile)
+        with self._lock:
+            wait = self._outstanding[lane] / self.scheduler.lanes[lane].workers
+        return wait, duration
+
+    def submit(self, lane, fn, *args, units=1.0, profile=None, client_id=None, priority=0, **kwargs):
+        """Admit and queue a job. Returns (future, predicted_wait, predicted_duration)."""
+        if lane not in self.scheduler.lanes:
+            raise ValueError(f"Unknown lane: {lane}")
+        duration = self.estimator.estimate(lane, units, profile)
+        slo = self.slo.get(lane, 0)
+
+        with self._lock:
+            outstanding = self._outstanding[lane]
+            wait = outstanding / self.scheduler.lanes[lane].workers
+            latency = wait + duration
+            if slo and outstanding > 0 and latency > slo:
+                self._rejected[lane] += 1
+                retry_after = max(1, math.ceil(latency - slo))
+                logger.info(f"Rejected {lane} job: predicted {latency:.1f}s > SLO {slo}s")
+                raise AdmissionRejected(lane, wait, duration, retry_after)
+            self._outstanding[lane] += duration
+            self._admitted[lane] += 1
+
+        def timed():
+            start_time = time.perf_counter()
+            result = fn(*args, **kwargs)
+            self.estimator.observe(lane, units, time.perf_counter() - start_time, profile)
+            return result
+
+        def release(_):
+            with self._lock:
+                self._outstanding[lane] = max(0.0, self._outstanding[lane] - duration)
+
+        try:
+            future = self.scheduler.submit(lane, timed, client_id=client_id, priority=priority)
+        except Exception:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return future, wait, duration
+
+    def stats(self):
+        """Outstanding predicted work, SLO and admit/reject counts per lane."""
+        with self._lock:
+            lanes = {
+                lane: {
+                    'slo': self.slo.get(lane, 0),
+                    'outstanding': self._outstanding[lane],
+                    'admitted': self._admitted[lane],
+                    'rejected': self._rejected[lane],
+                }
+                for lane in self.scheduler.lanes
+            }
+        return {'lanes': lanes, 'estimator': self.estimator.stats()}
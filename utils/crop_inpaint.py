@@ -0,0 +1,66 @@
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def mask_bbox(mask, margin=0.15, square=True):
+    """Bounding box (x0, y0, x1, y1) of a binary mask, grown by a margin and clamped to the image.
+
+    The margin is a fraction of the box's longer side. With ``square`` the box is grown to a
+    square where the image allows it, so resizing to the model's native size keeps the aspect.
+    """
+    ys, xs = np.nonzero(mask)
+    if len(xs) == 0:
+        raise ValueError("Cannot crop to an empty mask")
+
+    height, width = mask.shape[:2]
+    x0, x1 = int(xs.min()), int(xs.max()) + 1
+    y0, y1 = int(ys.min()), int(ys.max()) + 1
+
+    pad = int(round(max(x1 - x0, y1 - y0) * margin))
+    box_w = x1 - x0 + 2 * pad
+    box_h = y1 - y0 + 2 * pad
+    if square:
+        box_w = box_h = max(box_w, box_h)
+    box_w, box_h = min(box_w, width), min(box_h, height)
+
+    # Center the grown box on the mask, then shift it back inside the image
+    center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+    x0 = int(round(center_x - box_w / 2))
+    y0 = int(round(center_y - box_h / 2))
+    x0 = min(max(x0, 0), width - box_w)
+    y0 = min(max(y0, 0), height - box_h)
+    return x0, y0, x0 + box_w, y0 + box_h
+
+
+def feather_mask(mask, radius):
+    """Float alpha in [0, 1] with edges softened by a Gaussian of the given radius in pixels."""
+    alpha = mask.astype(np.float32)
+    if alpha.max() > 1.0:
+        alpha /= 255.0
+    if radius <= 0:
+        return alpha
+    kernel = 2 * int(radius) + 1
+    return cv2.GaussianBlur(alpha, (kernel, kernel), 0)
+
+
+def paste_back(original, generated, bbox, mask, feather_radius=8):
+    """Composite a generated crop back into the full-resolution original.
+
+    ``original`` is an HxWx3 uint8 array, ``generated`` the model output for the crop at any
+    size, ``mask`` the full-resolution binary mask. Generated pixels are used inside the
+    feathered mask and the original everywhere else.
+    """
+    x0, y0, x1, y1 = bbox
+    crop_w, crop_h = x1 - x0, y1 - y0
+    generated = cv2.resize(np.asarray(generated), (crop_w, crop_h), interpolation=cv2.INTER_LANCZOS4)
+
+    alpha = feather_mask(mask[y0:y1, x0:x1], feather_radius)[:, :, None]
+    region = original[y0:y1, x0:x1].astype(np.float32)
+    blended = generated.astype(np.float32) * alpha + region * (1.0 - alpha)
+
+    result = original.copy()
+    result[y0:y1, x0:x1] = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+    return result
@@ -0,0 +1,88 @@
+
+class FeatureCache:
+    """DeepCache-style reuse of deep UNet and ControlNet features across denoising steps.
+
+    Every ``interval`` steps the models run in full and the outputs of their deep blocks
+    (all but the first ``depth`` down blocks and the last ``depth`` up blocks, and the
+    mid block) are kept. On the steps in between those blocks return the kept outputs,
+    so only the shallow, full-resolution blocks are recomputed: the UNet's high-level
+    features change slowly from one step to the next. ControlNet's conditioning
+    embedding depends only on the control image and is computed once per generation.
+
+    Blocks are patched in place by ``attach``; call ``reset`` before each pipeline run.
+    """
+
+    def __init__(self, interval=3, depth=1):
+        if interval < 2:
+            raise ValueError("Feature reuse interval must be at least 2")
+        if depth < 1:
+            raise ValueError("Feature reuse depth must be at least 1")
+        self.interval = interval
+        self.depth = depth
+        self.step = 0
+        self._outputs = {}
+        self._patched = []
+        self.full_steps = 0
+        self.reused_steps = 0
+
+    @property
+    def reusing(self):
+        """Whether the current step reuses cached deep features."""
+        return self.step % self.interval != 0
+
+    def reset(self):
+        self.step = 0
+        self._outputs = {}
+
+    def attach(self, unet, controlnet=None):
+        """Patch the deep blocks of ``unet`` (and ``controlnet``) and count steps on the UNet."""
+        if len(unet.down_blocks) <= self.depth:
+            raise ValueError(f"UNet has {len(unet.down_blocks)} levels; depth {self.depth} leaves none to cache")
+        for index, block in enumerate(unet.down_blocks[self.depth:]):
+            self._patch(block, f"unet.down.{index}")
+        self._patch(unet.mid_block, "unet.mid")
+        for index, block in enumerate(unet.up_blocks[:-self.depth]):
+            self._patch(block, f"unet.up.{index}")
+        if controlnet is not None:
+            for index, block in enumerate(controlnet.down_blocks[self.depth:]):
+                self._patch(block, f"controlnet.down.{index}")
+            self._patch(controlnet.mid_block, "controlnet.mid")
+            self._patch(controlnet.controlnet_cond_embedding, "controlnet.cond", every_step=True)
+        self._hook = unet.register_forward_hook(self._end_step)
+
+    def detach(self):
+        for module in self._patched:
+            del module.forward
+        self._patched = []
+        self._hook.remove()
+        self.reset()
+
+    def _patch(self, module, key, every_step=False):
+        original = module.forward
+
+        def forward(*args, **kwargs):
+            # Outputs are only reused at the same batch size (guidance truncation halves it)
+            batch = (args[0] if args else kwargs['hidden_states']).shape[0]
+            if (every_step or self.reusing) and key in self._outputs and self._outputs[key][0] == batch:
+                return self._outputs[key][1]
+            output = original(*args, **kwargs)
+            self._outputs[key] = (batch, output)
+            return output
+
+        module.forward = forward
+        self._patched.append(module)
+
+    def _end_step(self, module, args, output):
+        if self.reusing:
+            self.reused_steps += 1
+        else:
+            self.full_steps += 1
+        self.step += 1
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'depth': self.depth,
+            'full_steps': self.full_steps,
+            'reused_steps': self.reused_steps,
+        }
@@ -0,0 +1,562 @@
+import os
+import json
+import threading
+import hashlib
+import tempfile
+import logging
+import numpy as np
+from PIL import Image, ImageOps
+from utils.memory_budget import module_bytes
+from utils.torch_compile import compile_module
+from utils.feature_cache import FeatureCache
+from utils.token_merging import TokenMerging
+from utils.guidance import GuidanceTruncation
+from utils.remote import encode_image, decode_image
+from utils.tracing import StepTimer, span, current_trace
+
+logger = logging.getLogger(__name__)
+
+NEGATIVE_PROMPT = (
+    "low quality, blurry, bad anatomy, bad proportions, deformed, "
+    "disfigured, distorted, wrong pose, duplicate, morbid, mutilated, "
+    "poorly drawn face, poorly drawn hands, floating limbs"
+)
+
+# Denoising steps per generation
+NUM_INFERENCE_STEPS = 30
+
+# Classifier-free guidance scale of the standard path
+GUIDANCE_SCALE = 7.5
+
+# Steps and guidance of the latent-consistency fast path (4-8 steps give usable results;
+# guidance 1 skips the unconditional pass)
+FAST_STEPS = 6
+FAST_GUIDANCE = 1.0
+
+# Denoising schedulers selectable per model version, by diffusers class name
+SCHEDULERS = {
+    'unipc': 'UniPCMultistepScheduler',
+    'ddim': 'DDIMScheduler',
+    'dpm': 'DPMSolverMultistepScheduler',
+    'euler_a': 'EulerAncestralDiscreteScheduler',
+}
+
+# Highest token merging ratio: at most the 3 of every 4 tokens that are not merge destinations
+MAX_TOKEN_MERGING = 0.75
+
+# Resident size assumed for SD 1.5 + ControlNet before it has been loaded once
+DIFFUSION_SIZE_ESTIMATE = 4 * 1024 ** 3
+
+# Generator backends by name, see register_generator
+GENERATORS = {}
+
+
+def register_generator(name):
+    """Class decorator adding a Generator subclass to the registry under ``name``."""
+    def decorator(cls):
+        GENERATORS[name] = cls
+        cls.name = name
+        return cls
+    return decorator
+
+
+def check_token_merging(ratio):
+    """Validate a token merging ratio. Returns it as a float."""
+    ratio = float(ratio)
+    if not 0 <= ratio <= MAX_TOKEN_MERGING:
+        raise ValueError(f"Token merging ratio must be between 0 and {MAX_TOKEN_MERGING}")
+    return ratio
+
+
+def repaint_mask(mask_image):
+    """The diffusers inpainting mask for a Generator mask: white where the pipeline repaints
+    (the garment, 0 in the Generator's mask), black where it keeps the init image."""
+    return ImageOps.invert(mask_image.convert('L'))
+
+
+def create_generator(name, config=None):
+    """Instantiate a registered generator backend from a config dict (see Generator.from_config)."""
+    if name not in GENERATORS:
+        raise ValueError(f"Unknown generator backend: {name} (available: {', '.join(sorted(GENERATORS))})")
+    return GENERATORS[name].from_config(config or {})
+
+
+class Generator:
+    """Interface for try-on image generators.
+
+    ``generate`` receives the preprocessed model inputs as PIL images of ``size`` x
+    ``size`` (the init image, the control image with the garment whitened and the
+    inpainting mask, 0 on the garment) and returns one image per prompt, seeded by the
+    matching entry of ``seeds`` when given. ``token_merging`` overrides the backend's
+    token merging ratio for one call; backends without token merging ignore it.
+    ``fast`` asks for the few-step fast path, where the backend has one.
+    ``load``/``unload`` follow the memory budget like Segmenter's, and ``served_version``
+    names the model version that ran the calling thread's last remote ``generate``.
+    """
+
+    name = None
+    fast_available = False
+    served_version = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the backend from the settings it uses in a shared config dict (memory_saving,
+        compile_models, ...); others are ignored."""
+        return cls()
+
+    def size_estimate(self):
+        return 0
+
+    def load(self):
+        return 0
+
+    def unload(self):
+        pass
+
+    def generate(self, prompts, init_image, control_image, mask_image, size=512, seeds=None, token_merging=None,
+                 fast=False):
+        raise NotImplementedError
+
+    def warmup(self):
+        """Run once at serving shapes (compiled backends build their kernels here)."""
+
+    def stats(self):
+        """Backend statistics for /stats/generation, or None."""
+        return None
+
+
+class DiffusersGenerator(Generator):
+    """ControlNet inpaint pipeline from diffusers; subclasses build the pipeline.
+
+    The init image is kept outside the mask and the garment is repainted, guided by the
+    control image.
+    """
+
+    # Token merging applies at latent resolutions downsampled at most this many times
+    token_merging_max_downsample = 1
+
+    def __init__(self, memory_saving=False, compile_models=False, num_inference_steps=NUM_INFERENCE_STEPS,
+                 scheduler="unipc", dtype=None, feature_reuse_interval=0, feature_reuse_depth=1,
+                 token_merging_ratio=0.0, lcm_lora=None, fast_steps=FAST_STEPS, fast_guidance=FAST_GUIDANCE,
+                 cfg_stop=1.0, cfg_converge_threshold=0.0, warmup_sizes=(512,)):
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f"Unknown scheduler: {scheduler} (available: {', '.join(sorted(SCHEDULERS))})")
+        check_token_merging(token_merging_ratio)
+        if not 0 < cfg_stop <= 1:
+            raise ValueError("cfg_stop must be a fraction of the steps in (0, 1]")
+        self.memory_saving = memory_saving
+        self.compile_models = compile_models
+        self.num_inference_steps = num_inference_steps
+        self.scheduler = scheduler
+        # "float16", "bfloat16", "float32" or None for float16 on CUDA and float32 on CPU
+        self.dtype = dtype
+        # Reuse deep UNet/ControlNet features for interval - 1 steps after each full step; 0 or 1 is off
+        self.feature_reuse_interval = feature_reuse_interval
+        self.feature_reuse_depth = feature_reuse_depth
+        self.feature_cache = None
+        # Share of self-attention tokens merged by default (requests may override it); 0 is off
+        self.token_merging_ratio = token_merging_ratio
+        self.token_merging = None
+        # Local LCM-LoRA adapter (a .safetensors file or a directory holding one) for the fast path
+        self.lcm_lora = lcm_lora
+        self.fast_steps = fast_steps
+        self.fast_guidance = fast_guidance
+        self.fast_pipe = None
+        # Guidance schedule: classifier-free guidance for the first cfg_stop of the steps, or until
+        # the conditional and unconditional predictions converge below cfg_converge_threshold
+        self.cfg_stop = cfg_stop
+        self.cfg_converge_threshold = cfg_converge_threshold
+        # Image sizes requests run at (512 and the crop size); compiled models are warmed up at each
+        self.warmup_sizes = tuple(warmup_sizes)
+        # One pipeline run at a time: the scheduler keeps per-run state, runs reconfigure the shared
+        # models (token merging, LoRA, feature cache, guidance), and the compile warm-up thread may
+        # still be running when the first jobs arrive
+        self._pipeline_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.guidance_stats = {'generations': 0, 'truncated': 0, 'unet_evaluations': 0, 'saved_unet_evaluations': 0}
+        self.pipe = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(memory_saving=config.get('memory_saving', False),
+                   compile_models=config.get('compile_models', False),
+                   **cls.pipeline_options(config))
+
+    @staticmethod
+    def pipeline_options(config):
+        """Scheduler, dtype, step count, feature reuse, token merging, fast path and guidance schedule
+        settings from a config dict, when set (zero and other falsy values included)."""
+        keys = ('scheduler', 'dtype', 'num_inference_steps', 'feature_reuse_interval', 'feature_reuse_depth',
+                'token_merging_ratio', 'lcm_lora', 'fast_steps', 'fast_guidance', 'cfg_stop',
+                'cfg_converge_threshold', 'warmup_sizes')
+        return {key: config[key] for key in keys if config.get(key) is not None}
+
+    def build_pipeline(self, dtype):
+        raise NotImplementedError
+
+    @property
+    def fast_available(self):
+        return self.fast_pipe is not None
+
+    def build_fast_pipeline(self, pipe):
+        """A pipeline sharing ``pipe``'s models with the LCM scheduler, after loading the LCM-LoRA
+        adapter into them (disabled until a fast request enables it). None when the adapter is
+        not configured, not present or cannot be loaded: fast requests then use ``pipe``."""
+        import diffusers
+        if not self.lcm_lora:
+            return None
+        if self.compile_models:
+            logger.warning("The LCM fast path is not supported with compiled models; fast requests use the standard path")
+            return None
+        if not os.path.exists(self.lcm_lora):
+            logger.info(f"No LCM-LoRA adapter at {self.lcm_lora}; fast requests use the standard path")
+            return None
+        try:
+            if os.path.isdir(self.lcm_lora):
+                pipe.load_lora_weights(self.lcm_lora, adapter_name='lcm')
+            else:
+                pipe.load_lora_weights(os.path.dirname(self.lcm_lora) or '.',
+                                       weight_name=os.path.basename(self.lcm_lora), adapter_name='lcm')
+            pipe.disable_lora()
+        except Exception as e:
+            logger.warning(f"Could not load LCM-LoRA adapter from {self.lcm_lora}: {str(e)}; "
+                           f"fast requests use the standard path")
+            return None
+        components = dict(pipe.components, scheduler=diffusers.LCMScheduler.from_config(pipe.scheduler.config))
+        fast_pipe = type(pipe)(**components, requires_safety_checker=False)
+        fast_pipe.set_progress_bar_config(disable=True)
+        logger.info(f"Loaded LCM-LoRA adapter from {self.lcm_lora}: fast path runs {self.fast_steps} steps")
+        return fast_pipe
+
+    def load(self):
+        """Build and configure the pipeline. Returns its resident size in bytes."""
+        import torch
+        import diffusers
+        try:
+            device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            if self.dtype:
+                dtype = getattr(torch, self.dtype)
+            else:
+                dtype = torch.float16 if device.type == 'cuda' else torch.float32
+            pipe = self.build_pipeline(dtype)
+            if self.memory_saving and device.type == 'cuda':
+                # Keep only the sub-model currently running on the GPU
+                pipe.enable_model_cpu_offload()
+            else:
+                pipe = pipe.to(device)
+
+            # Use more efficient attention processor if available (xformers is CUDA only)
+            if device.type == 'cuda':
+                try:
+                    pipe.enable_xformers_memory_efficient_attention()
+                except Exception as e:
+                    logger.warning(f"xformers attention unavailable: {str(e)}")
+
+            # Trade some speed for lower peak memory in attention and VAE decode
+            if self.memory_saving:
+                pipe.enable_attention_slicing()
+                pipe.vae.enable_slicing()
+                pipe.vae.enable_tiling()
+                logger.info("Enabled attention slicing and VAE slicing/tiling")
+
+            # Use better scheduler
+            scheduler_class = getattr(diffusers, SCHEDULERS[self.scheduler])
+            pipe.scheduler = scheduler_class.from_config(pipe.scheduler.config)
+
+            size = module_bytes(*pipe.components.values())
+            self.feature_cache = None
+            if self.feature_reuse_interval > 1:
+                if self.compile_models:
+                    logger.warning("Feature reuse is not supported with compiled models; running every step in full")
+                else:
+                    self.feature_cache = FeatureCache(self.feature_reuse_interval, self.feature_reuse_depth)
+                    self.feature_cache.attach(pipe.unet, pipe.controlnet)
+                    logger.info(f"Reusing deep UNet features for {self.feature_reuse_interval - 1} of every "
+                                f"{self.feature_reuse_interval} steps (depth {self.feature_reuse_depth})")
+            self.token_merging = None
+            if self.compile_models:
+                if self.token_merging_ratio:
+                    logger.warning("Token merging is not supported with compiled models; attention runs on all tokens")
+            else:
+                # Attached even at ratio 0 so requests can turn it on
+                self.token_merging = TokenMerging(self.token_merging_ratio, self.token_merging_max_downsample)
+                self.token_merging.attach(pipe.unet, pipe.controlnet)
+            if self.compile_models and (self.cfg_stop < 1 or self.cfg_converge_threshold > 0):
+                logger.warning("Guidance truncation is not supported with compiled models; guidance runs every step")
+            if self.compile_models:
+                pipe.unet = compile_module(pipe.unet)
+                pipe.controlnet = compile_module(pipe.controlnet)
+            pipe.set_progress_bar_config(disable=True)
+            self.fast_pipe = self.build_fast_pipeline(pipe)
+            self.pipe = pipe
+            return size
+        except Exception as e:
+            logger.error(f"Error initializing {self.name} pipeline: {str(e)}")
+            raise
+
+    def unload(self):
+        self.pipe = None
+        self.feature_cache = None
+        self.token_merging = None
+        self.fast_pipe = None
+
+    def generate(self, prompts, init_image, control_image, mask_image, size=512, seeds=None, token_merging=None,
+                 fast=False):
+        """Run the pipeline once for all prompts and return the generated PIL images.
+
+        ``fast`` runs the LCM fast path when its adapter is loaded, the standard path otherwise.
+        """
+        import torch
+        pipe, num_steps, guidance_scale = self.pipe, self.num_inference_steps, GUIDANCE_SCALE
+        if fast and self.fast_pipe is None:
+            logger.warning("Fast path requested without an LCM-LoRA adapter; using the standard path")
+        elif fast:
+            pipe, num_steps, guidance_scale = self.fast_pipe, self.fast_steps, self.fast_guidance
+        ratio = self.token_merging_ratio if token_merging is None else check_token_merging(token_merging)
+        # CPU generators give the same latents for a seed on any device
+        generator = None if seeds is None else [torch.Generator('cpu').manual_seed(seed) for seed in seeds]
+        # Compiled models only run the warmed-up shapes: full guidance and one image per call
+        truncate = (guidance_scale > 1 and not self.compile_models and
+                    (self.cfg_stop < 1 or self.cfg_converge_threshold > 0))
+        batches = [slice(i, i + 1) for i in range(len(prompts))] if self.compile_models else [slice(None)]
+        # The token merging ratio, LoRA switch, feature cache and guidance schedule live on the shared
+        # models, so a run configures and uses them under the pipeline lock
+        with self._pipeline_lock:
+            if self.token_merging is not None:
+                self.token_merging.ratio = ratio
+                self.token_merging.reset()
+            # Spans for prompt setup, each denoising step and the VAE decode
+            steps = StepTimer(first_module=self.pipe.controlnet)
+            callback = steps
+            if truncate:
+                callback = GuidanceTruncation(self.cfg_stop, self.cfg_converge_threshold, unet=self.pipe.unet,
+                                              callback=steps)
+            if pipe is self.fast_pipe:
+                self.pipe.enable_lora()
+            images = []
+            try:
+                for batch in batches:
+                    images += pipe(
+                        prompt=list(prompts[batch]),
+                        image=init_image,
+                        control_image=control_image,
+                        mask_image=repaint_mask(mask_image),
+                        negative_prompt=[NEGATIVE_PROMPT] * len(prompts[batch]),
+                        height=size,
+                        width=size,
+                        num_inference_steps=num_steps,
+                        guidance_scale=guidance_scale,
+                        controlnet_conditioning_scale=0.8,
+                        generator=None if generator is None else generator[batch],
+                        callback_on_step_end=callback,
+                        callback_on_step_end_tensor_inputs=['latents', 'prompt_embeds', 'control_image', 'mask',
+                                                            'masked_image_latents']
+                    ).images
+            finally:
+                steps.finish()
+                saved = callback.finish() if callback is not steps else 0
+                if pipe is self.fast_pipe:
+                    self.pipe.disable_lora()
+                if self.feature_cache is not None:
+                    # Cached block outputs are only valid within one run
+                    self.feature_cache.reset()
+            num_timesteps = pipe.num_timesteps
+        self._count_evaluations(num_timesteps * len(prompts) * (2 if guidance_scale > 1 else 1), saved)
+        return images
+
+    def _count_evaluations(self, full, saved):
+        with self._stats_lock:
+            self.guidance_stats['generations'] += 1
+            self.guidance_stats['truncated'] += 1 if saved else 0
+            self.guidance_stats['unet_evaluations'] += full - saved
+            self.guidance_stats['saved_unet_evaluations'] += saved
+
+    def stats(self):
+        with self._stats_lock:
+            stats = {'guidance': dict(self.guidance_stats, cfg_stop=self.cfg_stop,
+                                      cfg_converge_threshold=self.cfg_converge_threshold)}
+        if self.feature_cache is not None:
+            stats['feature_reuse'] = self.feature_cache.stats()
+        return stats
+
+    def warmup(self):
+        try:
+            # One image per call with full guidance at each serving size: the shapes generate runs
+            for size in self.warmup_sizes:
+                blank = Image.new('RGB', (size, size), (255, 255, 255))
+                with self._pipeline_lock:
+                    self.pipe(
+                        prompt=[""],
+                        image=blank,
+                        control_image=blank,
+                        mask_image=repaint_mask(blank),
+                        height=size,
+                        width=size,
+                        num_inference_steps=2,
+                        guidance_scale=GUIDANCE_SCALE
+                    )
+        finally:
+            if self.feature_cache is not None:
+                self.feature_cache.reset()
+
+
+@register_generator('controlnet')
+class ControlNetGenerator(DiffusersGenerator):
+    """Stable Diffusion 1.5 with the ControlNet inpaint model."""
+
+    def __init__(self, controlnet_model="lllyasviel/control_v11p_sd15_inpaint",
+                 base_model="runwayml/stable-diffusion-v1-5", cache_dir="models", **options):
+        super().__init__(**options)
+        self.controlnet_model = controlnet_model
+        self.base_model = base_model
+        self.cache_dir = cache_dir
+
+    @classmethod
+    def from_config(cls, config):
+        models = {key: config[key] for key in ('controlnet_model', 'base_model') if config.get(key)}
+        return cls(memory_saving=config.get('memory_saving', False),
+                   compile_models=config.get('compile_models', False),
+                   **models, **cls.pipeline_options(config))
+
+    def size_estimate(self):
+        return DIFFUSION_SIZE_ESTIMATE
+
+    def build_pipeline(self, dtype):
+        from diffusers import StableDiffusionControlNetInpaintPipeline, ControlNetModel
+        # Load ControlNet for processing
+        controlnet = ControlNetModel.from_pretrained(
+            self.controlnet_model,
+            torch_dtype=dtype,
+            cache_dir=self.cache_dir
+        )
+
+        # Load Stable Diffusion pipeline
+        pipe = StableDiffusionControlNetInpaintPipeline.from_pretrained(
+            self.base_model,
+            controlnet=controlnet,
+            torch_dtype=dtype,
+            safety_checker=None,
+            cache_dir=self.cache_dir
+        )
+        logger.info("Successfully initialized Stable Diffusion with ControlNet")
+        return pipe
+
+
+@register_generator('tiny')
+class TinyControlNetGenerator(DiffusersGenerator):
+    """The SD 1.5 ControlNet pipeline layout at toy size with seeded random weights.
+
+    Outputs are noise, but requests run the real pipeline (text encoder, ControlNet and
+    UNet per step, 8x VAE) in a few seconds on CPU, for load tests and tests of batching,
+    seeding and scheduling. Defaults to 4 denoising steps.
+    """
+
+    # Attention starts at the second level
+    token_merging_max_downsample = 2
+
+    def __init__(self, seed=0, num_inference_steps=4, **options):
+        super().__init__(num_inference_steps=num_inference_steps, **options)
+        self.seed = seed
+
+    def build_pipeline(self, dtype):
+        import torch
+        from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+        from diffusers import (StableDiffusionControlNetInpaintPipeline, ControlNetModel, UNet2DConditionModel,
+                               AutoencoderKL, UniPCMultistepScheduler)
+
+        torch.manual_seed(self.seed)
+        # Character-level vocabulary; other characters map to the unknown token
+        vocab = {"<|startoftext|>": 0, "<|endoftext|>": 1}
+        for index, char in enumerate("abcdefghijklmnopqrstuvwxyz"):
+            vocab[char] = 2 + index
+            vocab[f"{char}</w>"] = 28 + index
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'vocab.json'), 'w') as f:
+                json.dump(vocab, f)
+            with open(os.path.join(directory, 'merges.txt'), 'w') as f:
+                f.write("#version: 0.2\n")
+            tokenizer = CLIPTokenizer(os.path.join(directory, 'vocab.json'), os.path.join(directory, 'merges.txt'),
+                                      model_max_length=77)
+
+        text_encoder = CLIPTextModel(CLIPTextConfig(
+            vocab_size=len(vocab), hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+            num_attention_heads=4, max_position_embeddings=77, projection_dim=32,
+            bos_token_id=0, eos_token_id=1, pad_token_id=1
+        ))
+        blocks = dict(block_out_channels=(16, 32), layers_per_block=1, cross_attention_dim=32, norm_num_groups=8,
+                      attention_head_dim=4,
+                      down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"))
+        unet = UNet2DConditionModel(sample_size=64, up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"), **blocks)
+        controlnet = ControlNetModel(conditioning_embedding_out_channels=(8, 16, 16, 32), **blocks)
+        # ControlNet starts as a no-op (zero output convolutions, a fading conditioning embedding);
+        # variance-preserving random weights let the control image reach the UNet
+        for conv in (*controlnet.controlnet_cond_embedding.modules(), *controlnet.controlnet_down_blocks,
+                     controlnet.controlnet_mid_block):
+            if isinstance(conv, torch.nn.Conv2d):
+                torch.nn.init.kaiming_normal_(conv.weight)
+        # Four blocks downsample 8x like SD's VAE, so latents are 64x64 at 512x512
+        vae = AutoencoderKL(block_out_channels=(8, 16, 32, 32), latent_channels=4, norm_num_groups=8,
+                            down_block_types=("DownEncoderBlock2D",) * 4, up_block_types=("UpDecoderBlock2D",) * 4)
+        pipe = StableDiffusionControlNetInpaintPipeline(
+            vae=vae, text_encoder=text_encoder, tokenizer=tokenizer, unet=unet, controlnet=controlnet,
+            scheduler=UniPCMultistepScheduler(), safety_checker=None, feature_extractor=None,
+            requires_safety_checker=False
+        )
+        return pipe if dtype == torch.float32 else pipe.to(dtype=dtype)
+
+
+@register_generator('remote')
+class RemoteGenerator(Generator):
+    """Forward generation to inference workers through a WorkerPool (see utils.remote)."""
+
+    def __init__(self, worker_pool):
+        if worker_pool is None:
+            raise ValueError("Remote generator backend requires a worker_pool (set INFERENCE_WORKERS)")
+        self.worker_pool = worker_pool
+        self._served = threading.local()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('worker_pool'))
+
+    @property
+    def served_version(self):
+        """Model version of the worker that ran this thread's last generation."""
+        return getattr(self._served, 'version', None)
+
+    def generate(self, prompts, init_image, control_image, mask_image, size=512, seeds=None, token_merging=None,
+                 fast=False):
+        trace = current_trace()
+        with span('remote_generate', variants=len(prompts)):
+            result = self.worker_pool.call('generate', {
+                'prompts': list(prompts),
+                'init_image': encode_image(init_image),
+                'control_image': encode_image(control_image),
+                'mask_image': encode_image(mask_image),
+                'size': size,
+                'seeds': None if seeds is None else [int(seed) for seed in seeds],
+                'token_merging': token_merging,
+                'fast': bool(fast),
+            }, trace_id=trace.trace_id if trace else None)
+        self._served.version = result.get('model_version')
+        return [decode_image(image).convert('RGB') for image in result['images']]
+
+
+@register_generator('stub')
+class StubGenerator(Generator):
+    """Deterministic stand-in without a model: tints the garment region with a colour hashed
+    from the prompt and seed, so equal requests give equal images and different ones differ."""
+
+    def generate(self, prompts, init_image, control_image, mask_image, size=512, seeds=None, token_merging=None,
+                 fast=False):
+        init = np.asarray(init_image.convert('RGB'), dtype=np.float32)
+        garment = np.asarray(mask_image.convert('L')) < 128
+        images = []
+        for index, prompt in enumerate(prompts):
+            seed = seeds[index] if seeds is not None else 0
+            digest = hashlib.sha256(f"{prompt}|{seed}".encode('utf-8')).digest()
+            color = np.frombuffer(digest[:3], dtype=np.uint8).astype(np.float32)
+            result = init.copy()
+            result[garment] = 0.4 * result[garment] + 0.6 * color
+            images.append(Image.fromarray(result.astype(np.uint8)).resize((size, size)))
+        return images
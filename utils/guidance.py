@@ -0,0 +1,71 @@
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GuidanceTruncation:
+    """``callback_on_step_end`` that stops classifier-free guidance part way through a run.
+
+    After the first ``stop`` fraction of the steps, or earlier once the conditional and
+    unconditional noise predictions differ by less than ``converge_threshold`` (relative L2,
+    measured by a forward hook on ``unet``), the remaining steps run the conditional batch
+    alone: the pipeline's guidance scale is set to 0 and the prompt embeddings, control
+    image and inpainting mask inputs are cut to their conditional half, so the UNet and
+    ControlNet each evaluate half as many samples. ``callback`` (e.g. a StepTimer) runs
+    first at every step.
+    """
+
+    def __init__(self, stop=1.0, converge_threshold=0.0, unet=None, callback=None):
+        self.stop = stop
+        self.converge_threshold = converge_threshold
+        self.callback = callback
+        self.divergence = None
+        self.truncated_at = None
+        self.steps = 0
+        self.batch = 0
+        self.saved_evaluations = 0
+        self._hook = None
+        if converge_threshold > 0 and unet is not None:
+            self._hook = unet.register_forward_hook(self._measure)
+
+    def _measure(self, module, args, output):
+        if self.truncated_at is not None:
+            return
+        noise_pred = output[0] if isinstance(output, tuple) else output.sample
+        uncond, cond = noise_pred.float().chunk(2)
+        self.divergence = ((cond - uncond).norm() / cond.norm().clamp_min(1e-8)).item()
+
+    def __call__(self, pipe, step, timestep, callback_kwargs):
+        if self.callback is not None:
+            callback_kwargs = self.callback(pipe, step, timestep, callback_kwargs)
+        self.steps = step + 1
+        if self.truncated_at is not None:
+            # This step ran without the unconditional batch
+            self.saved_evaluations += self.batch
+        elif pipe.do_classifier_free_guidance and step + 1 < pipe.num_timesteps and self._should_stop(pipe, step):
+            self.truncated_at = step + 1
+            self.batch = callback_kwargs['prompt_embeds'].shape[0] // 2
+            pipe._guidance_scale = 0.0
+            callback_kwargs['prompt_embeds'] = callback_kwargs['prompt_embeds'].chunk(2)[1]
+            callback_kwargs['control_image'] = callback_kwargs['control_image'].chunk(2)[1]
+            # The inpaint pipeline does not read these back from the callback: shrink them in place
+            for key in ('mask', 'masked_image_latents'):
+                if callback_kwargs.get(key) is not None:
+                    callback_kwargs[key].data = callback_kwargs[key].chunk(2)[1]
+        return callback_kwargs
+
+    def _should_stop(self, pipe, step):
+        if step + 1 >= math.ceil(self.stop * pipe.num_timesteps):
+            return True
+        return self.divergence is not None and self.divergence < self.converge_threshold
+
+    def finish(self):
+        """Remove the hook. Returns the number of UNet (and ControlNet) sample evaluations saved."""
+        if self._hook is not None:
+            self._hook.remove()
+            self._hook = None
+        if self.truncated_at is not None:
+            logger.info(f"Guidance stopped after step {self.truncated_at} of {self.steps}: "
+                        f"saved {self.saved_evaluations} UNet and ControlNet evaluations")
+        return self.saved_evaluations
@@ -1,108 +1,155 @@
 import os
+import time
+import threading
 import cv2
 import numpy as np
-import torch
-from PIL import Image
-from segment_anything import sam_model_registry, SamPredictor
-from diffusers import StableDiffusionControlNetPipeline, ControlNetModel, UniPCMultistepScheduler
+from PIL import Image, PngImagePlugin
+from utils.segmenters import create_segmenter
+from utils.generators import create_generator
+from utils.crop_inpaint import mask_bbox, paste_back
+from utils.preprocess import Preprocessor, whiten_background, MASK_THRESHOLD
+from utils.mask_rle import load_rle, save_rle
+from utils.memory_budget import MemoryBudget
+from utils.torch_compile import configure_compile_cache, DEFAULT_CACHE_DIR
+from utils.tracing import span
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Shared preprocessing kernels with per-thread reusable buffers
+_preprocessor = Preprocessor()
+
 class ImageProcessor:
-    def __init__(self, checkpoint_path, model_type="vit_h"):
-        """Initialize the image processor with SAM and Stable Diffusion models."""
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        logger.info(f"Using device: {self.device}")
+    def __init__(self, checkpoint_path=None, model_type="vit_h", segmenter_backend="torch",
+                 onnx_dir=None, onnx_threads=None, onnx_optimization="all",
+                 cascade_checkpoints=None, cascade_thresholds=None, predictor_pool_size=2,
+                 memory_budget=0, memory_saving="auto", compile_models=False, compile_cache_dir=None,
+                 generator_backend="controlnet", generator_options=None, worker_pool=None,
+                 segmenter=None, generator=None):
+        """Initialize the image processor with a segmenter and a generator backend.
+
+        Backends are looked up by name in the registries of utils.segmenters and
+        utils.generators ("torch", "onnx", "stub", "tiny", "remote"; "controlnet", "stub",
+        "tiny", "remote"), or passed in ready-made as ``segmenter`` / ``generator``.
+        ``model_type="cascade"`` selects the SAM cascade over ``cascade_checkpoints``. The
+        "remote" backends forward jobs to inference workers through ``worker_pool``.
+        ``generator_options`` (scheduler, dtype, model names, feature reuse) go to the generator backend.
+
+        With a ``memory_budget`` in bytes, the segmenter and generator are evicted least
+        recently used first when both do not fit, and reloaded on demand. ``memory_saving``
+        ("auto", "on" or "off") enables attention slicing and VAE slicing/tiling; "auto"
+        turns them on whenever a budget is set. ``compile_models`` compiles the SAM image
+        encoder, UNet and ControlNet with torch.compile, caching kernels in
+        ``compile_cache_dir`` and warming them up in a background thread.
+        """
+        self.memory_saving = memory_saving == "on" or (memory_saving == "auto" and memory_budget > 0)
+        self.compile_models = compile_models
+        if compile_models:
+            configure_compile_cache(compile_cache_dir or DEFAULT_CACHE_DIR)
         
-        # Initialize SAM
+        # Validate the segmenter configuration up front
         try:
-            self.model_type = model_type
-            if not os.path.exists(checkpoint_path):
-                raise FileNotFoundError(f"SAM checkpoint not found at: {checkpoint_path}")
-                
-            self.sam = sam_model_registry[model_type](checkpoint=checkpoint_path)
-            self.sam.to(device=self.device)
-            self.predictor = SamPredictor(self.sam)
-            logger.info("Successfully initialized SAM model")
+            if segmenter is None:
+                name = segmenter_backend
+                # Remote workers run their own configuration, cascade or not
+                if model_type == "cascade" and segmenter_backend != "remote":
+                    if segmenter_backend != "torch":
+                        raise ValueError("Cascade mode requires the torch segmenter backend")
+                    name = "cascade"
+                segmenter = create_segmenter(name, {
+                    'checkpoint_path': checkpoint_path,
+                    'model_type': model_type,
+                    'onnx_dir': onnx_dir,
+                    'onnx_threads': onnx_threads,
+                    'onnx_optimization': onnx_optimization,
+                    'cascade_checkpoints': cascade_checkpoints,
+                    'cascade_thresholds': cascade_thresholds,
+                    'pool_size': predictor_pool_size,
+                    'compile_models': compile_models,
+                    'worker_pool': worker_pool
+                })
+            for path in segmenter.required_files():
+                if not path or not os.path.exists(path):
+                    raise FileNotFoundError(f"Segmenter model not found at: {path}")
+            if generator is None:
+                generator = create_generator(generator_backend, {
+                    **(generator_options or {}),
+                    'memory_saving': self.memory_saving,
+                    'compile_models': compile_models,
+                    'worker_pool': worker_pool
+                })
         except Exception as e:
-            logger.error(f"Error initializing SAM model: {str(e)}")
+            logger.error(f"Error initializing backends: {str(e)}")
             raise
+        self.segmenter = segmenter
+        self.generator = generator
+        logger.info(f"Segmenter backend: {segmenter.name}, generator backend: {generator.name}")
+        
+        # The segmenter and generator are loaded through the memory budget
+        self.memory = MemoryBudget(memory_budget)
+        self.memory.register('sam', segmenter.load, segmenter.unload, size=segmenter.size_estimate())
+        self.memory.register('diffusion', generator.load, generator.unload, size=generator.size_estimate())
+        self.memory.load('sam')
+        self.memory.load('diffusion')
         
-        # Initialize Stable Diffusion with ControlNet
-        self.init_stable_diffusion()
+        # Compile at the serving shapes in the background instead of on the first requests
+        self._warmup_lock = threading.Lock()
+        self.warmed_up = False
+        if compile_models:
+            self.warmup_thread = threading.Thread(target=self.warmup, name="compile-warmup", daemon=True)
+            self.warmup_thread.start()
 
-    def init_stable_diffusion(self):
-        """Initialize Stable Diffusion with ControlNet for inpainting and generation."""
-        try:
-            # Load ControlNet for processing
-            controlnet = ControlNetModel.from_pretrained(
-                "lllyasviel/control_v11p_sd15_inpaint",
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                cache_dir="models"
-            )
+    def warmup(self, raise_errors=False):
+        """Run the segmenter and generator once at serving shapes so compiled kernels are ready.
 
-            # Load Stable Diffusion pipeline
-            self.pipe = StableDiffusionControlNetPipeline.from_pretrained(
-                "runwayml/stable-diffusion-v1-5",
-                controlnet=controlnet,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                safety_checker=None,
-                cache_dir="models"
-            ).to(self.device)
-
-            # Use more efficient attention processor if available
-            if hasattr(self.pipe, 'enable_xformers_memory_efficient_attention'):
-                self.pipe.enable_xformers_memory_efficient_attention()
-
-            # Use better scheduler
-            self.pipe.scheduler = UniPCMultistepScheduler.from_config(self.pipe.scheduler.config)
-            
-            logger.info("Successfully initialized Stable Diffusion with ControlNet")
-        except Exception as e:
-            logger.error(f"Error initializing Stable Diffusion: {str(e)}")
-            raise
+        Only the first successful warm-up runs: a hot-swap warming a processor whose compile
+        warm-up thread is still running waits for that thread instead of repeating it.
+        """
+        with self._warmup_lock:
+            if self.warmed_up:
+                return
+            try:
+                start_time = time.perf_counter()
+                with self.memory.use('sam', stage='warmup_sam'):
+                    self.segmenter.warmup()
+                logger.info(f"Segmenter warm-up done in {time.perf_counter() - start_time:.1f}s")
+                
+                start_time = time.perf_counter()
+                with self.memory.use('diffusion', stage='warmup_diffusion'):
+                    self.generator.warmup()
+                logger.info(f"Generator warm-up done in {time.perf_counter() - start_time:.1f}s")
+                self.warmed_up = True
+            except Exception as e:
+                logger.error(f"Error during compile warm-up: {str(e)}")
+                if raise_errors:
+                    raise
+
+    def release(self):
+        """Unload both models once this processor is no longer used."""
+        self.memory.unload_all()
+
+    def memory_stats(self):
+        """Memory budget, resident components and peak RSS per stage."""
+        return self.memory.stats()
 
     def process_image(self, image_path):
         """Process an image to generate segmentation mask."""
         try:
             # Read and process image
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"Failed to load image: {image_path}")
-                
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # Set image in predictor
-            self.predictor.set_image(image)
+            with span('decode'):
+                image = cv2.imread(image_path)
+                if image is None:
+                    raise ValueError(f"Failed to load image: {image_path}")
+                    
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
             # Get image dimensions
             height, width = image.shape[:2]
+            input_points, input_labels = self._prompt_points(width, height)
             
-            # Generate automatic points for clothing detection
-            center_x, center_y = width // 2, height // 2
-            offset = min(width, height) // 4
-            
-            input_points = np.array([
-                [center_x, center_y],  # Center
-                [center_x - offset, center_y],  # Left
-                [center_x + offset, center_y],  # Right
-                [center_x, center_y - offset],  # Top
-                [center_x, center_y + offset]   # Bottom
-            ])
-            
-            input_labels = np.array([1, 1, 1, 1, 1])  # All points are foreground
-            
-            # Generate masks
-            masks, scores, logits = self.predictor.predict(
-                point_coords=input_points,
-                point_labels=input_labels,
-                multimask_output=True
-            )
-            
-            # Select best mask
-            best_mask_idx = np.argmax(scores)
-            best_mask = masks[best_mask_idx]
+            with self.memory.use('sam', stage='segmentation'):
+                best_mask, score, label = self.segmenter.segment(image, input_points, input_labels)
+            logger.info(f"Segmenter accepted {label} mask (score {score:.3f})")
             
             if not best_mask.any():
                 raise ValueError("Generated mask is empty")
@@ -113,6 +160,31 @@ class ImageProcessor:
             logger.error(f"Error processing image: {str(e)}")
             raise
 
+    @staticmethod
+    def _prompt_points(width, height):
+        """Generate automatic foreground points for clothing detection."""
+        center_x, center_y = width // 2, height // 2
+        offset = min(width, height) // 4
+        
+        input_points = np.array([
+            [center_x, center_y],  # Center
+            [center_x - offset, center_y],  # Left
+            [center_x + offset, center_y],  # Right
+            [center_x, center_y - offset],  # Top
+            [center_x, center_y + offset]   # Bottom
+        ])
+        
+        input_labels = np.array([1, 1, 1, 1, 1])  # All points are foreground
+        return input_points, input_labels
+
+    def segmentation_stats(self):
+        """Segmenter statistics (per-tier cascade hit rates), or None when it keeps none."""
+        return self.segmenter.stats()
+
+    def generation_stats(self):
+        """Generator statistics (guidance truncation savings, feature reuse), or None when it keeps none."""
+        return self.generator.stats()
+
     def save_mask(self, mask, save_path):
         """Save the generated mask as an image."""
         try:
@@ -131,107 +203,150 @@ class ImageProcessor:
             logger.error(f"Error saving mask: {str(e)}")
             raise
 
-    def generate_try_on(self, original_image_path, mask_path, prompt):
-        """Generate try-on image using Stable Diffusion with ControlNet."""
+    @staticmethod
+    def load_mask(mask_path):
+        """Load a mask saved as RLE JSON or as an image into a 0/255 uint8 array."""
+        if mask_path.endswith('.json'):
+            return load_rle(mask_path).view(np.uint8) * 255
+        
+        mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+        if mask is None:
+            raise ValueError(f"Failed to load mask: {mask_path}")
+        return mask
+
+    @staticmethod
+    def save_mask_rle(mask, save_path):
+        """Save the mask in compact run-length-encoded JSON."""
+        return save_rle(mask, save_path)
+
+    def generate_try_on(self, original_image_path, mask_path, prompt, crop_to_mask=False,
+                        crop_margin=0.15, crop_size=512, feather_radius=8, seed=None, token_merging=None,
+                        fast=False):
+        """Generate try-on image using Stable Diffusion with ControlNet.
+
+        With ``crop_to_mask`` only the mask's bounding box (plus margin) is generated at
+        ``crop_size`` and blended back into the full-resolution original.
+        """
+        return self.generate_variants(
+            original_image_path, mask_path, [prompt],
+            seeds=None if seed is None else [seed],
+            crop_to_mask=crop_to_mask,
+            crop_margin=crop_margin,
+            crop_size=crop_size,
+            feather_radius=feather_radius,
+            token_merging=token_merging,
+            fast=fast
+        )[0]
+
+    def generate_variants(self, original_image_path, mask_path, prompts, seeds=None, crop_to_mask=False,
+                          crop_margin=0.15, crop_size=512, feather_radius=8, token_merging=None, fast=False):
+        """Generate one try-on image per prompt in a single batched pipeline call.
+
+        Preprocessing and the ControlNet conditioning image are shared by all variants.
+        ``seeds`` (one per prompt) make each variant reproducible on its own.
+        ``token_merging`` overrides the generator's token merging ratio for this call, and
+        ``fast`` selects its few-step LCM path (the standard path when it has none).
+        """
         try:
             # Load and preprocess original image
             if not os.path.exists(original_image_path):
                 raise FileNotFoundError(f"Original image not found: {original_image_path}")
             if not os.path.exists(mask_path):
                 raise FileNotFoundError(f"Mask image not found: {mask_path}")
-                
-            init_image = Image.open(original_image_path).convert("RGB")
-            init_image = self._resize_and_pad(init_image, (512, 512))
+            if seeds is not None and len(seeds) != len(prompts):
+                raise ValueError("Expected one seed per prompt")
 
-            # Load and preprocess mask
-            mask_raw = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
-            if mask_raw is None:
-                raise ValueError(f"Failed to load mask: {mask_path}")
-                
-            # Ensure mask is binary and properly scaled
-            _, mask_binary = cv2.threshold(mask_raw, 127, 255, cv2.THRESH_BINARY)
-            mask_binary = cv2.resize(mask_binary, (512, 512), interpolation=cv2.INTER_NEAREST)
-            
-            # Create proper mask for inpainting
-            mask_invert = cv2.bitwise_not(mask_binary)
-            mask_image = Image.fromarray(mask_invert)
-
-            # Create control image (masked original image)
-            init_array = np.array(init_image)
-            mask_array = np.array(mask_image)
-            control_array = init_array.copy()
-            control_array[mask_array == 0] = 255  # White background
-            control_image = Image.fromarray(control_array)
-
-            # Prepare negative prompt
-            negative_prompt = (
-                "low quality, blurry, bad anatomy, bad proportions, deformed, "
-                "disfigured, distorted, wrong pose, duplicate, morbid, mutilated, "
-                "poorly drawn face, poorly drawn hands, floating limbs"
-            )
+            # Load original image and mask
+            with span('decode'):
+                original = cv2.imread(original_image_path)
+                if original is None:
+                    raise ValueError(f"Failed to load image: {original_image_path}")
+            with span('mask_io'):
+                mask_raw = self.load_mask(mask_path)
 
-            # Generate image
-            output = self.pipe(
-                prompt=prompt,
-                image=init_image,
-                control_image=control_image,
-                mask_image=mask_image,
-                negative_prompt=negative_prompt,
-                num_inference_steps=30,
-                guidance_scale=7.5,
-                controlnet_conditioning_scale=0.8
-            ).images[0]
+            with self.memory.use('diffusion', stage='generation'):
+                if crop_to_mask:
+                    return self._generate_cropped(
+                        original, mask_raw, prompts, seeds, crop_margin, crop_size, feather_radius, token_merging,
+                        fast
+                    )
 
-            return output
+                # Letterbox image and mask with the same geometry and build the control image in one pass
+                with span('preprocess'):
+                    init, inpaint_mask, control = _preprocessor.prepare(original, mask_raw, (512, 512), bgr=True)
+                    init_image, mask_image, control_image = self._to_pil(init, inpaint_mask, control)
+
+                return self.generator.generate(prompts, init_image, control_image, mask_image, seeds=seeds,
+                                               token_merging=token_merging, fast=fast)
 
         except Exception as e:
             logger.error(f"Error generating try-on image: {str(e)}")
             raise
 
+    def _generate_cropped(self, original, mask_raw, prompts, seeds, crop_margin, crop_size, feather_radius,
+                          token_merging=None, fast=False):
+        """Generate only the mask's bounding box and paste it back at original resolution."""
+        with span('preprocess'):
+            original = cv2.cvtColor(original, cv2.COLOR_BGR2RGB)
+            height, width = original.shape[:2]
+            if mask_raw.shape[:2] != (height, width):
+                mask_raw = cv2.resize(mask_raw, (width, height), interpolation=cv2.INTER_NEAREST)
+            garment = mask_raw > MASK_THRESHOLD
+
+            bbox = mask_bbox(garment, margin=crop_margin)
+            x0, y0, x1, y1 = bbox
+            logger.info(f"Cropping to mask region {bbox} of {width}x{height} image")
+
+            # Square crops map onto the model size without padding, so paste-back is a plain resize
+            init, inpaint_mask, control = _preprocessor.prepare(
+                original[y0:y1, x0:x1], mask_raw[y0:y1, x0:x1], (crop_size, crop_size), letterbox=False
+            )
+            init_image, mask_image, control_image = self._to_pil(init, inpaint_mask, control)
+
+        generated = self.generator.generate(prompts, init_image, control_image, mask_image, size=crop_size,
+                                            seeds=seeds, token_merging=token_merging, fast=fast)
+        with span('paste_back'):
+            return [
+                Image.fromarray(paste_back(original, np.array(image), bbox, garment, feather_radius))
+                for image in generated
+            ]
+
+    @staticmethod
+    def _to_pil(init, inpaint_mask, control):
+        """Copy preprocessing buffers out into PIL images for the pipeline."""
+        # fromarray copies 3-channel arrays but wraps 2-D (L mode) ones, which would alias the
+        # reused mask buffer
+        return Image.fromarray(init), Image.fromarray(inpaint_mask.copy()), Image.fromarray(control)
+
     def _resize_and_pad(self, image, target_size):
         """Resize image maintaining aspect ratio and pad if necessary."""
         try:
-            target_width, target_height = target_size
-            
-            # Convert to PIL Image if necessary
-            if not isinstance(image, Image.Image):
-                image = Image.fromarray(image)
-
-            # Get current dimensions
-            width, height = image.size
-            aspect_ratio = width / height
-
-            if aspect_ratio > 1:
-                # Image is wider than tall
-                new_width = target_width
-                new_height = int(target_width / aspect_ratio)
-                pad_top = (target_height - new_height) // 2
-                pad_bottom = target_height - new_height - pad_top
-                pad_left = 0
-                pad_right = 0
-            else:
-                # Image is taller than wide
-                new_height = target_height
-                new_width = int(target_height * aspect_ratio)
-                pad_left = (target_width - new_width) // 2
-                pad_right = target_width - new_width - pad_left
-                pad_top = 0
-                pad_bottom = 0
-
-            # Resize
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-            # Create new image with padding
-            mode = image.mode
-            padded_image = Image.new(mode, target_size, (255, 255, 255))
-            padded_image.paste(image, (pad_left, pad_top))
-
-            return padded_image
+            # Convert to RGB array if necessary
+            if isinstance(image, Image.Image):
+                image = np.asarray(image.convert("RGB"))
+
+            padded = _preprocessor.resize_and_pad(image, tuple(target_size))
+            return Image.fromarray(padded)
             
         except Exception as e:
             logger.error(f"Error in resize_and_pad: {str(e)}")
             raise
 
+    @staticmethod
+    def preprocess_for_model(image_path, target_size=(512, 512)):
+        """Load an image and letterbox it to the model input size."""
+        try:
+            image = cv2.imread(image_path)
+            if image is None:
+                raise ValueError(f"Failed to load image: {image_path}")
+            
+            padded = _preprocessor.resize_and_pad(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), tuple(target_size))
+            return Image.fromarray(padded)
+            
+        except Exception as e:
+            logger.error(f"Error preprocessing image: {str(e)}")
+            raise
+
     @staticmethod
     def apply_mask_to_image(image_path, mask_path, save_path):
         """Apply the mask to the original image and save the result."""
@@ -245,19 +360,8 @@ class ImageProcessor:
             if mask is None:
                 raise ValueError(f"Failed to load mask: {mask_path}")
             
-            # Ensure mask is binary
-            _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
-            
-            # Resize mask to match image if needed
-            if mask.shape[:2] != image.shape[:2]:
-                mask = cv2.resize(mask, (image.shape[1], image.shape[0]), 
-                                interpolation=cv2.INTER_NEAREST)
-            
-            # Create masked image
-            masked_image = cv2.bitwise_and(image, image, mask=mask)
-            
-            # Fill masked area with white
-            masked_image[mask == 0] = 255
+            # Fill everything outside the mask with white, in place
+            masked_image = whiten_background(image, mask)
             
             # Save result
             success = cv2.imwrite(save_path, masked_image)
@@ -271,14 +375,17 @@ class ImageProcessor:
             raise
 
     @staticmethod
-    def postprocess_result(result_image, save_path):
-        """Save the generated image."""
+    def postprocess_result(result_image, save_path, metadata=None):
+        """Save the generated image, with ``metadata`` as PNG text chunks."""
         try:
-            if isinstance(result_image, Image.Image):
-                result_image.save(save_path, quality=95)
-            else:
+            if not isinstance(result_image, Image.Image):
                 result_image = Image.fromarray(result_image)
-                result_image.save(save_path, quality=95)
+            options = {}
+            if metadata and save_path.lower().endswith('.png'):
+                options['pnginfo'] = PngImagePlugin.PngInfo()
+                for key, value in metadata.items():
+                    options['pnginfo'].add_text(key, str(value))
+            result_image.save(save_path, quality=95, **options)
             
             if not os.path.exists(save_path):
                 raise IOError(f"Failed to save result image to {save_path}")
@@ -0,0 +1,94 @@
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RLE_FORMAT = 'coco-rle'
+
+
+def rle_counts(mask):
+    """Run lengths of a binary mask in column-major order, starting with a run of zeros."""
+    flat = np.asarray(mask, dtype=bool).ravel(order='F')
+    if flat.size == 0:
+        return []
+    change_points = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    boundaries = np.concatenate(([0], change_points, [flat.size]))
+    counts = np.diff(boundaries).tolist()
+    if flat[0]:
+        counts.insert(0, 0)
+    return counts
+
+
+def compress_counts(counts):
+    """Encode run lengths as a COCO compressed RLE string (same as pycocotools)."""
+    chars = []
+    for i, count in enumerate(counts):
+        value = count - counts[i - 2] if i > 2 else count
+        more = True
+        while more:
+            chunk = value & 0x1f
+            value >>= 5
+            more = (value != -1) if (chunk & 0x10) else (value != 0)
+            if more:
+                chunk |= 0x20
+            chars.append(chr(chunk + 48))
+    return ''.join(chars)
+
+
+def decompress_counts(string):
+    """Decode a COCO compressed RLE string back into run lengths."""
+    counts = []
+    position = 0
+    while position < len(string):
+        value, shift, more = 0, 0, True
+        while more:
+            chunk = ord(string[position]) - 48
+            value |= (chunk & 0x1f) << (5 * shift)
+            more = bool(chunk & 0x20)
+            position += 1
+            shift += 1
+            if not more and (chunk & 0x10):
+                value |= -1 << (5 * shift)
+        if len(counts) > 2:
+            value += counts[-2]
+        counts.append(value)
+    return counts
+
+
+def encode(mask):
+    """Encode a boolean HxW mask as {'size': [h, w], 'counts': str} COCO RLE."""
+    height, width = mask.shape[:2]
+    return {'size': [int(height), int(width)], 'counts': compress_counts(rle_counts(mask))}
+
+
+def decode(rle):
+    """Decode COCO RLE (compressed string or list counts) into a boolean HxW mask."""
+    height, width = rle['size']
+    counts = rle['counts']
+    if isinstance(counts, str):
+        counts = decompress_counts(counts)
+    if sum(counts) != height * width:
+        raise ValueError(f"RLE counts do not match mask size {height}x{width}")
+    values = np.zeros(len(counts), dtype=bool)
+    values[1::2] = True
+    return np.repeat(values, counts).reshape((height, width), order='F')
+
+
+def save_rle(mask, save_path):
+    """Write a mask as RLE JSON. Returns the save path."""
+    try:
+        rle = encode(mask)
+        rle['format'] = RLE_FORMAT
+        with open(save_path, 'w') as f:
+            json.dump(rle, f, separators=(',', ':'))
+        return save_path
+    except Exception as e:
+        logger.error(f"Error saving RLE mask: {str(e)}")
+        raise
+
+
+def load_rle(path):
+    """Read an RLE JSON mask into a boolean array."""
+    with open(path) as f:
+        return decode(json.load(f))
@@ -0,0 +1,248 @@
+import gc
+import os
+import sys
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def current_rss():
+    """Resident set size of this process in bytes (peak RSS where current is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return 0
+
+
+def module_bytes(*modules):
+    """Bytes held by the parameters and buffers of torch modules (other objects are skipped)."""
+    total = 0
+    for module in modules:
+        if hasattr(module, 'parameters') and hasattr(module, 'buffers'):
+            for tensor in list(module.parameters()) + list(module.buffers()):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class MemoryMonitor:
+    """Record peak RSS per named stage.
+
+    While any stage is active a background thread samples RSS every ``interval`` seconds,
+    so the peak includes transient allocations inside the stage, not just its end state.
+    Stages may overlap across threads; RSS is process-wide, so each sees the shared peak.
+    """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active = {}
+        self._stats = {}
+        self._sampler = None
+
+    def _sample(self):
+        while True:
+            rss = current_rss()
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                for record in self._active.values():
+                    record['peak'] = max(record['peak'], rss)
+            time.sleep(self.interval)
+
+    @contextmanager
+    def stage(self, name):
+        """Track peak RSS while the block runs."""
+        start_rss = current_rss()
+        record = {'peak': start_rss}
+        with self._lock:
+            self._active[id(record)] = record
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name="memory-monitor", daemon=True)
+                self._sampler.start()
+        try:
+            yield
+        finally:
+            end_rss = current_rss()
+            with self._lock:
+                del self._active[id(record)]
+                peak = max(record['peak'], end_rss)
+                stats = self._stats.setdefault(name, {'count': 0, 'peak_rss_mb': 0.0, 'last_peak_rss_mb': 0.0,
+                                                      'last_delta_mb': 0.0})
+                stats['count'] += 1
+                stats['last_peak_rss_mb'] = peak / MB
+                stats['peak_rss_mb'] = max(stats['peak_rss_mb'], peak / MB)
+                stats['last_delta_mb'] = (end_rss - start_rss) / MB
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+
+class _Component:
+    def __init__(self, name, load, unload, size):
+        self.name = name
+        self.load = load
+        self.unload = unload
+        self.size = size
+        self.loaded = False
+        self.loading = False
+        self.users = 0
+        self.last_used = 0.0
+        self.loads = 0
+        self.evictions = 0
+
+
+class MemoryBudget:
+    """Keep model components resident within a byte budget, evicting idle ones LRU first.
+
+    Each component has ``load()`` (returning its size in bytes, or None to measure RSS
+    growth) and ``unload()`` callbacks. ``use(name)`` loads the component if needed and
+    pins it for the duration of the block; to make room, idle components are unloaded
+    least recently used first, waiting for busy ones to finish when that is not enough.
+    A budget of 0 never evicts.
+    """
+
+    def __init__(self, budget_bytes=0, monitor=None):
+        self.budget_bytes = budget_bytes
+        self.monitor = monitor or MemoryMonitor()
+        self._cond = threading.Condition()
+        self._components = {}
+
+    def register(self, name, load, unload, size=0):
+        """Add a component with an initial size estimate in bytes."""
+        with self._cond:
+            self._components[name] = _Component(name, load, unload, size)
+
+    def _resident_bytes(self):
+        return sum(c.size for c in self._components.values() if c.loaded or c.loading)
+
+    def _make_room(self, component):
+        """Evict idle components until ``component`` fits. Caller holds the lock.
+
+        Returns False when busy components must finish first.
+        """
+        if not self.budget_bytes:
+            return True
+        idle = sorted(
+            (c for c in self._components.values() if c.loaded and not c.users and c is not component),
+            key=lambda c: c.last_used
+        )
+        while self._resident_bytes() + component.size > self.budget_bytes and idle:
+            victim = idle.pop(0)
+            logger.info(f"Evicting {victim.name} ({victim.size / MB:.0f} MB) to load {component.name}")
+            victim.unload()
+            victim.loaded = False
+            victim.evictions += 1
+            gc.collect()
+        if self._resident_bytes() + component.size <= self.budget_bytes:
+            return True
+        busy = any(c.users and (c.loaded or c.loading) for c in self._components.values() if c is not component)
+        if not busy:
+            logger.warning(f"{component.name} ({component.size / MB:.0f} MB) exceeds the memory budget on its own")
+            return True
+        return False
+
+    def _acquire(self, name):
+        with self._cond:
+            component = self._components[name]
+            component.users += 1
+            while not component.loaded:
+                if component.loading:
+                    self._cond.wait()
+                    continue
+                if self._make_room(component):
+                    component.loading = True
+                    break
+                self._cond.wait()
+            else:
+                component.last_used = time.monotonic()
+                return
+
+        try:
+            start_rss = current_rss()
+            with self.monitor.stage(f"load_{name}"):
+                size = component.load()
+            if size is None:
+                size = max(current_rss() - start_rss, 0)
+        except BaseException:
+            with self._cond:
+                component.loading = False
+                component.users -= 1
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            component.size = size
+            component.loaded = True
+            component.loading = False
+            component.loads += 1
+            component.last_used = time.monotonic()
+            self._cond.notify_all()
+
+    def _release(self, name):
+        with self._cond:
+            component = self._components[name]
+            component.users -= 1
+            component.last_used = time.monotonic()
+            self._cond.notify_all()
+
+    def load(self, name):
+        """Make a component resident without pinning it."""
+        self._acquire(name)
+        self._release(name)
+
+    @contextmanager
+    def use(self, name, stage=None):
+        """Pin a component (loading it if evicted) and track peak RSS under ``stage``."""
+        self._acquire(name)
+        try:
+            with self.monitor.stage(stage or name):
+                yield
+        finally:
+            self._release(name)
+
+    def unload_all(self):
+        """Unload every resident component not in use, e.g. when retiring a model version."""
+        with self._cond:
+            for component in self._components.values():
+                if component.loaded and not component.users:
+                    component.unload()
+                    component.loaded = False
+            self._cond.notify_all()
+        gc.collect()
+
+    def stats(self):
+        """Budget, resident components and per-stage peak RSS."""
+        with self._cond:
+            components = {
+                c.name: {
+                    'loaded': c.loaded,
+                    'in_use': c.users,
+                    'size_mb': c.size / MB,
+                    'loads': c.loads,
+                    'evictions': c.evictions,
+                }
+                for c in self._components.values()
+            }
+            resident = self._resident_bytes()
+        return {
+            'budget_mb': self.budget_bytes / MB,
+            'resident_mb': resident / MB,
+            'rss_mb': current_rss() / MB,
+            'components': components,
+            'stages': self.monitor.stats(),
+        }
@@ -0,0 +1,343 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no gunicorn, so one process owns the registry
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_VERSION_ID = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._-')
+
+
+def file_sha256(path, chunk_size=8 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Model versions kept in a JSON file.
+
+    A version is an ID plus ImageProcessor settings overriding the server's configuration
+    (checkpoint_path, model_type, segmenter_backend, generator_backend, generator_options
+    such as scheduler, ...) and a dtype. The SHA-256 of each model file is pinned the
+    first time the version loads; later loads re-hash files whose size or mtime changed
+    and refuse them if the content no longer matches.
+
+    The file is shared by gunicorn's worker processes: every read picks up other processes'
+    writes, and every write merges into the current file under a lock. It also records the
+    version last activated, which other processes follow (see ``active_version``).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._active = None
+        self._stamp = None
+        with self._lock, self._file_lock():
+            self._refresh()
+
+    @contextmanager
+    def _file_lock(self, exclusive=False):
+        """Hold the registry's lock file, shared to read and exclusive to read-modify-write:
+        gunicorn's worker processes share one registry."""
+        if fcntl is None:
+            yield
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Re-read the file if another process replaced it since it was last read."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._versions, self._active, self._stamp = {}, None, None
+            return
+        # Writes replace the file, so a new inode (or size/mtime) means new content
+        stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if stamp == self._stamp:
+            return
+        with open(self.path) as f:
+            data = json.load(f)
+        self._versions = {entry['id']: entry for entry in data.get('versions', [])}
+        self._active = data.get('active')
+        self._stamp = stamp
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # Unique temp file: several processes may share a registry
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'active': self._active, 'versions': list(self._versions.values())}, f, indent=2)
+        os.replace(temp_path, self.path)
+        stat = os.stat(self.path)
+        self._stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def register(self, version_id, settings=None, dtype=None, exist_ok=False):
+        """Add a version. Returns its entry."""
+        if not version_id or not isinstance(version_id, str) or len(version_id) > 64 \
+                or not set(version_id) <= _VERSION_ID:
+            raise ValueError("Version ID must be 1-64 letters, digits, '.', '_' or '-'")
+        if settings is not None and not isinstance(settings, dict):
+            raise ValueError("settings must be an object")
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh()
+            if version_id in self._versions:
+                if exist_ok:
+                    return dict(self._versions[version_id])
+                raise ValueError(f"Model version already registered: {version_id}")
+            entry = {
+                'id': version_id,
+                'settings': settings or {},
+                'dtype': dtype,
+                'files': {},
+                'created_at': time.time(),
+            }
+            self._versions[version_id] = entry
+            self._save()
+        logger.info(f"Registered model version {version_id}")
+        return dict(entry)
+
+    def get(self, version_id):
+        with self._lock, self._file_lock():
+            self._refresh()
+            entry = self._versions.get(version_id)
+            return dict(entry) if entry is not None else None
+
+    def versions(self):
+        with self._lock, self._file_lock():
+            self._refresh()
+            return [dict(entry) for entry in self._versions.values()]
+
+    def active_version(self):
+        """The version last activated in any process sharing the registry (None before any swap)."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            return self._active
+
+    def set_active(self, version_id):
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh()
+            if self._active != version_id:
+                self._active = version_id
+                self._save()
+
+    def verify_files(self, version_id, paths):
+        """Check a version's model files against their pinned hashes, pinning new ones.
+
+        Raises ValueError when a file's content changed. Returns {path: sha256}.
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            pinned = dict(self._versions[version_id]['files'])
+        hashes, updates = {}, {}
+        for path in paths:
+            stat = os.stat(path)
+            record = pinned.get(path)
+            if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+                hashes[path] = record['sha256']
+                continue
+            digest = file_sha256(path)
+            if record and record['sha256'] != digest:
+                raise ValueError(f"{path} changed since model version {version_id} was pinned "
+                                 f"(sha256 {digest[:12]}, expected {record['sha256'][:12]})")
+            hashes[path] = digest
+            updates[path] = {'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if updates:
+            with self._lock, self._file_lock(exclusive=True):
+                self._refresh()
+                self._versions[version_id]['files'].update(updates)
+                self._save()
+        return hashes
+
+
+class Deployment:
+    """One loaded model version and the jobs currently using it."""
+
+    def __init__(self, version, processor=None):
+        self.version = version
+        self.processor = processor
+        self.state = 'loading'
+        self.error = None
+        self.inflight = 0
+        self.served = 0
+        self.started_at = time.time()
+        self.activated_at = None
+        self.retired_at = None
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'state': self.state,
+            'error': self.error,
+            'inflight': self.inflight,
+            'served': self.served,
+            'started_at': self.started_at,
+            'activated_at': self.activated_at,
+            'retired_at': self.retired_at,
+        }
+
+
+class SwapInProgress(Exception):
+    """Another model version is still loading."""
+
+
+class ModelManager:
+    """The active model version, switched without dropping requests.
+
+    Jobs hold a ``lease()`` on the active deployment for their whole run. ``swap`` loads
+    and warms up a new version in a background thread while the current one keeps
+    serving, then makes it active in one step: new leases get the new version, and the
+    old one is released once its last lease ends.
+    """
+
+    def __init__(self, history=20):
+        self.active = None
+        self.loading = None
+        self.draining = []
+        self.history = deque(maxlen=history)
+        self._lock = threading.Condition()
+        self._thread = None
+
+    @property
+    def processor(self):
+        deployment = self.active
+        return deployment.processor if deployment is not None else None
+
+    @property
+    def version(self):
+        deployment = self.active
+        return deployment.version if deployment is not None else None
+
+    @contextmanager
+    def lease(self):
+        """Use the active deployment for the duration of a job."""
+        with self._lock:
+            deployment = self.active
+            if deployment is None:
+                raise RuntimeError("No model version is active")
+            deployment.inflight += 1
+        try:
+            yield deployment
+        finally:
+            with self._lock:
+                deployment.inflight -= 1
+                deployment.served += 1
+                self._lock.notify_all()
+
+    def activate(self, version, processor):
+        """Make a loaded processor active now; the previous deployment drains in the background."""
+        deployment = Deployment(version, processor)
+        self._switch(deployment)
+        return deployment
+
+    def _switch(self, deployment):
+        with self._lock:
+            previous = self.active
+            deployment.state = 'active'
+            deployment.activated_at = time.time()
+            self.active = deployment
+            if previous is not None:
+                previous.state = 'draining'
+                self.draining.append(previous)
+        logger.info(f"Model version {deployment.version} is active")
+        if previous is not None:
+            threading.Thread(target=self._drain, args=(previous,), name="model-drain", daemon=True).start()
+
+    def _drain(self, deployment):
+        with self._lock:
+            while deployment.inflight:
+                self._lock.wait()
+            self.draining.remove(deployment)
+            deployment.state = 'retired'
+            deployment.retired_at = time.time()
+            processor, deployment.processor = deployment.processor, None
+            self.history.append(deployment)
+            self._lock.notify_all()
+        release = getattr(processor, 'release', None)
+        if release is not None:
+            release()
+        logger.info(f"Model version {deployment.version} drained after {deployment.served} jobs and was released")
+
+    def swap(self, version, load, warmup=True, on_active=None):
+        """Load ``version`` with ``load()`` in the background and switch to it once warm.
+
+        Raises SwapInProgress while another version is loading. Returns the new Deployment;
+        on failure its state becomes 'failed' and the active version keeps serving. The old
+        version stays loaded until its jobs drain, so both are resident meanwhile, each
+        within its own memory budget. ``on_active(version)`` is called once it serves traffic.
+        """
+        with self._lock:
+            if self.loading is not None:
+                raise SwapInProgress(f"Model version {self.loading.version} is still loading")
+            deployment = self.loading = Deployment(version)
+
+        def run():
+            try:
+                deployment.processor = load()
+                if warmup:
+                    deployment.state = 'warming'
+                    deployment.processor.warmup(raise_errors=True)
+                self._switch(deployment)
+            except Exception as e:
+                logger.error(f"Failed to load model version {version}: {str(e)}")
+                deployment.state = 'failed'
+                deployment.error = str(e)
+                processor, deployment.processor = deployment.processor, None
+                if processor is not None and hasattr(processor, 'release'):
+                    processor.release()
+                self.history.append(deployment)
+            else:
+                if on_active is not None:
+                    try:
+                        on_active(version)
+                    except Exception as e:
+                        logger.error(f"Failed to record model version {version} as active: {str(e)}")
+            finally:
+                with self._lock:
+                    self.loading = None
+                    self._lock.notify_all()
+
+        self._thread = threading.Thread(target=run, name="model-swap", daemon=True)
+        self._thread.start()
+        return deployment
+
+    def wait(self, timeout=None):
+        """Block until no swap is loading and no deployment is draining. Returns True if so."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while self.loading is not None or self.draining:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self.active.to_dict() if self.active else None,
+                'loading': self.loading.to_dict() if self.loading else None,
+                'draining': [deployment.to_dict() for deployment in self.draining],
+                'history': [deployment.to_dict() for deployment in reversed(self.history)],
+            }
@@ -0,0 +1,253 @@
+import os
+import copy
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENCODER_FILENAME = "sam_image_encoder.onnx"
+DECODER_FILENAME = "sam_mask_decoder.onnx"
+
+# Map of config names to onnxruntime graph optimization levels
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def _onnx_export(model, args, output_path, input_names, output_names, dynamic_axes, opset):
+    """Export a module with the TorchScript-based exporter."""
+    import inspect
+    import torch
+
+    kwargs = {}
+    # Newer torch releases default to the dynamo exporter; SAM exports cleanly with the classic one
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            args,
+            output_path,
+            export_params=True,
+            opset_version=opset,
+            do_constant_folding=True,
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            **kwargs
+        )
+
+
+def _build_decoder_module(sam):
+    """Wrap SAM's prompt encoder + mask decoder, stopping at the low-resolution mask logits.
+
+    The upscaling in SamOnnxModel traces the dummy image size in as a constant, so it
+    is done in OnnxSamPredictor instead.
+    """
+    import torch
+    from segment_anything.utils.onnx import SamOnnxModel
+
+    class SamDecoderOnnxModel(SamOnnxModel):
+        @torch.no_grad()
+        def forward(self, image_embeddings, point_coords, point_labels, mask_input, has_mask_input):
+            sparse_embedding = self._embed_points(point_coords, point_labels)
+            dense_embedding = self._embed_masks(mask_input, has_mask_input)
+            masks, scores = self.model.mask_decoder.predict_masks(
+                image_embeddings=image_embeddings,
+                image_pe=self.model.prompt_encoder.get_dense_pe(),
+                sparse_prompt_embeddings=sparse_embedding,
+                dense_prompt_embeddings=dense_embedding,
+            )
+            return scores, masks
+
+    return SamDecoderOnnxModel(sam, return_single_mask=False)
+
+
+def export_sam_onnx(sam, output_dir, opset=17):
+    """Export the SAM image encoder and prompt-driven mask decoder to ONNX."""
+    import torch
+
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        sam = sam.to("cpu").eval()
+        encoder_path = os.path.join(output_dir, ENCODER_FILENAME)
+        decoder_path = os.path.join(output_dir, DECODER_FILENAME)
+
+        # Image encoder: preprocessed 1x3x1024x1024 input -> 1x256x64x64 embedding
+        img_size = sam.image_encoder.img_size
+        dummy_image = torch.randn(1, 3, img_size, img_size, dtype=torch.float32)
+        _onnx_export(
+            sam.image_encoder,
+            (dummy_image,),
+            encoder_path,
+            input_names=["image"],
+            output_names=["image_embeddings"],
+            dynamic_axes=None,
+            opset=opset,
+        )
+        logger.info(f"Exported SAM image encoder to {encoder_path}")
+
+        # Mask decoder: all mask tokens are returned, selection happens in OnnxSamPredictor
+        decoder = _build_decoder_module(sam)
+        embed_dim = sam.prompt_encoder.embed_dim
+        embed_size = sam.prompt_encoder.image_embedding_size
+        mask_input_size = [4 * x for x in embed_size]
+        dummy_inputs = (
+            torch.randn(1, embed_dim, *embed_size, dtype=torch.float32),
+            torch.randint(low=0, high=1024, size=(1, 5, 2), dtype=torch.float32),
+            torch.randint(low=0, high=4, size=(1, 5), dtype=torch.float32),
+            torch.randn(1, 1, *mask_input_size, dtype=torch.float32),
+            torch.tensor([1], dtype=torch.float32),
+        )
+        _onnx_export(
+            decoder,
+            dummy_inputs,
+            decoder_path,
+            input_names=["image_embeddings", "point_coords", "point_labels",
+                         "mask_input", "has_mask_input"],
+            output_names=["iou_predictions", "low_res_masks"],
+            dynamic_axes={
+                "point_coords": {1: "num_points"},
+                "point_labels": {1: "num_points"},
+            },
+            opset=opset,
+        )
+        logger.info(f"Exported SAM mask decoder to {decoder_path}")
+
+        return encoder_path, decoder_path
+
+    except Exception as e:
+        logger.error(f"Error exporting SAM to ONNX: {str(e)}")
+        raise
+
+
+def create_session(model_path, num_threads=None, graph_optimization="all"):
+    """Create an ONNX Runtime CPU session with the given thread and optimization settings."""
+    import onnxruntime as ort
+
+    if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown graph optimization level: {graph_optimization}")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = getattr(
+        ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+    )
+    if num_threads:
+        options.intra_op_num_threads = int(num_threads)
+        options.inter_op_num_threads = 1
+    return ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+class OnnxSamPredictor:
+    """Drop-in replacement for SamPredictor that runs the exported graphs with ONNX Runtime."""
+
+    # Constants matching segment_anything's Sam defaults
+    image_size = 1024
+    mask_threshold = 0.0
+    pixel_mean = np.array([123.675, 116.28, 103.53], dtype=np.float32)
+    pixel_std = np.array([58.395, 57.12, 57.375], dtype=np.float32)
+
+    def __init__(self, onnx_dir, num_threads=None, graph_optimization="all"):
+        from segment_anything.utils.transforms import ResizeLongestSide
+
+        encoder_path = os.path.join(onnx_dir, ENCODER_FILENAME)
+        decoder_path = os.path.join(onnx_dir, DECODER_FILENAME)
+        for path in (encoder_path, decoder_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(
+                    f"ONNX model not found at: {path}. Run export_onnx.py first."
+                )
+
+        self.encoder = create_session(encoder_path, num_threads, graph_optimization)
+        self.decoder = create_session(decoder_path, num_threads, graph_optimization)
+        self.transform = ResizeLongestSide(self.image_size)
+        self.reset_image()
+
+    def set_image(self, image):
+        """Compute the image embedding for an RGB uint8 HxWx3 image."""
+        input_image = self.transform.apply_image(image)
+        input_size = input_image.shape[:2]
+
+        # Normalize and pad to a square model input in one buffer
+        padded = np.zeros((self.image_size, self.image_size, 3), dtype=np.float32)
+        padded[:input_size[0], :input_size[1]] = (input_image - self.pixel_mean) / self.pixel_std
+        model_input = padded.transpose(2, 0, 1)[None, :, :, :]
+
+        self.features = self.encoder.run(None, {"image": np.ascontiguousarray(model_input)})[0]
+        self.original_size = image.shape[:2]
+        self.input_size = input_size
+        self.is_image_set = True
+
+    def predict(self, point_coords=None, point_labels=None, box=None, mask_input=None,
+                multimask_output=True, return_logits=False):
+        """Predict masks for the given point and/or box prompts, mirroring SamPredictor.predict.
+
+        ``box`` is one XYXY box; the exported decoder takes it as its two corners, labelled
+        2 (top left) and 3 (bottom right), after any points.
+        """
+        if not self.is_image_set:
+            raise RuntimeError("An image must be set with .set_image(...) before mask prediction.")
+        if point_coords is None and box is None:
+            raise ValueError("Point or box prompts are required")
+
+        coords = [np.empty((0, 2))] if point_coords is None else [np.asarray(point_coords, dtype=np.float64)]
+        labels = [np.empty(0)] if point_labels is None else [np.asarray(point_labels, dtype=np.float64)]
+        if box is not None:
+            coords.append(np.asarray(box, dtype=np.float64).reshape(2, 2))
+            labels.append(np.array([2, 3]))
+        else:
+            # The exported decoder expects a padding point when no box is given
+            coords.append(np.array([[0.0, 0.0]]))
+            labels.append(np.array([-1]))
+        coords = np.concatenate(coords, axis=0)[None, :, :]
+        labels = np.concatenate(labels, axis=0)[None, :]
+        coords = self.transform.apply_coords(coords, self.original_size).astype(np.float32)
+
+        if mask_input is None:
+            onnx_mask_input = np.zeros((1, 1, 256, 256), dtype=np.float32)
+            has_mask_input = np.zeros(1, dtype=np.float32)
+        else:
+            onnx_mask_input = mask_input[None, :, :, :].astype(np.float32)
+            has_mask_input = np.ones(1, dtype=np.float32)
+
+        scores, low_res_masks = self.decoder.run(None, {
+            "image_embeddings": self.features,
+            "point_coords": coords,
+            "point_labels": labels.astype(np.float32),
+            "mask_input": onnx_mask_input,
+            "has_mask_input": has_mask_input,
+        })
+
+        # Token 0 is the single-mask output, tokens 1-3 the multimask outputs
+        mask_slice = slice(1, None) if multimask_output else slice(0, 1)
+        scores = scores[0, mask_slice]
+        low_res_masks = low_res_masks[0, mask_slice]
+        masks = np.stack([self._postprocess_mask(m) for m in low_res_masks])
+
+        if not return_logits:
+            masks = masks > self.mask_threshold
+        return masks, scores, low_res_masks
+
+    def _postprocess_mask(self, low_res_mask):
+        """Upscale 256x256 mask logits to the original image size, removing padding."""
+        mask = cv2.resize(low_res_mask, (self.image_size, self.image_size), interpolation=cv2.INTER_LINEAR)
+        mask = mask[:self.input_size[0], :self.input_size[1]]
+        return cv2.resize(mask, (self.original_size[1], self.original_size[0]), interpolation=cv2.INTER_LINEAR)
+
+    def fork(self):
+        """New predictor sharing this one's ONNX Runtime sessions, with its own image state."""
+        predictor = copy.copy(self)
+        predictor.reset_image()
+        return predictor
+
+    def reset_image(self):
+        """Clear the current image embedding."""
+        self.is_image_set = False
+        self.features = None
+        self.original_size = None
+        self.input_size = None
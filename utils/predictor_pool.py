@@ -0,0 +1,63 @@
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def fork_predictor(predictor):
+    """Create a predictor context sharing the given predictor's read-only model weights."""
+    if hasattr(predictor, 'fork'):
+        return predictor.fork()
+    from segment_anything import SamPredictor
+    return SamPredictor(predictor.model)
+
+
+class PredictorPool:
+    """Fixed set of predictor contexts over one shared SAM model.
+
+    SamPredictor keeps the current image embedding as instance state, so a single
+    predictor cannot serve concurrent requests. Each context here owns its embedding
+    while sharing the weights; ``acquire`` blocks (queues) when all are busy, which
+    bounds concurrent segmentation to ``size``.
+    """
+
+    def __init__(self, predictor, size=2):
+        if size < 1:
+            raise ValueError("PredictorPool size must be at least 1")
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._idle.put(predictor)
+        for _ in range(size - 1):
+            self._idle.put(fork_predictor(predictor))
+        self._lock = threading.Lock()
+        self._waiting = 0
+        logger.info(f"Created SAM predictor pool with {size} contexts")
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """Borrow a predictor for one set_image/predict sequence."""
+        with self._lock:
+            self._waiting += 1
+        try:
+            predictor = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No SAM predictor available within {timeout}s")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        try:
+            yield predictor
+        finally:
+            predictor.reset_image()
+            self._idle.put(predictor)
+
+    def stats(self):
+        """Number of contexts in use and requests waiting for one."""
+        with self._lock:
+            return {
+                'size': self.size,
+                'in_use': self.size - self._idle.qsize(),
+                'waiting': self._waiting,
+            }
@@ -0,0 +1,161 @@
+import threading
+import logging
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PAD_VALUE = 255  # White padding and background
+MASK_THRESHOLD = 127
+# Intermediate buffers kept per thread; they are sized by the source image, so only the
+# most recently used few are kept
+SCRATCH_BUFFERS = 4
+
+
+def letterbox_geometry(width, height, target_size):
+    """Size and offset of an image resized into target_size keeping its aspect ratio.
+
+    Returns (new_width, new_height, pad_left, pad_top).
+    """
+    target_width, target_height = target_size
+    scale = min(target_width / width, target_height / height)
+    new_width = max(1, min(target_width, int(round(width * scale))))
+    new_height = max(1, min(target_height, int(round(height * scale))))
+    pad_left = (target_width - new_width) // 2
+    pad_top = (target_height - new_height) // 2
+    return new_width, new_height, pad_left, pad_top
+
+
+def _interpolation(src_shape, dst_size):
+    """Area averaging when shrinking, Lanczos when enlarging.
+
+    The PIL version resized with antialiased Lanczos in both directions. OpenCV's Lanczos
+    kernel does not widen when shrinking and aliases, so downscaling uses area averaging,
+    which stays closer to PIL's output (about half a gray level mean difference on 3x shrinks).
+    """
+    src_height, src_width = src_shape[:2]
+    dst_width, dst_height = dst_size
+    if dst_width < src_width or dst_height < src_height:
+        return cv2.INTER_AREA
+    return cv2.INTER_LANCZOS4
+
+
+class Preprocessor:
+    """Builds the padded init image, binary mask and control image in one pass.
+
+    Output arrays live in buffers that are reused across calls (one set per thread and
+    target size), so steady-state preprocessing does not allocate full-size arrays.
+    Intermediates sized by the source image are kept in a small per-thread LRU.
+    Returned arrays are only valid until the next call on the same thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _buffers(self, target_size):
+        """Get this thread's output buffers for a target size."""
+        cache = getattr(self._local, 'buffers', None)
+        if cache is None:
+            cache = self._local.buffers = {}
+        if target_size not in cache:
+            width, height = target_size
+            cache[target_size] = {
+                'init': np.empty((height, width, 3), dtype=np.uint8),
+                'control': np.empty((height, width, 3), dtype=np.uint8),
+                'mask': np.empty((height, width), dtype=np.uint8),
+                'background': np.empty((height, width), dtype=bool),
+                'garment': np.empty((height, width), dtype=bool),
+            }
+        return cache[target_size]
+
+    def _scratch(self, name, shape, dtype):
+        """Get a reusable intermediate buffer of an exact shape (the SCRATCH_BUFFERS most recent are kept)."""
+        cache = getattr(self._local, 'scratch', None)
+        if cache is None:
+            cache = self._local.scratch = OrderedDict()
+        key = (name, shape, np.dtype(dtype))
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        buffer = cache[key] = np.empty(shape, dtype=dtype)
+        while len(cache) > SCRATCH_BUFFERS:
+            cache.popitem(last=False)
+        return buffer
+
+    def prepare(self, image, mask, target_size=(512, 512), letterbox=True, bgr=False):
+        """Resize/pad an image and its mask and compose the control image.
+
+        ``image`` is an HxWx3 uint8 array (RGB, or BGR with ``bgr``), ``mask`` an HxW
+        grayscale or boolean array where garment pixels are non-zero. With ``letterbox``
+        the aspect ratio is kept and the borders are padded white; otherwise both are
+        stretched to target_size.
+
+        Returns (init, inpaint_mask, control): the RGB model input, the inverted binary
+        mask (255 outside the garment) and the init image with the garment whitened, which
+        marks the region to inpaint for the ControlNet inpaint model.
+        """
+        buffers = self._buffers(tuple(target_size))
+        init, control = buffers['init'], buffers['control']
+        inpaint_mask, background, garment = buffers['mask'], buffers['background'], buffers['garment']
+        target_width, target_height = target_size
+        height, width = image.shape[:2]
+
+        if letterbox:
+            new_width, new_height, pad_left, pad_top = letterbox_geometry(width, height, target_size)
+        else:
+            new_width, new_height, pad_left, pad_top = target_width, target_height, 0, 0
+        region = (slice(pad_top, pad_top + new_height), slice(pad_left, pad_left + new_width))
+
+        # Image: resize once into scratch, then copy (swapping channels if needed) into the padded buffer
+        resized = self._scratch('image', (new_height, new_width, 3), np.uint8)
+        cv2.resize(image, (new_width, new_height), dst=resized,
+                   interpolation=_interpolation(image.shape, (new_width, new_height)))
+        if (new_width, new_height) != (target_width, target_height):
+            init.fill(PAD_VALUE)
+        init[region] = resized[:, :, ::-1] if bgr else resized
+
+        # Mask: nearest-neighbour resize with the same geometry, then threshold into the background map
+        threshold = MASK_THRESHOLD
+        if mask.dtype == bool:
+            # Reinterpret as 0/1 bytes without a copy
+            mask, threshold = mask.view(np.uint8), 0
+        resized_mask = self._scratch('mask', (new_height, new_width), np.uint8)
+        cv2.resize(mask, (new_width, new_height), dst=resized_mask, interpolation=cv2.INTER_NEAREST)
+        background.fill(True)
+        np.less_equal(resized_mask, threshold, out=background[region])
+        np.multiply(background, PAD_VALUE, out=inpaint_mask, casting='unsafe')
+
+        # Control image: init with the garment (the inpainted region) painted white
+        np.logical_not(background, out=garment)
+        np.copyto(control, init)
+        np.copyto(control, PAD_VALUE, where=garment[:, :, None])
+
+        return init, inpaint_mask, control
+
+    def resize_and_pad(self, image, target_size=(512, 512)):
+        """Letterbox an RGB array into target_size with white padding."""
+        buffers = self._buffers(tuple(target_size))
+        init = buffers['init']
+        height, width = image.shape[:2]
+        new_width, new_height, pad_left, pad_top = letterbox_geometry(width, height, target_size)
+
+        resized = self._scratch('image', (new_height, new_width, 3), np.uint8)
+        cv2.resize(image, (new_width, new_height), dst=resized,
+                   interpolation=_interpolation(image.shape, (new_width, new_height)))
+        if (new_width, new_height) != tuple(target_size):
+            init.fill(PAD_VALUE)
+        init[pad_top:pad_top + new_height, pad_left:pad_left + new_width] = resized
+        return init
+
+
+def whiten_background(image, mask):
+    """Paint pixels outside the mask white, in place. Returns the image.
+
+    ``mask`` is a grayscale mask of any size; it is resized to the image if needed.
+    """
+    if mask.shape[:2] != image.shape[:2]:
+        mask = cv2.resize(mask, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
+    background = mask <= MASK_THRESHOLD
+    np.copyto(image, PAD_VALUE, where=background[:, :, None])
+    return image
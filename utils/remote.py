@@ -0,0 +1,283 @@
+import io
+import os
+import time
+import base64
+import random
+import threading
+import logging
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Roles an inference worker serves, with the worker endpoint for each
+ROLE_PATHS = {'segment': '/infer/segment', 'generate': '/infer/generate'}
+
+# Serializes resetting pools in a forked child; replaced there in case it was held at fork time
+_fork_lock = threading.Lock()
+
+
+def _reset_fork_lock():
+    global _fork_lock
+    _fork_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_fork_lock)
+
+
+class WorkerUnavailable(Exception):
+    """No healthy inference worker could take the job."""
+
+
+class RemoteError(Exception):
+    """An inference worker rejected or failed a job (not retried)."""
+
+
+def encode_image(image):
+    """PIL image or uint8 array as base64 PNG."""
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', compress_level=1)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def decode_image(data):
+    image = Image.open(io.BytesIO(base64.b64decode(data)))
+    image.load()
+    return image
+
+
+def encode_mask(mask):
+    """Boolean mask as a base64 1-bit PNG."""
+    return encode_image(Image.fromarray(np.asarray(mask, dtype=bool)))
+
+
+def decode_mask(data):
+    return np.asarray(decode_image(data).convert('1'), dtype=bool)
+
+
+class _Worker:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.healthy = False
+        self.status = 'unknown'
+        self.model_version = None
+        self.roles = {}
+        self.inflight = 0
+        self.failures = 0
+        self.completed = 0
+        self.last_check = None
+        self.last_error = None
+
+    def load(self, role):
+        """Busy fraction of a role: jobs running or queued there (reported) plus ours in flight
+        since the last health check, over its capacity."""
+        report = self.roles.get(role, {})
+        busy = report.get('active', 0) + report.get('waiting', 0) + self.inflight
+        return busy / max(report.get('capacity', 1), 1)
+
+
+class WorkerPool:
+    """Route segmentation and generation jobs to remote inference workers.
+
+    A background thread polls each worker's ``/health`` every ``health_interval`` seconds;
+    only workers reporting ``ok`` receive jobs. Each job goes to the healthy worker
+    serving its role with the lowest load (reported running and queued jobs plus this
+    pool's requests in flight, over the worker's capacity). Connection failures and 503
+    responses mark the worker down and retry the job on another worker, up to ``retries``
+    times; a worker answering busy (its queue is full) or timing out is skipped for the job
+    without being marked down. Other errors are returned to the caller.
+
+    The HTTP session, lock and health thread belong to the process that made them: a pool
+    created before gunicorn forks its workers (``preload_app``) rebuilds them in each worker
+    on first use.
+    """
+
+    def __init__(self, urls, timeout=900, health_interval=5, health_timeout=2, retries=2):
+        if not urls:
+            raise ValueError("WorkerPool needs at least one worker URL")
+        import requests
+        self._requests = requests
+        self.workers = [_Worker(url) for url in urls]
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.retries = retries
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+        self._started = False
+        self.retried = 0
+
+    def _after_fork(self):
+        """In a forked child, replace the parent's session (its pooled sockets are shared with the
+        parent), lock (possibly held at fork time) and health thread (not running in the child)."""
+        if self._pid == os.getpid():
+            return
+        with _fork_lock:
+            if self._pid == os.getpid():
+                return
+            self._session = self._requests.Session()
+            self._lock = threading.Lock()
+            self._stop = threading.Event()
+            self._thread = None
+            for worker in self.workers:
+                worker.inflight = 0
+            self._pid = os.getpid()
+            logger.info(f"Worker pool reset in forked process {self._pid}")
+            if self._started:
+                self.start()
+
+    def start(self):
+        """Check every worker now, then keep checking in the background."""
+        self._after_fork()
+        self._started = True
+        self.check_all()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._health_loop, name="worker-health", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.check_all()
+
+    def check_all(self):
+        self._after_fork()
+        for worker in self.workers:
+            self.check(worker)
+
+    def check(self, worker):
+        """Poll one worker's health endpoint and record its status and load."""
+        try:
+            response = self._session.get(f"{worker.url}/health", timeout=self.health_timeout)
+            report = response.json()
+            healthy = response.status_code == 200 and report.get('status') == 'ok'
+            error = None if healthy else report.get('status') or f"HTTP {response.status_code}"
+        except Exception as e:
+            report, healthy, error = {}, False, str(e)
+        with self._lock:
+            if healthy and not worker.healthy:
+                logger.info(f"Inference worker {worker.url} is up")
+            elif not healthy and worker.healthy:
+                logger.warning(f"Inference worker {worker.url} is down: {error}")
+            worker.healthy = healthy
+            worker.status = report.get('status', 'unreachable')
+            worker.model_version = report.get('model_version')
+            worker.roles = report.get('roles', {})
+            worker.last_check = time.time()
+            worker.last_error = error
+        return healthy
+
+    def _choose(self, role, exclude):
+        with self._lock:
+            candidates = [
+                worker for worker in self.workers
+                if worker.healthy and worker not in exclude and role in worker.roles
+            ]
+            if not candidates:
+                return None
+            lowest = min(worker.load(role) for worker in candidates)
+            worker = random.choice([w for w in candidates if w.load(role) == lowest])
+            worker.inflight += 1
+            return worker
+
+    def _record_failure(self, worker, error):
+        with self._lock:
+            worker.failures += 1
+            worker.last_error = error
+        logger.warning(f"Inference worker {worker.url} could not take the job, trying another: {error}")
+
+    def _mark_down(self, worker, error):
+        with self._lock:
+            worker.failures += 1
+            worker.last_error = error
+            if worker.healthy:
+                logger.warning(f"Inference worker {worker.url} failed, taking it out of rotation: {error}")
+            worker.healthy = False
+
+    def call(self, role, payload, trace_id=None):
+        """Run a job on a worker serving ``role`` and return its JSON result."""
+        self._after_fork()
+        headers = {'X-Trace-Id': trace_id} if trace_id else {}
+        tried = []
+        for attempt in range(self.retries + 1):
+            worker = self._choose(role, tried)
+            if worker is None and attempt == 0:
+                # Nothing known healthy yet: re-check now rather than wait for the next poll
+                self.check_all()
+                worker = self._choose(role, tried)
+            if worker is None:
+                break
+            tried.append(worker)
+            if attempt:
+                self.retried += 1
+
+            try:
+                response = self._session.post(f"{worker.url}{ROLE_PATHS[role]}", json=payload,
+                                              headers=headers, timeout=self.timeout)
+            except self._requests.ConnectionError as e:
+                self._mark_down(worker, str(e))
+                continue
+            except self._requests.Timeout as e:
+                # Slow or stuck, not necessarily down: health checks decide that
+                self._record_failure(worker, f"Timed out: {str(e)}")
+                continue
+            finally:
+                with self._lock:
+                    worker.inflight -= 1
+
+            try:
+                body = response.json()
+            except ValueError:
+                body = {}
+            if response.status_code == 503 and body.get('busy'):
+                self._record_failure(worker, f"Busy: {body.get('error', '')}")
+                continue
+            if response.status_code == 503:
+                self._mark_down(worker, "503 Service Unavailable")
+                continue
+            if response.status_code != 200:
+                raise RemoteError(f"{worker.url} {role} failed with HTTP {response.status_code}: "
+                                  f"{body.get('error', response.text[:200])}")
+            with self._lock:
+                worker.completed += 1
+            return body
+
+        raise WorkerUnavailable(f"No healthy inference worker could take the {role} job "
+                                f"(tried {', '.join(w.url for w in tried) or 'none'})")
+
+    def versions(self, role):
+        """Model versions reported by the healthy workers serving ``role``."""
+        with self._lock:
+            return {worker.model_version for worker in self.workers if worker.healthy and role in worker.roles}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'retried': self.retried,
+                'workers': [
+                    {
+                        'url': worker.url,
+                        'healthy': worker.healthy,
+                        'status': worker.status,
+                        'model_version': worker.model_version,
+                        'roles': worker.roles,
+                        'inflight': worker.inflight,
+                        'completed': worker.completed,
+                        'failures': worker.failures,
+                        'last_check': worker.last_check,
+                        'last_error': worker.last_error,
+                    }
+                    for worker in self.workers
+                ],
+            }
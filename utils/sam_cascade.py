@@ -0,0 +1,123 @@
+import time
+import threading
+import logging
+import numpy as np
+from utils.predictor_pool import PredictorPool
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Cheapest to most expensive SAM variant
+DEFAULT_TIER_ORDER = ["vit_b", "vit_l", "vit_h"]
+
+
+class SamCascade:
+    """Run the smallest SAM tier first and escalate to larger tiers on low-confidence masks.
+
+    A tier's mask is accepted when its predicted IoU score reaches ``min_score`` and the
+    mask covers between ``min_coverage`` and ``max_coverage`` of the image. The last tier
+    is always accepted. Larger tiers are only loaded the first time they are needed, each
+    behind a PredictorPool of ``pool_size`` contexts so concurrent requests do not race.
+    """
+
+    def __init__(self, tiers, predictor_factory, min_score=0.88, min_coverage=0.02, max_coverage=0.95,
+                 pool_size=1):
+        if not tiers:
+            raise ValueError("SamCascade needs at least one tier")
+        self.tiers = list(tiers)
+        self.predictor_factory = predictor_factory
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        self.max_coverage = max_coverage
+        self.pool_size = pool_size
+        self._pools = {}
+        self._lock = threading.Lock()
+        # Loading a tier takes seconds: it holds only that tier's lock, not the stats lock
+        self._load_locks = {tier: threading.Lock() for tier in self.tiers}
+        self._stats = {
+            tier: {'attempts': 0, 'accepted': 0, 'escalated': 0, 'total_time': 0.0}
+            for tier in self.tiers
+        }
+        self._total = 0
+
+    def _get_pool(self, tier):
+        """Load the predictor pool for a tier on first use."""
+        with self._lock:
+            pool = self._pools.get(tier)
+        if pool is not None:
+            return pool
+        with self._load_locks[tier]:
+            # Another request may have loaded the tier while this one waited
+            with self._lock:
+                pool = self._pools.get(tier)
+            if pool is None:
+                logger.info(f"Loading SAM cascade tier: {tier}")
+                pool = PredictorPool(self.predictor_factory(tier), size=self.pool_size)
+                with self._lock:
+                    self._pools[tier] = pool
+        return pool
+
+    def unload(self):
+        """Drop all loaded tiers; they are reloaded on next use. Statistics are kept."""
+        with self._lock:
+            self._pools.clear()
+
+    def check_mask(self, mask, score):
+        """Return the reason a mask should be escalated, or None if it is acceptable."""
+        if score < self.min_score:
+            return f"score {score:.3f} < {self.min_score}"
+        coverage = float(mask.mean())
+        if coverage < self.min_coverage:
+            return f"coverage {coverage:.3f} < {self.min_coverage}"
+        if coverage > self.max_coverage:
+            return f"coverage {coverage:.3f} > {self.max_coverage}"
+        return None
+
+    def segment(self, image, point_coords, point_labels):
+        """Segment an RGB image, escalating through tiers. Returns (mask, score, tier)."""
+        for index, tier in enumerate(self.tiers):
+            with self._get_pool(tier).acquire() as predictor:
+                # Timed from here so a tier's first-use load and pool waits do not skew mean_time
+                start_time = time.perf_counter()
+                with span('sam_encode', tier=tier):
+                    predictor.set_image(image)
+                with span('sam_decode', tier=tier):
+                    masks, scores, _ = predictor.predict(
+                        point_coords=point_coords,
+                        point_labels=point_labels,
+                        multimask_output=True
+                    )
+                elapsed = time.perf_counter() - start_time
+            best_mask_idx = int(np.argmax(scores))
+            mask, score = masks[best_mask_idx], float(scores[best_mask_idx])
+
+            is_last = index == len(self.tiers) - 1
+            reason = self.check_mask(mask, score)
+            with self._lock:
+                stats = self._stats[tier]
+                stats['attempts'] += 1
+                stats['total_time'] += elapsed
+                if reason is None or is_last:
+                    stats['accepted'] += 1
+                    self._total += 1
+                else:
+                    stats['escalated'] += 1
+
+            if reason is None or is_last:
+                return mask, score, tier
+            logger.info(f"SAM cascade escalating from {tier}: {reason}")
+
+    def stats(self):
+        """Per-tier attempt counts, hit rates and mean latency for threshold tuning."""
+        with self._lock:
+            report = {'total': self._total, 'tiers': {}}
+            for tier in self.tiers:
+                stats = self._stats[tier]
+                report['tiers'][tier] = {
+                    'attempts': stats['attempts'],
+                    'accepted': stats['accepted'],
+                    'escalated': stats['escalated'],
+                    'hit_rate': stats['accepted'] / self._total if self._total else 0.0,
+                    'mean_time': stats['total_time'] / stats['attempts'] if stats['attempts'] else 0.0,
+                }
+            return report
@@ -0,0 +1,155 @@
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+import logging
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a lane's queue is at its configured limit."""
+
+
+class Lane:
+    """A work queue with its own worker threads.
+
+    Jobs run in priority order (lower first, FIFO among equals). With ``fair`` each client
+    gets its own queue and clients are served round-robin, so one client submitting a burst
+    cannot starve the others. Lanes do not set torch's thread count: the intra-op thread
+    pool is process-wide, so lanes share it (app.py sizes it once, see TORCH_THREADS).
+    Jobs run in a copy of the submitter's context, so context variables (e.g. the request
+    trace) carry over to the worker.
+    """
+
+    def __init__(self, name, workers=1, fair=False, max_queue=0):
+        self.name = name
+        self.workers = workers
+        self.fair = fair
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._ready_clients = deque()
+        self._sequence = itertools.count()
+        self._threads = []
+        self._shutdown = False
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def _start(self):
+        """Start worker threads on first use."""
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} {self.name} worker(s)")
+
+    def submit(self, fn, *args, client_id=None, priority=0, **kwargs):
+        """Queue fn(*args, **kwargs) and return a concurrent.futures.Future for its result."""
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError(f"Lane {self.name} is shut down")
+            if self.max_queue and self._queued >= self.max_queue:
+                raise QueueFullError(f"{self.name} queue is full ({self._queued} jobs)")
+            if not self._threads:
+                self._start()
+
+            key = client_id if self.fair else None
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = []
+                self._ready_clients.append(key)
+            heapq.heappush(queue, (priority, next(self._sequence), time.perf_counter(), future,
+                                   contextvars.copy_context(), fn, args, kwargs))
+            self._queued += 1
+            self._cond.notify()
+        return future
+
+    def _next_job(self):
+        """Pop the next job, rotating across clients. Caller holds the lock."""
+        key = self._ready_clients.popleft()
+        queue = self._queues[key]
+        job = heapq.heappop(queue)
+        if queue:
+            self._ready_clients.append(key)
+        else:
+            del self._queues[key]
+        self._queued -= 1
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._ready_clients and not self._shutdown:
+                    self._cond.wait()
+                if not self._ready_clients:
+                    return
+                _, _, queued_at, future, context, fn, args, kwargs = self._next_job()
+                self._running += 1
+
+            started_at = time.perf_counter()
+            failed = False
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(context.run(fn, *args, **kwargs))
+                except BaseException as e:
+                    failed = True
+                    future.set_exception(e)
+            finished_at = time.perf_counter()
+
+            with self._cond:
+                self._running -= 1
+                self._completed += 1
+                self._failed += int(failed)
+                self._total_wait += started_at - queued_at
+                self._total_run += finished_at - started_at
+
+    def stats(self):
+        """Queue depth, running jobs and mean wait/run time."""
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'fair': self.fair,
+                'queued': self._queued,
+                'running': self._running,
+                'completed': self._completed,
+                'failed': self._failed,
+                'mean_wait': self._total_wait / self._completed if self._completed else 0.0,
+                'mean_run': self._total_run / self._completed if self._completed else 0.0,
+            }
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs; workers exit once the queue is drained."""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+class Scheduler:
+    """Separate lanes so short segmentation jobs never wait behind long generation jobs."""
+
+    def __init__(self, lanes):
+        self.lanes = {lane.name: lane for lane in lanes}
+
+    def submit(self, lane, fn, *args, **kwargs):
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown lane: {lane}")
+        return self.lanes[lane].submit(fn, *args, **kwargs)
+
+    def stats(self):
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def shutdown(self, wait=True):
+        for lane in self.lanes.values():
+            lane.shutdown(wait=wait)
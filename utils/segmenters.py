@@ -0,0 +1,317 @@
+import os
+import logging
+import threading
+import numpy as np
+from utils.onnx_sam import OnnxSamPredictor, ENCODER_FILENAME, DECODER_FILENAME
+from utils.sam_cascade import SamCascade
+from utils.predictor_pool import PredictorPool
+from utils.memory_budget import module_bytes
+from utils.torch_compile import compile_module
+from utils.remote import encode_image, decode_mask
+from utils.tracing import span, current_trace
+
+logger = logging.getLogger(__name__)
+
+# Segmenter backends by name, see register_segmenter
+SEGMENTERS = {}
+
+
+def register_segmenter(name):
+    """Class decorator adding a Segmenter subclass to the registry under ``name``."""
+    def decorator(cls):
+        SEGMENTERS[name] = cls
+        cls.name = name
+        return cls
+    return decorator
+
+
+def create_segmenter(name, config=None):
+    """Instantiate a registered segmenter backend from a config dict (see Segmenter.from_config)."""
+    if name not in SEGMENTERS:
+        raise ValueError(f"Unknown segmenter backend: {name} (available: {', '.join(sorted(SEGMENTERS))})")
+    return SEGMENTERS[name].from_config(config or {})
+
+
+def torch_device():
+    import torch
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+
+class Segmenter:
+    """Interface for mask predictors.
+
+    ``segment`` takes an RGB uint8 image and foreground prompt points and returns
+    ``(mask, score, label)``: a boolean mask of the image's size, a confidence score and
+    the name of the model that produced it. ``load`` is called before first use (and
+    again after ``unload``, when the memory budget evicts the backend) and returns the
+    resident size in bytes, or None to have it measured. ``served_version`` is the model
+    version that ran the calling thread's last ``segment`` when another process ran it
+    (see RemoteSegmenter), else None.
+    """
+
+    name = None
+    served_version = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the backend from the settings it uses in a shared config dict (checkpoint_path,
+        model_type, onnx_dir, pool_size, compile_models, ...); others are ignored."""
+        return cls()
+
+    def required_files(self):
+        """Model files that must exist before loading."""
+        return []
+
+    def size_estimate(self):
+        """Resident bytes assumed before the first load."""
+        return sum(os.path.getsize(path) for path in self.required_files() if os.path.exists(path))
+
+    def load(self):
+        return 0
+
+    def unload(self):
+        pass
+
+    def segment(self, image, point_coords, point_labels):
+        raise NotImplementedError
+
+    def warmup(self):
+        """Run once at serving shapes (compiled backends build their kernels here)."""
+
+    def stats(self):
+        """Backend statistics for /stats/segmentation, or None."""
+        return None
+
+
+class PooledSegmenter(Segmenter):
+    """Segmenter over a SamPredictor-compatible predictor behind a PredictorPool."""
+
+    def __init__(self, pool_size=2):
+        self.pool_size = pool_size
+        self.predictor = None
+        self.predictor_pool = None
+
+    def build_predictor(self):
+        raise NotImplementedError
+
+    def load(self):
+        self.predictor = self.build_predictor()
+        # Per-request embedding state over the shared weights
+        self.predictor_pool = PredictorPool(self.predictor, size=self.pool_size)
+        model = getattr(self.predictor, 'model', None)
+        return module_bytes(model) if model is not None else self.size_estimate()
+
+    def unload(self):
+        self.predictor = None
+        self.predictor_pool = None
+
+    def segment(self, image, point_coords, point_labels):
+        with self.predictor_pool.acquire() as predictor:
+            with span('sam_encode'):
+                predictor.set_image(image)
+            with span('sam_decode'):
+                masks, scores, _ = predictor.predict(
+                    point_coords=point_coords,
+                    point_labels=point_labels,
+                    multimask_output=True
+                )
+        best_mask_idx = int(np.argmax(scores))
+        return masks[best_mask_idx], float(scores[best_mask_idx]), self.name
+
+
+def build_sam_predictor(model_type, checkpoint_path, compile_models=False):
+    """Load a SAM checkpoint onto the device and wrap it in a predictor."""
+    from segment_anything import sam_model_registry, SamPredictor
+    sam = sam_model_registry[model_type](checkpoint=checkpoint_path)
+    sam.to(device=torch_device())
+    if compile_models:
+        sam.image_encoder = compile_module(sam.image_encoder)
+    return SamPredictor(sam)
+
+
+@register_segmenter('torch')
+class SamSegmenter(PooledSegmenter):
+    """A single SAM checkpoint in eager (or compiled) PyTorch."""
+
+    def __init__(self, checkpoint_path, model_type="vit_h", pool_size=2, compile_models=False):
+        super().__init__(pool_size)
+        self.checkpoint_path = checkpoint_path
+        self.model_type = model_type
+        self.compile_models = compile_models
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['checkpoint_path'], config.get('model_type') or "vit_h",
+                   pool_size=config.get('pool_size', 2), compile_models=config.get('compile_models', False))
+
+    def required_files(self):
+        return [self.checkpoint_path]
+
+    def build_predictor(self):
+        predictor = build_sam_predictor(self.model_type, self.checkpoint_path, self.compile_models)
+        logger.info("Successfully initialized SAM model")
+        return predictor
+
+    def warmup(self):
+        with self.predictor_pool.acquire() as predictor:
+            predictor.set_image(np.zeros((1024, 1024, 3), dtype=np.uint8))
+
+
+@register_segmenter('onnx')
+class OnnxSamSegmenter(PooledSegmenter):
+    """SAM encoder/decoder graphs exported by export_onnx.py, run with ONNX Runtime on CPU."""
+
+    def __init__(self, onnx_dir=None, num_threads=None, graph_optimization="all", pool_size=2):
+        super().__init__(pool_size)
+        self.onnx_dir = onnx_dir or os.path.join("models", "onnx")
+        self.num_threads = num_threads
+        self.graph_optimization = graph_optimization
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('onnx_dir'), num_threads=config.get('onnx_threads'),
+                   graph_optimization=config.get('onnx_optimization') or "all", pool_size=config.get('pool_size', 2))
+
+    def required_files(self):
+        return [os.path.join(self.onnx_dir, name) for name in (ENCODER_FILENAME, DECODER_FILENAME)]
+
+    def build_predictor(self):
+        predictor = OnnxSamPredictor(
+            self.onnx_dir,
+            num_threads=self.num_threads,
+            graph_optimization=self.graph_optimization
+        )
+        logger.info("Successfully initialized SAM ONNX Runtime backend")
+        return predictor
+
+
+@register_segmenter('cascade')
+class CascadeSegmenter(Segmenter):
+    """SAM tiers from smallest to largest, escalating on low-confidence masks (see SamCascade)."""
+
+    def __init__(self, checkpoints, thresholds=None, pool_size=2, compile_models=False):
+        if not checkpoints:
+            raise ValueError("Cascade mode requires cascade_checkpoints")
+        self.checkpoints = dict(checkpoints)
+        self.compile_models = compile_models
+        self.cascade = SamCascade(
+            list(self.checkpoints),
+            lambda tier: build_sam_predictor(tier, self.checkpoints[tier], self.compile_models),
+            pool_size=pool_size,
+            **(thresholds or {})
+        )
+        logger.info(f"Initialized SAM cascade: {' -> '.join(self.checkpoints)}")
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('cascade_checkpoints'), thresholds=config.get('cascade_thresholds'),
+                   pool_size=config.get('pool_size', 2), compile_models=config.get('compile_models', False))
+
+    def required_files(self):
+        return list(self.checkpoints.values())
+
+    def load(self):
+        # Tiers load lazily inside the cascade
+        return self.size_estimate()
+
+    def unload(self):
+        self.cascade.unload()
+
+    def segment(self, image, point_coords, point_labels):
+        return self.cascade.segment(image, point_coords, point_labels)
+
+    def stats(self):
+        return self.cascade.stats()
+
+
+@register_segmenter('stub')
+class StubSegmenter(Segmenter):
+    """Deterministic mask without a model, for tests and load tests of the serving stack.
+
+    Pixels that differ from the image's corner colour are foreground, as for a garment
+    photographed on a plain background; when that leaves almost nothing, a centred
+    ellipse is used instead.
+    """
+
+    def __init__(self, threshold=30, min_coverage=0.01):
+        self.threshold = threshold
+        self.min_coverage = min_coverage
+
+    def segment(self, image, point_coords, point_labels):
+        height, width = image.shape[:2]
+        corners = np.stack([image[0, 0], image[0, -1], image[-1, 0], image[-1, -1]]).astype(np.int16)
+        background = np.median(corners, axis=0)
+        distance = np.abs(image.astype(np.int16) - background).max(axis=2)
+        mask = distance > self.threshold
+        if mask.mean() < self.min_coverage:
+            y, x = np.ogrid[:height, :width]
+            mask = ((x - width / 2) / (width / 3)) ** 2 + ((y - height / 2) / (height / 3)) ** 2 <= 1
+        return mask, 1.0, self.name
+
+
+@register_segmenter('remote')
+class RemoteSegmenter(Segmenter):
+    """Forward segmentation to inference workers through a WorkerPool (see utils.remote)."""
+
+    def __init__(self, worker_pool):
+        if worker_pool is None:
+            raise ValueError("Remote segmenter backend requires a worker_pool (set INFERENCE_WORKERS)")
+        self.worker_pool = worker_pool
+        self._served = threading.local()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('worker_pool'))
+
+    @property
+    def served_version(self):
+        """Model version of the worker that ran this thread's last segmentation."""
+        return getattr(self._served, 'version', None)
+
+    def segment(self, image, point_coords, point_labels):
+        trace = current_trace()
+        with span('remote_segment'):
+            result = self.worker_pool.call('segment', {
+                'image': encode_image(image),
+                'point_coords': np.asarray(point_coords).tolist(),
+                'point_labels': np.asarray(point_labels).tolist(),
+            }, trace_id=trace.trace_id if trace else None)
+        self._served.version = result.get('model_version')
+        return decode_mask(result['mask']), result['score'], result['label']
+
+
+@register_segmenter('tiny')
+class TinySamSegmenter(PooledSegmenter):
+    """The real SAM architecture and predictor at toy size with seeded random weights.
+
+    Masks are meaningless, but every request runs the full set_image/predict path
+    (1024x1024 encoder input, prompt encoder, mask decoder) in well under a second on CPU.
+    """
+
+    def __init__(self, pool_size=2, seed=0):
+        super().__init__(pool_size)
+        self.seed = seed
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(pool_size=config.get('pool_size', 2))
+
+    def build_predictor(self):
+        import torch
+        from segment_anything import SamPredictor
+        from segment_anything.modeling import Sam, ImageEncoderViT, PromptEncoder, MaskDecoder, TwoWayTransformer
+
+        torch.manual_seed(self.seed)
+        embed_dim = 32
+        sam = Sam(
+            image_encoder=ImageEncoderViT(img_size=1024, patch_size=16, embed_dim=64, depth=2, num_heads=2,
+                                          out_chans=embed_dim, window_size=14, global_attn_indexes=(1,)),
+            prompt_encoder=PromptEncoder(embed_dim=embed_dim, image_embedding_size=(64, 64),
+                                         input_image_size=(1024, 1024), mask_in_chans=8),
+            mask_decoder=MaskDecoder(num_multimask_outputs=3, transformer_dim=embed_dim,
+                                     transformer=TwoWayTransformer(depth=2, embedding_dim=embed_dim,
+                                                                   mlp_dim=64, num_heads=2),
+                                     iou_head_depth=3, iou_head_hidden_dim=32)
+        )
+        sam.eval()
+        return SamPredictor(sam)
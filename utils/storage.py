@@ -0,0 +1,219 @@
+import os
+import re
+import time
+import uuid
+import hashlib
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# "<sha256>.<ext>" for stored content, "<sha256>_<kind>.<ext>" for files derived from it
+NAME_PATTERN = re.compile(r'^(?P<digest>[0-9a-f]{64})(?:_(?P<kind>[a-z0-9-]+))?\.(?P<ext>[a-z0-9]+)$')
+# Kinds whose content is fully determined by the digest and never rewritten
+IMMUTABLE_KIND = re.compile(r'^w\d+$')
+CHUNK_SIZE = 1024 * 1024
+TEMP_DIR = 'tmp'
+
+
+class UploadStore:
+    """Content-addressed file store with hash-sharded directories and quota/TTL garbage collection.
+
+    Files are named by the SHA-256 of their content, so identical uploads share one file.
+    A name like ``ab12...ef.png`` lives at ``<root>/ab/12/ab12...ef.png``. Files derived
+    from an upload (masks, previews) reuse its digest and are collected together with it.
+    Last access is tracked through the file's atime, which ``touch`` updates explicitly.
+    """
+
+    def __init__(self, root, quota_bytes=0, ttl_seconds=0, gc_interval=300, min_age_seconds=0):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.ttl_seconds = ttl_seconds
+        self.gc_interval = gc_interval
+        # Quota eviction spares groups accessed this recently: a running job may still need them
+        self.min_age_seconds = min_age_seconds
+        self._gc_thread = None
+        self._gc_stop = threading.Event()
+        os.makedirs(os.path.join(self.root, TEMP_DIR), exist_ok=True)
+
+    @staticmethod
+    def is_valid_name(name):
+        """Check a name is a store name (and therefore safe to map to a path)."""
+        return bool(name) and NAME_PATTERN.match(name) is not None
+
+    def path_for(self, name):
+        """Sharded path of a stored name."""
+        if not self.is_valid_name(name):
+            raise ValueError(f"Invalid store name: {name}")
+        return os.path.join(self.root, name[0:2], name[2:4], name)
+
+    def exists(self, name):
+        return self.is_valid_name(name) and os.path.exists(self.path_for(name))
+
+    def touch(self, name):
+        """Record an access for LRU/TTL collection, keeping the modification time."""
+        path = self.path_for(name)
+        try:
+            stat = os.stat(path)
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def parse_name(name):
+        """Split a store name into (digest, kind, ext); kind is None for uploaded content."""
+        match = NAME_PATTERN.match(name or '')
+        if match is None:
+            raise ValueError(f"Invalid store name: {name}")
+        return match.group('digest'), match.group('kind'), match.group('ext')
+
+    @staticmethod
+    def is_immutable(name):
+        """Content-addressed files and their thumbnails never change under the same name."""
+        _, kind, _ = UploadStore.parse_name(name)
+        return kind is None or IMMUTABLE_KIND.match(kind) is not None
+
+    @staticmethod
+    def derived_name(name, kind, ext=None):
+        """Name of a file derived from a stored one, e.g. its mask."""
+        digest, source_kind, source_ext = UploadStore.parse_name(name)
+        if source_kind:
+            kind = f"{source_kind}-{kind}"
+        return f"{digest}_{kind}.{ext or source_ext}"
+
+    def temp_path(self, ext):
+        """Scratch path for writing a file before adding it with add_file."""
+        return os.path.join(self.root, TEMP_DIR, f"{uuid.uuid4().hex}.{ext}")
+
+    def _commit(self, temp_path, digest, ext):
+        """Move a fully written temp file to its content address, deduplicating."""
+        name = f"{digest}.{ext}"
+        path = self.path_for(name)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            self.touch(name)
+            logger.info(f"Deduplicated upload: {name}")
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        return name
+
+    def put_stream(self, stream, ext):
+        """Store a binary stream, hashing while writing. Returns the content name."""
+        ext = ext.lower()
+        temp_path = self.temp_path(ext)
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+            return self._commit(temp_path, digest.hexdigest(), ext)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def add_file(self, temp_path, ext):
+        """Move a file written to temp_path into the store. Returns the content name."""
+        digest = hashlib.sha256()
+        with open(temp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return self._commit(temp_path, digest.hexdigest(), ext.lower())
+
+    def _scan(self):
+        """Group stored files by digest: {digest: [last_access, size, [paths]]}."""
+        groups = {}
+        for first in os.listdir(self.root):
+            first_dir = os.path.join(self.root, first)
+            if len(first) != 2 or not os.path.isdir(first_dir):
+                continue
+            for second in os.listdir(first_dir):
+                second_dir = os.path.join(first_dir, second)
+                if not os.path.isdir(second_dir):
+                    continue
+                for entry in os.scandir(second_dir):
+                    match = NAME_PATTERN.match(entry.name)
+                    if match is None:
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    group = groups.setdefault(match.group('digest'), [0.0, 0, []])
+                    group[0] = max(group[0], stat.st_atime)
+                    group[1] += stat.st_size
+                    group[2].append(entry.path)
+        return groups
+
+    def usage(self):
+        """Total bytes and file count currently stored."""
+        groups = self._scan()
+        return sum(g[1] for g in groups.values()), sum(len(g[2]) for g in groups.values())
+
+    def collect_garbage(self, now=None):
+        """Evict upload groups past the TTL, then least recently used ones until under quota.
+
+        Groups accessed within ``min_age_seconds`` are not evicted for quota, even if that leaves
+        the store over quota until the next run.
+
+        Returns (files_removed, bytes_freed).
+        """
+        now = now if now is not None else time.time()
+        groups = sorted(self._scan().values(), key=lambda g: g[0])
+        total = sum(g[1] for g in groups)
+        removed, freed = 0, 0
+
+        for last_access, size, paths in groups:
+            expired = self.ttl_seconds and now - last_access > self.ttl_seconds
+            over_quota = self.quota_bytes and total - freed > self.quota_bytes
+            in_use = now - last_access < self.min_age_seconds
+            if not expired and not (over_quota and not in_use):
+                continue
+            for path in paths:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+            freed += size
+
+        # Drop temp files abandoned by failed writes
+        temp_dir = os.path.join(self.root, TEMP_DIR)
+        for entry in os.scandir(temp_dir):
+            # A write may finish (renaming its temp file away) while we look at it
+            try:
+                if now - entry.stat().st_mtime > 3600:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+        if removed:
+            logger.info(f"Upload GC removed {removed} files ({freed / 1024 / 1024:.1f}MB)")
+        return removed, freed
+
+    def _gc_loop(self):
+        while not self._gc_stop.wait(self.gc_interval):
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                logger.error(f"Upload GC failed: {str(e)}")
+
+    def start_gc(self):
+        """Run collect_garbage every gc_interval seconds in a daemon thread."""
+        if self._gc_thread is not None or not (self.quota_bytes or self.ttl_seconds):
+            return
+        self._gc_stop.clear()
+        self._gc_thread = threading.Thread(target=self._gc_loop, name='upload-gc', daemon=True)
+        self._gc_thread.start()
+        logger.info("Started upload garbage collector")
+
+    def stop_gc(self):
+        if self._gc_thread is not None:
+            self._gc_stop.set()
+            self._gc_thread.join()
+            self._gc_thread = None
@@ -0,0 +1,45 @@
+import os
+import uuid
+import logging
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Requested widths are rounded up to one of these so the on-disk cache stays bounded
+THUMBNAIL_WIDTHS = (64, 128, 256, 512, 1024)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def snap_width(width):
+    """Round a requested width up to the nearest supported thumbnail width."""
+    for allowed in THUMBNAIL_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def make_thumbnail(src_path, dst_path, width, fmt='webp', quality=85, temp_path=None):
+    """Write a resized copy of src_path to dst_path, creating it atomically.
+
+    The image is written to ``temp_path`` (default: next to dst_path) and renamed, so
+    readers never see a partial file. Images narrower than ``width`` are not upscaled.
+    """
+    try:
+        pil_format, _ = THUMBNAIL_FORMATS[fmt]
+        with Image.open(src_path) as image:
+            image = image.convert('RGB')
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.Resampling.LANCZOS)
+
+            temp_path = temp_path or f"{dst_path}.{uuid.uuid4().hex}.tmp"
+            image.save(temp_path, pil_format, quality=quality)
+        os.replace(temp_path, dst_path)
+        return dst_path
+
+    except Exception as e:
+        logger.error(f"Error creating thumbnail for {src_path}: {str(e)}")
+        raise
@@ -0,0 +1,137 @@
+import math
+
+
+def bipartite_merge(metric, height, width, count, generator, stride=(2, 2)):
+    """Merge and unmerge functions for ``count`` of the tokens of ``metric`` (batch, tokens, channels).
+
+    Token merging for Stable Diffusion (Bolya & Hoffman, 2023): tokens on a ``height`` x
+    ``width`` grid are split into destinations, one picked at random in every ``stride``
+    cell, and sources (the rest). The ``count`` sources most similar (cosine) to some
+    destination are averaged into it; ``unmerge`` copies a merged token's output back to
+    all of its sources.
+    """
+    import torch
+    batch, tokens, _ = metric.shape
+    stride_y, stride_x = stride
+    cells_y, cells_x = height // stride_y, width // stride_x
+    num_dst = cells_y * cells_x
+
+    # -1 marks the destination in each cell; sorting puts destinations first
+    choice = torch.randint(stride_y * stride_x, (cells_y, cells_x, 1), generator=generator).to(metric.device)
+    cells = torch.zeros(cells_y, cells_x, stride_y * stride_x, device=metric.device, dtype=torch.int64)
+    cells.scatter_(2, choice, -torch.ones_like(choice))
+    cells = cells.view(cells_y, cells_x, stride_y, stride_x).transpose(1, 2).reshape(cells_y * stride_y, cells_x * stride_x)
+    if cells.shape != (height, width):
+        grid = torch.zeros(height, width, device=metric.device, dtype=torch.int64)
+        grid[:cells.shape[0], :cells.shape[1]] = cells
+        cells = grid
+    order = cells.reshape(1, -1, 1).argsort(dim=1)
+    src_all, dst_all = order[:, num_dst:, :], order[:, :num_dst, :]
+
+    def split(x):
+        channels = x.shape[-1]
+        return (x.gather(1, src_all.expand(batch, tokens - num_dst, channels)),
+                x.gather(1, dst_all.expand(batch, num_dst, channels)))
+
+    with torch.no_grad():
+        metric = metric / metric.norm(dim=-1, keepdim=True)
+        a, b = split(metric)
+        scores = a @ b.transpose(-1, -2)
+        count = min(a.shape[1], count)
+        best, best_dst = scores.max(dim=-1)
+        ranked = best.argsort(dim=-1, descending=True)[..., None]
+        kept_src, merged_src = ranked[:, count:], ranked[:, :count]
+        merged_dst = best_dst[..., None].gather(1, merged_src)
+
+    def merge(x):
+        src, dst = split(x)
+        channels = x.shape[-1]
+        kept = src.gather(1, kept_src.expand(batch, kept_src.shape[1], channels))
+        src = src.gather(1, merged_src.expand(batch, count, channels))
+        dst = dst.scatter_reduce(1, merged_dst.expand(batch, count, channels), src, reduce='mean')
+        return torch.cat([kept, dst], dim=1)
+
+    def unmerge(x):
+        kept_count = kept_src.shape[1]
+        kept, dst = x[:, :kept_count], x[:, kept_count:]
+        channels = x.shape[-1]
+        src = dst.gather(1, merged_dst.expand(batch, count, channels))
+        out = torch.zeros(batch, tokens, channels, device=x.device, dtype=x.dtype)
+        out.scatter_(1, dst_all.expand(batch, num_dst, channels), dst)
+        src_positions = src_all.expand(batch, src_all.shape[1], 1)
+        out.scatter_(1, src_positions.gather(1, kept_src).expand(batch, kept_count, channels), kept)
+        out.scatter_(1, src_positions.gather(1, merged_src).expand(batch, count, channels), src)
+        return out
+
+    return merge, unmerge
+
+
+class TokenMerging:
+    """Token merging around the self-attention of UNet and ControlNet transformer blocks.
+
+    At latent resolutions downsampled at most ``max_downsample`` times (the 64x64 level of
+    SD 1.5 by default, where self-attention costs the most), ``ratio`` of the spatial
+    tokens are merged into similar ones before self-attention and unmerged after it.
+    ``ratio`` may be changed between pipeline runs; 0 runs attention unchanged. Call
+    ``reset`` before each run so the random destination choice repeats for equal inputs.
+    """
+
+    def __init__(self, ratio=0.0, max_downsample=1, seed=0):
+        self.ratio = ratio
+        self.max_downsample = max_downsample
+        self.seed = seed
+        self.latent_size = None
+        self._generator = None
+        self._patched = []
+        self._hooks = []
+
+    def reset(self):
+        import torch
+        self._generator = torch.Generator().manual_seed(self.seed)
+
+    def attach(self, *models):
+        """Wrap the self-attention of every transformer block of ``models``."""
+        from diffusers.models.attention import BasicTransformerBlock
+        for model in models:
+            self._hooks.append(model.register_forward_pre_hook(self._record_size, with_kwargs=True))
+            for module in model.modules():
+                if isinstance(module, BasicTransformerBlock):
+                    self._patch(module.attn1)
+        self.reset()
+
+    def detach(self):
+        for module in self._patched:
+            del module.forward
+        for hook in self._hooks:
+            hook.remove()
+        self._patched, self._hooks = [], []
+
+    def _record_size(self, module, args, kwargs):
+        sample = args[0] if args else kwargs['sample']
+        self.latent_size = sample.shape[-2:]
+
+    def _patch(self, attention):
+        original = attention.forward
+
+        def forward(hidden_states, *args, **kwargs):
+            functions = self._merge_functions(hidden_states)
+            if functions is None:
+                return original(hidden_states, *args, **kwargs)
+            merge, unmerge = functions
+            return unmerge(original(merge(hidden_states), *args, **kwargs))
+
+        attention.forward = forward
+        self._patched.append(attention)
+
+    def _merge_functions(self, hidden_states):
+        if self.ratio <= 0 or self.latent_size is None or hidden_states.ndim != 3:
+            return None
+        height, width = self.latent_size
+        tokens = hidden_states.shape[1]
+        downsample = 2 ** round(math.log2(math.sqrt(height * width / tokens)))
+        if downsample > self.max_downsample:
+            return None
+        if self._generator is None:
+            self.reset()
+        return bipartite_merge(hidden_states, math.ceil(height / downsample), math.ceil(width / downsample),
+                               int(tokens * self.ratio), self._generator)
@@ -0,0 +1,36 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join("models", "torch_compile_cache")
+
+
+def configure_compile_cache(cache_dir=DEFAULT_CACHE_DIR):
+    """Persist inductor artifacts in ``cache_dir`` and enable CPU inference optimizations.
+
+    The FX graph cache lets a restarted process reuse compiled kernels instead of
+    recompiling. Freezing folds weights into the graph as constants, which lets inductor
+    prepack them for oneDNN and fuse convolutions with their pointwise ops.
+    """
+    import torch._inductor.config as inductor_config
+
+    cache_dir = os.path.abspath(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = cache_dir
+    inductor_config.fx_graph_cache = True
+    inductor_config.freezing = True
+    logger.info(f"torch.compile cache: {cache_dir}")
+
+
+def compile_module(module, channels_last=True):
+    """Compile a module for inference with the inductor backend at static shapes.
+
+    Frozen weights are baked in at the first call, so later in-place weight changes are
+    not seen by the compiled module.
+    """
+    import torch
+
+    if channels_last:
+        module = module.to(memory_format=torch.channels_last)
+    return torch.compile(module, backend="inductor", dynamic=False)
@@ -0,0 +1,327 @@
+import os
+import re
+import time
+import secrets
+import threading
+import contextvars
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Trace of the request being served; lane jobs run in a copy of the submitting context
+_current_trace = contextvars.ContextVar('trace', default=None)
+
+_TRACE_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def new_trace_id(requested=None):
+    """Use a client-supplied trace ID when it is well-formed, otherwise generate one."""
+    if requested and _TRACE_ID.match(requested):
+        return requested
+    return secrets.token_hex(8)
+
+
+class Trace:
+    """Timed spans recorded for one request, possibly from several threads."""
+
+    def __init__(self, name, trace_id=None):
+        self.trace_id = trace_id or new_trace_id()
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread = threading.get_native_id()
+        self.status = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, end, **args):
+        """Record a span from ``time.perf_counter()`` timestamps."""
+        span = {
+            'name': name,
+            'start': start,
+            'end': end,
+            'thread': threading.get_native_id(),
+            'thread_name': threading.current_thread().name,
+            'args': args,
+        }
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self, status=None):
+        self.end = time.perf_counter()
+        self.status = status
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def summary(self):
+        """Total time per span name."""
+        with self._lock:
+            spans = list(self.spans)
+        totals = {}
+        for span in spans:
+            total = totals.setdefault(span['name'], {'count': 0, 'total_ms': 0.0})
+            total['count'] += 1
+            total['total_ms'] += (span['end'] - span['start']) * 1000
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': self.duration * 1000,
+            'status': self.status,
+            'spans': totals,
+        }
+
+    def to_dict(self):
+        """Summary plus every span, with offsets in milliseconds from the request start."""
+        report = self.summary()
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span['start'])
+        report['timeline'] = [
+            {
+                'name': span['name'],
+                'start_ms': (span['start'] - self.start) * 1000,
+                'duration_ms': (span['end'] - span['start']) * 1000,
+                'thread': span['thread_name'],
+                'args': span['args'],
+            }
+            for span in spans
+        ]
+        return report
+
+    def chrome_events(self, pid):
+        """Complete ("X") events in the Chrome trace event format, timestamps in microseconds."""
+        events = [{
+            'name': self.name,
+            'cat': 'request',
+            'ph': 'X',
+            'ts': self.start * 1e6,
+            'dur': self.duration * 1e6,
+            'pid': pid,
+            'tid': self.thread,
+            'args': {'trace_id': self.trace_id, 'status': self.status},
+        }]
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            events.append({
+                'name': span['name'],
+                'cat': 'span',
+                'ph': 'X',
+                'ts': span['start'] * 1e6,
+                'dur': (span['end'] - span['start']) * 1e6,
+                'pid': pid,
+                'tid': span['thread'],
+                'args': {'trace_id': self.trace_id, **span['args']},
+            })
+        return events, {span['thread']: span['thread_name'] for span in spans}
+
+
+class TraceBuffer:
+    """Ring buffer of the most recent finished traces."""
+
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self._traces = deque(maxlen=capacity or None)
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        if not self.capacity:
+            return
+        with self._lock:
+            self._traces.append(trace)
+
+    def get(self, trace_id):
+        with self._lock:
+            for trace in self._traces:
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+    def recent(self, limit=None):
+        """Finished traces, newest first."""
+        with self._lock:
+            traces = list(self._traces)[::-1]
+        return traces[:limit] if limit else traces
+
+    def chrome_trace(self, trace_ids=None):
+        """Chrome/Perfetto JSON for the given traces (all buffered traces by default)."""
+        pid = os.getpid()
+        traces = self.recent()
+        if trace_ids:
+            traces = [trace for trace in traces if trace.trace_id in trace_ids]
+
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': f"tryon worker {pid}"}}]
+        thread_names = {}
+        for trace in reversed(traces):
+            trace_events, names = trace.chrome_events(pid)
+            events.extend(trace_events)
+            thread_names.update(names)
+        for tid, name in thread_names.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def activate(trace):
+    """Make ``trace`` current in this context (None deactivates)."""
+    _current_trace.set(trace)
+
+
+@contextmanager
+def span(name, **args):
+    """Time the block as a span of the current trace; a no-op outside a trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter(), **args)
+
+
+def record_span(name, start, end, **args):
+    """Record an already timed span on the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, start, end, **args)
+
+
+class StepTimer:
+    """``callback_on_step_end`` for diffusers pipelines that records a span per denoising step.
+
+    The pipeline encodes prompts and prepares latents before the first step; a forward
+    pre-hook on ``first_module`` (the first model each step calls) closes that span as
+    ``pipeline_setup``. After the pipeline returns, ``finish()`` records the time since the
+    last step as ``vae_decode``. Only calls from the creating thread are timed.
+    """
+
+    def __init__(self, first_module=None):
+        self.trace = _current_trace.get()
+        self.thread = threading.get_ident()
+        self.last = time.perf_counter()
+        self.steps = 0
+        self._hook = None
+        if self.trace is not None and first_module is not None:
+            self._hook = first_module.register_forward_pre_hook(self._first_call)
+
+    def _first_call(self, module, args):
+        if threading.get_ident() != self.thread:
+            return
+        now = time.perf_counter()
+        self.trace.add_span('pipeline_setup', self.last, now)
+        self.last = now
+        self._remove_hook()
+
+    def _remove_hook(self):
+        if self._hook is not None:
+            self._hook.remove()
+            self._hook = None
+
+    def __call__(self, pipe, step, timestep, callback_kwargs):
+        if self.trace is not None and threading.get_ident() == self.thread:
+            now = time.perf_counter()
+            self.trace.add_span('denoise_step', self.last, now, step=step, timestep=int(timestep))
+            self.last = now
+            self.steps += 1
+        return callback_kwargs
+
+    def finish(self):
+        self._remove_hook()
+        if self.trace is not None:
+            self.trace.add_span('vae_decode', self.last, time.perf_counter())
+
+
+class ProfilerCapture:
+    """Profile the next N lane jobs with ``torch.profiler`` and keep operator-level results.
+
+    Only one job is profiled at a time; jobs that start while another is being profiled run
+    normally and do not count towards N.
+    """
+
+    def __init__(self, row_limit=40, keep=10):
+        self.row_limit = row_limit
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._active = False
+        self._record_shapes = False
+        self._results = deque(maxlen=keep)
+
+    def arm(self, count, record_shapes=False):
+        with self._lock:
+            self._remaining = count
+            self._record_shapes = record_shapes
+
+    def _claim(self):
+        with self._lock:
+            if self._remaining <= 0 or self._active:
+                return None
+            self._remaining -= 1
+            self._active = True
+            return self._record_shapes
+
+    @contextmanager
+    def capture(self, label):
+        """Profile the block if a capture is armed and none is running."""
+        record_shapes = self._claim()
+        if record_shapes is None:
+            yield
+            return
+
+        from torch.profiler import profile, ProfilerActivity
+        trace = _current_trace.get()
+        start = time.perf_counter()
+        try:
+            with profile(activities=[ProfilerActivity.CPU], record_shapes=record_shapes) as prof:
+                yield
+        finally:
+            try:
+                self._store(prof, label, trace, time.perf_counter() - start)
+            except Exception as e:
+                logger.error(f"Error summarizing profile: {str(e)}")
+            with self._lock:
+                self._active = False
+
+    def _store(self, prof, label, trace, duration):
+        averages = prof.key_averages(group_by_input_shape=self._record_shapes)
+        averages = sorted(averages, key=lambda event: event.self_cpu_time_total, reverse=True)
+        operators = [
+            {
+                'name': event.key,
+                'calls': event.count,
+                'self_cpu_ms': event.self_cpu_time_total / 1000,
+                'cpu_total_ms': event.cpu_time_total / 1000,
+                **({'input_shapes': str(event.input_shapes)} if self._record_shapes else {}),
+            }
+            for event in averages[:self.row_limit]
+        ]
+        table = prof.key_averages(group_by_input_shape=self._record_shapes).table(
+            sort_by='self_cpu_time_total', row_limit=self.row_limit
+        )
+        with self._lock:
+            self._results.append({
+                'label': label,
+                'trace_id': trace.trace_id if trace is not None else None,
+                'captured_at': time.time(),
+                'duration_ms': duration * 1000,
+                'operators': operators,
+                'table': table,
+            })
+
+    def stats(self):
+        """Remaining armed captures and the stored profiles, newest first."""
+        with self._lock:
+            return {
+                'remaining': self._remaining,
+                'active': self._active,
+                'profiles': list(self._results)[::-1],
+            }
@@ -0,0 +1,61 @@
+import os
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TrafficRecorder:
+    """Append one JSON object per request to a JSONL log.
+
+    Each line is written with a single ``write`` on a file opened with O_APPEND, so
+    several gunicorn workers can share one log without interleaving lines.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.failed = 0
+
+    def _open(self):
+        if self._fd is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def record(self, entry):
+        """Append an entry; errors are logged, never raised into the request."""
+        line = (json.dumps(entry, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+        try:
+            with self._lock:
+                os.write(self._open(), line)
+                self.recorded += 1
+        except OSError as e:
+            self.failed += 1
+            logger.error(f"Error recording traffic to {self.path}: {str(e)}")
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+def load_log(path):
+    """Entries of a traffic log in file order, skipping blank and malformed lines."""
+    entries = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping malformed line {number} of {path}")
+    return entries
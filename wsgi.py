@@ -0,0 +1,19 @@
+import os
+import sys
+import logging
+from app import app, verify_models, init_image_processor, upload_store
+
+logger = logging.getLogger(__name__)
+
+# Load models at import time. With gunicorn's preload_app this runs once in the master
+# process and workers share the weights copy-on-write instead of each loading them.
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '1') == '1'
+
+if PRELOAD_MODELS:
+    if not verify_models():
+        logger.error("Please run boot.py first to download required models.")
+        sys.exit(1)
+    init_image_processor()
+
+# Started in the master when preloading, so a single GC thread serves all workers
+upload_store.start_gc()